@@ -0,0 +1,198 @@
+from flask import Flask, request, jsonify, render_template, Response
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+from urllib.error import URLError, HTTPError
+import json
+import os
+import threading
+import time
+
+from amounts import drops_to_xrp
+from jurisdictions import load_jurisdictions, department_parents, jurisdiction_of
+from graph_layout import FlowGraph, hierarchy_levels, layout_positions, build_lod_graph, DEFAULT_TOP_K
+
+# Seconds a shard summary is reused before the shard is asked again
+SUMMARY_TTL = 2.0
+
+# Seconds to wait for a shard before reporting it unavailable
+SHARD_TIMEOUT = 10.0
+
+
+def parse_shard_urls(value):
+    """Parse "federal=http://host:5001,penn=http://host:5002" into a dictionary"""
+    shards = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        name, _, url = item.partition('=')
+        if not url:
+            raise ValueError(f"Invalid shard entry (expected name=url): {item}")
+        shards[name.strip()] = url.strip().rstrip('/')
+    return shards
+
+
+class ShardAggregator:
+    """
+    Thin cross-jurisdiction layer over the shards of a sharded deployment.
+    It holds no wallets and ingests nothing: it fetches each shard's summary
+    in parallel (cached for SUMMARY_TTL seconds) and merges them, so the cost of
+    a cross-jurisdiction view grows with the number of shards, not with the
+    history of every shard.
+    """
+
+    def __init__(self, shard_urls, jurisdictions=None):
+        """
+        Args:
+            shard_urls: Dictionary of jurisdiction ID -> base URL of its shard
+            jurisdictions: Jurisdiction configuration (default: load_jurisdictions())
+        """
+        self.shard_urls = dict(shard_urls)
+        self.jurisdictions = jurisdictions or load_jurisdictions()
+        self.department_parents = department_parents(self.jurisdictions)
+        self.pool = ThreadPoolExecutor(max_workers=max(len(self.shard_urls), 1))
+        self._cache = {}
+        self.lock = threading.Lock()
+
+    def _fetch(self, jurisdiction, path):
+        """Helper to GET a JSON document from one shard"""
+        with urlopen(f"{self.shard_urls[jurisdiction]}{path}", timeout=SHARD_TIMEOUT) as response:
+            return json.loads(response.read())
+
+    def _summary(self, jurisdiction):
+        """Helper to get one shard's summary, from the cache if it is fresh"""
+        with self.lock:
+            cached = self._cache.get(jurisdiction)
+            if cached and time.time() - cached[0] < SUMMARY_TTL:
+                return cached[1]
+
+        start = time.perf_counter()
+        try:
+            result = self._fetch(jurisdiction, '/api/shard/summary')
+            if not result.get('success'):
+                raise ValueError(result.get('error', 'Unknown error'))
+            summary = dict(result['data'], available=True)
+        except (URLError, OSError, ValueError) as e:
+            summary = {"jurisdiction": jurisdiction, "available": False, "error": str(e),
+                       "wallets": {}, "edges": []}
+        summary["latency_seconds"] = time.perf_counter() - start
+
+        with self.lock:
+            self._cache[jurisdiction] = (time.time(), summary)
+        return summary
+
+    def summaries(self):
+        """Summaries of every shard, fetched in parallel"""
+        return dict(zip(self.shard_urls, self.pool.map(self._summary, self.shard_urls)))
+
+    def get_status(self):
+        """Availability, ingest progress and alerts per shard"""
+        return {
+            name: {key: summary.get(key) for key in (
+                "available", "error", "latency_seconds", "last_ledger_index", "anomalies", "unreconciled")}
+            for name, summary in self.summaries().items()
+        }
+
+    def get_all_balances(self):
+        """Government and department balances across every shard"""
+        balances = {}
+        for summary in self.summaries().values():
+            for wallet_id, wallet in summary["wallets"].items():
+                if wallet_id not in ("tax_pool", "exit_pool"):
+                    balances[wallet_id] = drops_to_xrp(wallet["balance_drops"])
+        return balances
+
+    def get_transaction_graph(self, top_k=DEFAULT_TOP_K, min_value=0.0):
+        """Cross-jurisdiction transaction graph merged from the shards' edges"""
+        flow_graph = FlowGraph()
+        wallets = {}
+        for summary in self.summaries().values():
+            wallets.update(summary["wallets"])
+            for edge in summary["edges"]:
+                flow_graph.edges[(edge["source"], edge["target"])] = {
+                    "value": edge["value"], "count": edge["count"], "last_timestamp": edge["last_timestamp"]}
+
+        levels = hierarchy_levels(self.department_parents, ["tax_pool", "government"], ["exit_pool"])
+        positions = layout_positions(levels, self.department_parents)
+        nodes = [{
+            "id": wallet_id,
+            "name": wallet_id.replace('_', ' ').title(),
+            "level": levels[wallet_id],
+            "x": positions[wallet_id][0],
+            "y": positions[wallet_id][1],
+            "balance": drops_to_xrp(wallet["balance_drops"]),
+            "totalSent": drops_to_xrp(wallet["sent_drops"]),
+            "totalReceived": drops_to_xrp(wallet["received_drops"]),
+            "jurisdiction": jurisdiction_of(self.jurisdictions, wallet_id)
+        } for wallet_id, wallet in wallets.items() if wallet_id in levels]
+        return build_lod_graph(nodes, flow_graph, top_k, min_value)
+
+    def shard_url_for(self, wallet_id):
+        """Base URL of the shard owning a wallet, or None"""
+        return self.shard_urls.get(jurisdiction_of(self.jurisdictions, wallet_id))
+
+
+app = Flask(__name__)
+aggregator = ShardAggregator(parse_shard_urls(os.getenv('SHARD_URLS')))
+
+
+@app.route('/department-tracking')
+def department_tracking():
+    """Render the department tracking page over every jurisdiction"""
+    return render_template('department_tracking.html')
+
+
+@app.route('/api/shards', methods=['GET'])
+def get_shards():
+    """Status of every shard"""
+    return jsonify({
+        "success": True,
+        "shards": aggregator.get_status()
+    })
+
+
+@app.route('/api/balances', methods=['GET'])
+def get_balances():
+    """Balances of every jurisdiction's wallets"""
+    return jsonify(aggregator.get_all_balances())
+
+
+@app.route('/api/transaction-graph', methods=['GET'])
+def get_transaction_graph():
+    """Cross-jurisdiction transaction graph"""
+    try:
+        return jsonify({
+            "success": True,
+            "data": aggregator.get_transaction_graph(
+                top_k=request.args.get("top_k", DEFAULT_TOP_K, type=int),
+                min_value=request.args.get("min_value", 0.0, type=float)
+            )
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+
+@app.route('/api/transaction-graph/edge', methods=['GET'])
+def get_transaction_graph_edge():
+    """Drill-down into a link, answered by the shard owning the sending wallet"""
+    url = aggregator.shard_url_for(request.args.get("source", ""))
+    if url is None:
+        return jsonify({
+            "success": False,
+            "error": f"No shard for wallet: {request.args.get('source')}"
+        }), 400
+    try:
+        with urlopen(f"{url}/api/transaction-graph/edge?{request.query_string.decode()}",
+                     timeout=SHARD_TIMEOUT) as response:
+            return Response(response.read(), status=response.status, mimetype='application/json')
+    except HTTPError as e:
+        return Response(e.read(), status=e.code, mimetype='application/json')
+    except (URLError, OSError) as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 502
+
+
+if __name__ == '__main__':
+    app.run(debug=False, port=int(os.getenv('PORT', '5000')), host='0.0.0.0')
@@ -0,0 +1,37 @@
+from decimal import Decimal, InvalidOperation
+
+DROPS_PER_XRP = 1_000_000
+
+# Largest XRP amount in drops (the total supply, 100 billion XRP)
+MAX_DROPS = 10 ** 17
+
+def to_drops(amount_xrp):
+    """
+    Parse an XRP amount (string, int, float or Decimal) into integer drops, exactly.
+    Raises ValueError for amounts that are not a whole number of drops or are
+    larger than the XRP supply.
+    """
+    try:
+        # str() first so a float like 0.1 is read as the decimal 0.1, not its binary value
+        value = Decimal(str(amount_xrp)) * DROPS_PER_XRP
+    except (InvalidOperation, ValueError, TypeError):
+        raise ValueError(f"Invalid XRP amount: {amount_xrp}")
+    if not value.is_finite() or value != value.to_integral_value():
+        raise ValueError(f"Invalid XRP amount (more than 6 decimals): {amount_xrp}")
+    if abs(value) > MAX_DROPS:
+        raise ValueError(f"Invalid XRP amount (more than the XRP supply): {amount_xrp}")
+    return int(value)
+
+
+def drops_to_xrp(drops):
+    """
+    XRP value of an integer amount of drops, as a float for the API edge. The
+    single division of an exact integer gives the float whose shortest
+    representation is the exact 6-decimal value below 10**15 drops (15
+    significant digits, 1 billion XRP); past that it is within a few drops.
+    Exact amounts are the drops.
+    """
+    if drops is None:
+        return None
+    return drops / DROPS_PER_XRP
+
@@ -1,86 +1,265 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context, g
 import os
+import hmac
+import asyncio
 from dotenv import load_dotenv
 import traceback
+import time
+import threading
+import itertools
 import json
+from array import array
+from struct import Struct
+from concurrent.futures import ThreadPoolExecutor
 
 # ------------------- XRPL-PY IMPORTS -------------------
 from xrpl.clients import JsonRpcClient
-from xrpl.wallet import generate_faucet_wallet, Wallet
-from xrpl.models.requests import AccountInfo, AccountTx
+from xrpl.wallet import Wallet
+from xrpl.models.requests import AccountInfo, AccountTx, Tx, SubmitOnly, ServerState
 from xrpl.models.transactions import Payment
-from xrpl.transaction import autofill, sign, submit
-from xrpl.utils import xrp_to_drops
+from xrpl.transaction import autofill
+from xrpl.asyncio.transaction import autofill as autofill_async
+from xrpl.asyncio.clients.exceptions import XRPLRequestFailureException
+from xrpl.ledger import get_latest_validated_ledger_sequence, get_fee
+from xrpl.core.binarycodec import decode
+
+from wallet_provisioning import create_wallets, fund_with_faucet, unfunded_wallets, append_env_atomic
+from async_client import PooledJsonRpcClient, PooledSyncJsonRpcClient, EventLoopThread, request_async, DEFAULT_MAX_CONNECTIONS
+from provenance import ProvenanceEngine
+from balance_history import BalanceHistoryIndex
+from anomaly import AnomalyDetector
+from export import LedgerReader, iter_csv
+from reconciliation import Reconciler
+from serialization import api_response, normalize_hierarchy, RecordJSONProvider
+from profiler import SamplingProfiler, install_signal_handler, format_collapsed, top_functions, DEFAULT_INTERVAL
+from records import TxRecord, RECORD_SIZE, payment_record, entry_ledger_index
+from hierarchy import HierarchyViews
+from snapshot import Snapshot, write_snapshot
+from amounts import to_drops, drops_to_xrp
+from tx_index import TransactionIndex, payer_tag, payer_tag_key
+from signing_service import SigningService, sign_json, transaction_hash
+from jurisdictions import load_jurisdictions, department_parents, owned_wallet_ids
+from graph_layout import FlowGraph, hierarchy_levels, layout_positions, build_lod_graph, split_edges, edge_link, OTHER_PREFIX, DEFAULT_TOP_K
+
+# Maximum number of sender wallets submitting in parallel during an allocation
+MAX_ALLOCATION_WORKERS = 8
+
+# Seconds between background ledger syncs (about one ledger close)
+LEDGER_SYNC_INTERVAL = 4
+
+# Minimum seconds between two warm-start snapshots of the ingested state
+SNAPSHOT_INTERVAL = 300
+
+# Snapshot row of one payment record: packed record data, sender and receiver codes
+_SNAPSHOT_ROW = Struct(f'<{RECORD_SIZE}sHH')
 
 # ------------------- SETUP FLASK -------------------
 app = Flask(__name__)
+app.json = RecordJSONProvider(app)
 
 # ------------------- XRPL TAX SYSTEM CLASS -------------------
 class XRPLTaxSystem:
-    def __init__(self):
+    def __init__(self, jurisdiction=None):
         """
         Initialize the XRPL client and either load existing wallets from .env
         or generate new ones if they don't exist.
+        Args:
+            jurisdiction: Only own (ingest, sign for, report on) the wallets of this
+                jurisdiction, for a sharded deployment; None owns every wallet
         """
         # Load environment variables
         load_dotenv()
-        
-        # Use the Devnet JSON-RPC endpoint
-        self.client = JsonRpcClient("https://s.devnet.rippletest.net:51234")
 
-        # Initialize system wallets (either from .env or generate new ones)
-        self.tax_pool = self._get_or_create_wallet('TAX_POOL')
-        self.exit_pool = self._get_or_create_wallet('EXIT_POOL')
-        self.gov_wallet = self._get_or_create_wallet('GOV_WALLET')
-        
+        # Tax payments are tagged with a keyed hash of the payer: fail now rather
+        # than on the first payment if the key is missing
+        payer_tag_key()
+
+        # Use the Devnet JSON-RPC endpoint (XRPL_URL overrides it, e.g. for a local stand-in)
+        xrpl_url = os.getenv('XRPL_URL', "https://s.devnet.rippletest.net:51234")
+        max_connections = int(os.getenv('XRPL_MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS))
+
+        # Client of the synchronous code (Flask routes, ingest, batch jobs): its
+        # connections stay open and are shared by every thread
+        self.client = PooledSyncJsonRpcClient(xrpl_url, max_connections)
+
+        # Client of the async request path (asgi.py): one connection pool shared
+        # by every request on the server's event loop
+        self.async_client = PooledJsonRpcClient(xrpl_url, max_connections)
+
+        # Loop thread of the sync wrappers when self.client is not the pooled
+        # client (which has its own), see _run_sync()
+        self._loop_thread = EventLoopThread("tax-system")
+
+        # Department hierarchy: department ID -> parent wallet ID, for every jurisdiction
+        self.jurisdictions = load_jurisdictions()
+        self.department_parents = department_parents(self.jurisdictions)
+
+        # Wallets owned by this shard (None: every wallet). Other wallets are only
+        # known by address, to name the counterparties of cross-jurisdiction payments.
+        self.jurisdiction = jurisdiction
+        self.owned_wallet_ids = None
+        if jurisdiction:
+            self.owned_wallet_ids = set(owned_wallet_ids(self.jurisdictions, jurisdiction))
+
         # Department wallet IDs
-        department_ids = [
-            "dept_transport", "dept_labor", "dept_education",
-            "penn_dept_transport", "penn_dept_labor", "penn_dept_education",
-            "pitt_dept_transport", "pitt_dept_labor", "pitt_dept_education",
-            "squirrel_hill_dept_transport"
-        ]
-        
+        department_ids = list(self.department_parents)
+
+        # Initialize all wallets (either from .env or generate new ones)
+        env_keys = ['TAX_POOL', 'EXIT_POOL', 'GOV_WALLET']
+        env_keys += [f"WALLET_{dept_id.upper()}" for dept_id in department_ids]
+        wallets = self._load_or_create_wallets(env_keys)
+
+        self.tax_pool = wallets['TAX_POOL']
+        self.exit_pool = wallets['EXIT_POOL']
+        self.gov_wallet = wallets['GOV_WALLET']
+
         # Initialize department wallets
         self.department_wallets = {}
         for dept_id in department_ids:
-            env_key = f"WALLET_{dept_id.upper()}"
-            self.department_wallets[dept_id] = self._get_or_create_wallet(env_key)
+            self.department_wallets[dept_id] = wallets[f"WALLET_{dept_id.upper()}"]
+
+        # Address -> wallet ID of every known wallet
+        self._wallet_names = {self.tax_pool.classic_address: "tax_pool",
+                              self.exit_pool.classic_address: "exit_pool",
+                              self.gov_wallet.classic_address: "government"}
+        self._wallet_names.update(
+            (wallet.classic_address, dept_id) for dept_id, wallet in self.department_wallets.items())
+
+        # Optional process pool for signing bulk submissions, started before any
+        # other thread so the worker processes are forked from a clean state
+        self.signer = None
+        signing_workers = int(os.getenv('SIGNING_WORKERS', '0'))
+        if signing_workers > 0:
+            self.signer = SigningService(dict(self._all_wallets()), signing_workers)
+            self.signer.warm_up()
+
+        # Incremental ledger ingestion: every new AccountTx entry is passed to the
+        # ingest hooks, and every successful payment between system wallets is
+        # appended to the ledger log and passed to the payment hooks
+        self.ledger_log = []
+        self.ingest_hooks = []
+        self.payment_hooks = []
+        self.sync_hooks = []
+        self.background_sync = None
+        self._ingested_hashes = set()
+        self._last_ledger_index = {}
+        self._ingest_lock = threading.Lock()
+
+        # Fund provenance ("follow the money")
+        self.provenance = ProvenanceEngine(mode=os.getenv('PROVENANCE_MODE', 'fifo'))
+        self.payment_hooks.append(self.provenance.ingest)
 
-    def _get_or_create_wallet(self, env_key: str) -> Wallet:
+        # Point-in-time balances of the system wallets
+        self.balance_history = BalanceHistoryIndex(
+            wallet.classic_address for _, wallet in self._all_wallets())
+        self.ingest_hooks.append(self.balance_history.ingest)
+
+        # Payments aggregated per (sender, receiver) edge for the graph view
+        self.flow_graph = FlowGraph()
+        self.payment_hooks.append(self.flow_graph.ingest)
+
+        # Lookups of single transactions by hash, payer tag, ledger range and wallet
+        self.tx_index = TransactionIndex()
+        self.payment_hooks.append(self.tx_index.ingest)
+
+        # Department hierarchy views: the shared graph is built once per ingested
+        # ledger, the levels of each department's view are memoized
+        self.hierarchy_views = HierarchyViews(self._build_hierarchy_graph, normalize_hierarchy, include=self.owns)
+        self.payment_hooks.append(self.hierarchy_views.ingest)
+        self.sync_hooks.append(self._advance_hierarchy_views)
+
+        # Unusually large, frequent or fast-exiting payments
+        self.anomaly_detector = AnomalyDetector()
+        self.payment_hooks.append(self.anomaly_detector.ingest)
+
+        # Reconciliation of derived and on-ledger balances of this shard's wallets,
+        # checked after every sync (payments with other shards' wallets are internal)
+        self.reconciler = Reconciler(
+            self._wallet_names, [wallet.classic_address for _, wallet in self._all_wallets()])
+        self.ingest_hooks.append(self.reconciler.ingest)
+        self.sync_hooks.append(self._reconcile)
+        self._spot_check_index = 0
+
+        # Warm-start snapshot of the ingested state, checkpointed after syncs
+        # (empty SNAPSHOT_PATH disables it)
+        self.snapshot_path = os.getenv('SNAPSHOT_PATH', os.path.join('snapshots', f"{jurisdiction or 'all'}.snap"))
+        # Components restored from their own state (get_state/load_state) rather
+        # than by replaying the payments, because replaying them is expensive or
+        # would record their events (anomalies) again
+        self._snapshot_states = {"provenance": self.provenance, "reconciler": self.reconciler,
+                                 "anomaly_detector": self.anomaly_detector}
+        self._last_checkpoint = (time.time(), 0)
+        self.sync_hooks.append(self._checkpoint)
+
+    def _load_or_create_wallets(self, env_keys) -> dict:
         """
-        Helper method to either load a wallet from environment variables
-        or create a new one and save it to .env
+        Helper method to load wallets from environment variables. Missing wallets
+        are derived offline, saved to .env in a single atomic write and funded
+        from the faucet concurrently, along with saved wallets that are not on
+        the ledger yet (their funding failed on an earlier start).
+        Raises:
+            RuntimeError if a wallet could not be funded
         """
-        try:
-            # Try to load existing wallet from environment
+        wallets = {}
+        for env_key in env_keys:
             seed = os.getenv(env_key)
             if seed:
-                return Wallet.from_seed(seed)
-            
-            # If no wallet exists, generate a new one
-            print(f"Generating new wallet for {env_key}...")
-            wallet = generate_faucet_wallet(self.client, debug=True)
-            
-            # Append the new wallet to .env file
-            with open('.env', 'a') as f:
-                f.write(f'\n{env_key}={wallet.seed}')
-            
-            return wallet
-            
+                wallets[env_key] = Wallet.from_seed(seed)
+
+        # A plain client: the pooled one starts a thread, and the signing
+        # processes are forked after this
+        client = JsonRpcClient(self.client.url)
+        try:
+            unfunded = unfunded_wallets(client, wallets)
         except Exception as e:
-            print(f"Error handling wallet {env_key}: {e}")
-            # If there's an error, generate a new wallet but don't save it
-            return generate_faucet_wallet(self.client, debug=True)
+            print(f"Could not check the saved wallets on the ledger: {e}")
+            unfunded = {}
+
+        missing = [env_key for env_key in env_keys if env_key not in wallets]
+        if missing:
+            print(f"Generating new wallets for {', '.join(missing)}...")
+            new_wallets = create_wallets(missing)
+
+            # Save the seeds before funding so a failed faucet call never loses a wallet
+            append_env_atomic('.env', {env_key: wallet.seed for env_key, wallet in new_wallets.items()})
+            wallets.update(new_wallets)
+            unfunded.update(new_wallets)
+
+        errors = fund_with_faucet(client, unfunded)
+        if errors:
+            raise RuntimeError(f"Could not fund wallets {', '.join(sorted(errors))} (seeds saved in .env, "
+                               f"funding is retried on the next start): {errors}")
+        return wallets
+
+    def _run_sync(self, function, *args):
+        """
+        Helper for the sync wrappers of the async methods: run `function(*args,
+        client)` to completion and wait for its result. With the pooled client it
+        runs on that client's loop thread with its async client, sharing its
+        connections; any other sync client (e.g. a local stand-in) runs on a loop
+        thread of the tax system. No event loop is created per call, and callers
+        may have a loop of their own running.
+        """
+        if isinstance(self.client, PooledSyncJsonRpcClient):
+            return self.client.loop_thread.run(function(*args, self.client.async_client))
+        return self._loop_thread.run(function(*args, self.client))
 
     def get_wallet_balance(self, wallet: Wallet) -> float:
         """Query the on-ledger balance (in XRP) for the given wallet."""
+        return drops_to_xrp(self.get_wallet_balance_drops(wallet))
+
+    def get_wallet_balance_drops(self, wallet: Wallet) -> int:
+        """Query the on-ledger balance (in drops) for the given wallet."""
+        return self._run_sync(self.get_wallet_balance_drops_async, wallet)
+
+    async def get_wallet_balance_drops_async(self, wallet: Wallet, client=None) -> int:
+        """Async get_wallet_balance_drops(), with `client` (default: the pooled async client)."""
         try:
             acct_info_request = AccountInfo(
                 account=wallet.classic_address,
                 ledger_index="validated"
             )
-            response = self.client.request(acct_info_request)
+            response = await request_async(client or self.async_client, acct_info_request)
             result = response.result
 
             # If the XRPL doesn't recognize the account, it won't have "account_data"
@@ -88,44 +267,56 @@ class XRPLTaxSystem:
                 # Possibly "actNotFound" if it were unfunded, but we are funding from faucet
                 raise ValueError(f"account_data not found in response: {result}")
 
-            balance_drops = float(result["account_data"]["Balance"])
-            balance_xrp = balance_drops / 1_000_000
-            return balance_xrp
+            return int(result["account_data"]["Balance"])
 
         except Exception as e:
             print(f"Error getting wallet balance: {e}")
-            return 0.0
+            return 0
 
 
     def process_tax_payment(self, amount_xrp: float, tax_payer_id: str):
         """
         Process a tax payment by sending XRP from tax pool to government wallet.
         Args:
-            amount_xrp: Amount of XRP to pay
+            amount_xrp: Amount of XRP to pay (number or decimal string)
             tax_payer_id: ID of the department paying tax
         """
+        return self._run_sync(self.process_tax_payment_async, amount_xrp, tax_payer_id)
+
+    async def process_tax_payment_async(self, amount_xrp: float, tax_payer_id: str, client=None):
+        """Async process_tax_payment(), with `client` (default: the pooled async client)."""
+        client = client or self.async_client
         try:
+            amount_drops = to_drops(amount_xrp)
+            if amount_drops <= 0:
+                raise ValueError(f"Invalid amount: {amount_xrp}")
+
+            if not self.owns("tax_pool"):
+                return {
+                    "success": False,
+                    "error": f"Tax pool is not managed by jurisdiction {self.jurisdiction}"
+                }
+
             # Check if tax pool has sufficient balance
-            pool_balance = self.get_wallet_balance(self.tax_pool)
-            if pool_balance < amount_xrp:
+            pool_balance = await self.get_wallet_balance_drops_async(self.tax_pool, client)
+            if pool_balance < amount_drops:
                 return {
                     "success": False,
-                    "error": f"Insufficient balance in tax pool. Current balance: {pool_balance} XRP"
+                    "error": f"Insufficient balance in tax pool. Current balance: {drops_to_xrp(pool_balance)} XRP"
                 }
 
             # Send from tax pool to government wallet
-            amount_drops = xrp_to_drops(amount_xrp)
             payment_tx = Payment(
                 account=self.tax_pool.classic_address,
-                amount=amount_drops,
+                amount=str(amount_drops),
                 destination=self.gov_wallet.classic_address,
-                source_tag=int(hash(tax_payer_id) % (2**32))  # Convert tax_payer_id to a 32-bit integer for tracking
+                source_tag=payer_tag(tax_payer_id)  # Stable 32-bit tag of the tax payer for lookups
             )
             
-            # Process payment
-            autofilled_tx = autofill(payment_tx, self.client)
-            signed_tx = sign(autofilled_tx, self.tax_pool)
-            response = submit(signed_tx, self.client)
+            # Process payment (signing is CPU work, kept off the event loop)
+            autofilled_tx = await autofill_async(payment_tx, client)
+            [(tx_blob, _)] = await asyncio.to_thread(self._sign_payments, self.tax_pool, [autofilled_tx])
+            response = await request_async(client, SubmitOnly(tx_blob=tx_blob))
 
             if not response.is_successful():
                 return {
@@ -144,7 +335,8 @@ class XRPLTaxSystem:
                 "success": True,
                 "message": "Tax payment processed successfully",
                 "tax_payer_id": tax_payer_id,
-                "amount": amount_xrp,
+                "payer_tag": payment_tx.source_tag,
+                "amount": drops_to_xrp(amount_drops),
                 "tx_hash": tx_hash
             }
 
@@ -160,36 +352,31 @@ class XRPLTaxSystem:
         Args:
             sender: ID of the sending wallet
             receiver: ID of the receiving wallet 
-            amount_xrp: Amount of XRP to transfer
+            amount_xrp: Amount of XRP to transfer (number or decimal string)
         Returns:
             Dictionary with transaction result
         """
+        return self._run_sync(self.distribute_funds_async, sender, receiver, amount_xrp)
+
+    async def distribute_funds_async(self, sender: str, receiver: str, amount_xrp: float, client=None):
+        """Async distribute_funds(), with `client` (default: the pooled async client)."""
+        client = client or self.async_client
         try:
+            amount_drops = to_drops(amount_xrp)
+            if amount_drops <= 0:
+                raise ValueError(f"Invalid amount: {amount_xrp}")
+
             # Get sender wallet
-            if sender == "GOV_WALLET":
-                sender_wallet = self.gov_wallet
-            elif sender == "tax_pool":
-                sender_wallet = self.tax_pool
-            elif sender == "exit_pool":
-                sender_wallet = self.exit_pool
-            elif sender in self.department_wallets:
-                sender_wallet = self.department_wallets[sender]
-            else:
+            sender_wallet = self._get_wallet(sender)
+            if sender_wallet is None or not self.owns(sender):
                 return {
                     "success": False,
                     "error": f"Invalid sender: {sender}"
                 }
             
             # Get receiver wallet
-            if receiver == "GOV_WALLET":
-                receiver_wallet = self.gov_wallet
-            elif receiver == "tax_pool":
-                receiver_wallet = self.tax_pool
-            elif receiver == "exit_pool":
-                receiver_wallet = self.exit_pool
-            elif receiver in self.department_wallets:
-                receiver_wallet = self.department_wallets[receiver]
-            else:
+            receiver_wallet = self._get_wallet(receiver)
+            if receiver_wallet is None:
                 return {
                     "success": False, 
                     "error": f"Invalid receiver: {receiver}"
@@ -202,29 +389,28 @@ class XRPLTaxSystem:
                 }
             
             # Check sender has sufficient balance
-            sender_balance = self.get_wallet_balance(sender_wallet)
-            if sender_balance < amount_xrp:
+            sender_balance = await self.get_wallet_balance_drops_async(sender_wallet, client)
+            if sender_balance < amount_drops:
                 return {
                     "success": False,
-                    "error": f"Insufficient balance. Sender has {sender_balance} XRP"
+                    "error": f"Insufficient balance. Sender has {drops_to_xrp(sender_balance)} XRP"
                 }
 
             # Create and submit payment transaction
-            amount_drops = xrp_to_drops(amount_xrp)
             payment_tx = Payment(
                 account=sender_wallet.classic_address,
-                amount=amount_drops,
+                amount=str(amount_drops),
                 destination=receiver_wallet.classic_address
             )
             
             # Autofill transaction details
-            autofilled_tx = autofill(payment_tx, self.client)
+            autofilled_tx = await autofill_async(payment_tx, client)
             
-            # Sign with sender's wallet
-            signed_tx = sign(autofilled_tx, sender_wallet)
+            # Sign with sender's wallet (CPU work, kept off the event loop)
+            [(tx_blob, _)] = await asyncio.to_thread(self._sign_payments, sender_wallet, [autofilled_tx])
             
             # Submit transaction
-            response = submit(signed_tx, self.client)
+            response = await request_async(client, SubmitOnly(tx_blob=tx_blob))
             
             if not response.is_successful():
                 return {
@@ -245,7 +431,7 @@ class XRPLTaxSystem:
                 "tx_hash": tx_hash,
                 "sender": sender,
                 "receiver": receiver,
-                "amount": amount_xrp
+                "amount": drops_to_xrp(amount_drops)
             }
 
         except Exception as e:
@@ -254,386 +440,1191 @@ class XRPLTaxSystem:
                 "error": str(e)
             }
 
-    def get_all_balances(self):
-        """Return a dict of the government + department wallet balances."""
+    def allocate_budget(self, plan, completed=None, unconfirmed=None):
+        """
+        Execute a multi-level allocation plan (a tree of transfers) in one call.
+        Args:
+            plan: {"sender": "GOV_WALLET", "allocations": [
+                      {"receiver": "dept_transport", "amount": 100, "allocations": [...]}, ...]}
+            completed: IDs of transfers already applied by a previous run (to resume)
+            unconfirmed: "unconfirmed" entries of a previous run, transfers submitted
+                         without a known outcome (to resume). They are looked up by
+                         hash before anything is signed again.
+        Returns:
+            Dictionary with the status of every transfer in the plan
+        """
+        try:
+            transfers = self._flatten_allocation_plan(plan)
+            completed = set(completed or [])
+
+            # Settle the transfers of the previous run whose outcome is unknown first:
+            # signing them again could pay twice if the first submission applied
+            by_id = {t["id"]: t for t in transfers}
+            for entry in unconfirmed or []:
+                t = by_id.get(entry.get("id"))
+                if t is None or t["id"] in completed:
+                    continue
+                t.update(tx_hash=entry.get("tx_hash"), tx_blob=entry.get("tx_blob"),
+                         last_ledger_sequence=entry.get("last_ledger_sequence"))
+                result = self._resolve_unconfirmed(t)
+                if result == "tesSUCCESS":
+                    completed.add(t["id"])
+                elif result is None:
+                    t["status"] = "unconfirmed"
+                    t["error"] = "Outcome of an earlier submission is still unknown"
+                else:
+                    t.update(tx_hash=None, tx_blob=None, last_ledger_sequence=None)
+
+            for t in transfers:
+                if t["id"] in completed:
+                    t["status"] = "completed"
+            if any(t["status"] == "unconfirmed" for t in transfers):
+                return self._allocation_result(transfers, "Earlier submissions are still unconfirmed, "
+                                                          "nothing was submitted")
+            pending = [t for t in transfers if t["id"] not in completed]
+
+            if not pending:
+                return self._allocation_result(transfers, "Nothing to allocate, all transfers already completed")
+
+            # Check the balances of all senders once, up front. Only the balance
+            # above the account reserve can be sent, and every payment burns a fee.
+            fee, reserve_base, reserve_inc = self._allocation_costs()
+            senders = sorted({t["sender"] for t in pending})
+            with ThreadPoolExecutor(max_workers=min(len(senders), MAX_ALLOCATION_WORKERS)) as pool:
+                balances = dict(zip(senders, pool.map(
+                    lambda s: self._spendable_drops(self._get_wallet(s), reserve_base, reserve_inc), senders)))
+
+            # Spendable balances and flows in drops, outflows including the fees
+            outflow, inflow = {}, {}
+            for t in pending:
+                outflow[t["sender"]] = outflow.get(t["sender"], 0) + t["amount_drops"] + fee
+                inflow[t["receiver"]] = inflow.get(t["receiver"], 0) + t["amount_drops"]
+
+            shortfalls = {
+                s: drops_to_xrp(outflow[s] - balances[s] - inflow.get(s, 0))
+                for s in senders if balances[s] + inflow.get(s, 0) < outflow[s]
+            }
+            if shortfalls:
+                return {
+                    "success": False,
+                    "error": f"Insufficient balance for allocation plan. Shortfall (XRP): {shortfalls}"
+                }
+
+            # A sender that already holds its whole outflow can go in the first round,
+            # others have to wait until the transfers funding them are validated
+            rounds = self._schedule_allocation_rounds(pending, balances, outflow)
+
+            for round_senders in rounds:
+                batches = []
+                for sender in round_senders:
+                    batch = [t for t in pending if t["sender"] == sender]
+                    funding = [t for t in pending if t["receiver"] == sender]
+                    if balances[sender] < outflow[sender] and any(t["status"] != "validated" for t in funding):
+                        for t in batch:
+                            t["status"] = "skipped"
+                            t["error"] = f"Funding transfer to {sender} did not complete"
+                        continue
+                    batches.append((sender, batch))
+
+                if not batches:
+                    continue
+                with ThreadPoolExecutor(max_workers=min(len(batches), MAX_ALLOCATION_WORKERS)) as pool:
+                    list(pool.map(lambda b: self._submit_sender_batch(*b), batches))
+
+            done = sum(t["status"] in ("validated", "completed") for t in transfers)
+            return self._allocation_result(transfers, f"Allocated {done} of {len(transfers)} transfers")
+
+        except Exception as e:
+            traceback.print_exc()
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    @staticmethod
+    def _allocation_result(transfers, message):
+        """
+        Helper to build the result of an allocation run. "completed" and
+        "unconfirmed" are what a resumed run needs back.
+        """
+        done = [t["id"] for t in transfers if t["status"] in ("validated", "completed")]
+        failed = [t["id"] for t in transfers if t["id"] not in done]
         return {
-            "government": self.get_wallet_balance(self.gov_wallet),
-            "dept_transport": self.get_wallet_balance(self.department_wallets["dept_transport"]),
-            "dept_labor": self.get_wallet_balance(self.department_wallets["dept_labor"]),
-            "dept_education": self.get_wallet_balance(self.department_wallets["dept_education"]),
-            "penn_dept_transport": self.get_wallet_balance(self.department_wallets["penn_dept_transport"]),
-            "penn_dept_labor": self.get_wallet_balance(self.department_wallets["penn_dept_labor"]),
-            "penn_dept_education": self.get_wallet_balance(self.department_wallets["penn_dept_education"]),
-            "pitt_dept_transport": self.get_wallet_balance(self.department_wallets["pitt_dept_transport"]),
-            "pitt_dept_labor": self.get_wallet_balance(self.department_wallets["pitt_dept_labor"]),
-            "pitt_dept_education": self.get_wallet_balance(self.department_wallets["pitt_dept_education"]),
-            "squirrel_hill_dept_transport": self.get_wallet_balance(self.department_wallets["squirrel_hill_dept_transport"]),
+            "success": not failed,
+            "message": message,
+            "transfers": transfers,
+            "completed": done,
+            "unconfirmed": [
+                {key: t[key] for key in ("id", "tx_hash", "tx_blob", "last_ledger_sequence")}
+                for t in transfers if t["status"] == "unconfirmed"
+            ],
+            "pending": failed
         }
 
+    def _allocation_costs(self):
+        """
+        Helper to read what sending costs on top of the amounts, from the node.
+        Returns:
+            (fee per payment, base reserve, reserve per owned object), in drops
+        """
+        response = self.client.request(ServerState())
+        if not response.is_successful():
+            raise XRPLRequestFailureException(response.result)
+        validated = response.result.get("state", {}).get("validated_ledger", {})
+        # The fee autofill() will use for the payments
+        fee = int(get_fee(self.client))
+        return fee, int(validated.get("reserve_base", 0)), int(validated.get("reserve_inc", 0))
+
+    def _spendable_drops(self, wallet: Wallet, reserve_base: int, reserve_inc: int) -> int:
+        """Helper to get the drops a wallet can send: its validated balance above its account reserve"""
+        response = self.client.request(AccountInfo(account=wallet.classic_address, ledger_index="validated"))
+        if not response.is_successful() or "account_data" not in response.result:
+            raise XRPLRequestFailureException(response.result)
+        account_data = response.result["account_data"]
+        return int(account_data["Balance"]) - reserve_base - int(account_data.get("OwnerCount", 0)) * reserve_inc
+
+    def _resolve_unconfirmed(self, transfer):
+        """
+        Helper to settle a transfer submitted without a known outcome. Its hash
+        is looked up; while its ledger window is open the same signed blob is
+        submitted again (a transaction applies at most once, so this cannot pay
+        twice) and polled until it is validated or can no longer apply.
+        Returns:
+            The transaction result ("expired" if it can no longer apply), or
+            None if the outcome is still unknown
+        """
+        try:
+            tx_blob = transfer.get("tx_blob")
+            if not tx_blob or transaction_hash(tx_blob) != transfer.get("tx_hash"):
+                raise ValueError("Signed blob does not match the transaction hash")
+            tx_json = decode(tx_blob)
+            sender_wallet = self._get_wallet(transfer["sender"])
+            if (tx_json.get("Account") != sender_wallet.classic_address
+                    or tx_json.get("Destination") != self._get_wallet(transfer["receiver"]).classic_address
+                    or tx_json.get("Amount") != str(transfer["amount_drops"])
+                    or tx_json.get("LastLedgerSequence") != transfer.get("last_ledger_sequence")):
+                raise ValueError("Signed blob is not this transfer")
+
+            response = self.client.request(Tx(transaction=transfer["tx_hash"]))
+            if response.is_successful() and response.result.get("validated"):
+                return response.result.get("meta", {}).get("TransactionResult", "unknown")
+            if get_latest_validated_ledger_sequence(self.client) <= transfer["last_ledger_sequence"]:
+                self.client.request(SubmitOnly(tx_blob=tx_blob))
+            return self._wait_for_validation(transfer["tx_hash"], transfer["last_ledger_sequence"])
+
+        except Exception as e:
+            print(f"Could not settle transfer {transfer['id']}: {e}")
+            return None
+
+    def _flatten_allocation_plan(self, plan):
+        """
+        Helper to turn a nested allocation plan into a flat list of transfers.
+        Each transfer ID is the path of wallet IDs from the root of the plan.
+        """
+        if not isinstance(plan, dict) or "sender" not in plan:
+            raise ValueError("Allocation plan must have a root 'sender'")
+
+        transfers = []
+        seen_ids = set()
+
+        def visit(sender, allocations, path):
+            if self._get_wallet(sender) is None or not self.owns(sender):
+                raise ValueError(f"Invalid sender: {sender}")
+            for allocation in allocations or []:
+                receiver = allocation["receiver"]
+                amount_drops = to_drops(allocation["amount"])
+                if self._get_wallet(receiver) is None:
+                    raise ValueError(f"Invalid receiver: {receiver}")
+                if receiver == sender:
+                    raise ValueError("Sender and receiver cannot be the same")
+                if amount_drops <= 0:
+                    raise ValueError(f"Invalid amount for {sender} -> {receiver}: {allocation['amount']}")
+
+                transfer_id = f"{path}/{receiver}"
+                if transfer_id in seen_ids:
+                    raise ValueError(f"Duplicate transfer in plan: {transfer_id}")
+                seen_ids.add(transfer_id)
+
+                transfers.append({
+                    "id": transfer_id,
+                    "sender": sender,
+                    "receiver": receiver,
+                    "amount": drops_to_xrp(amount_drops),
+                    "amount_drops": amount_drops,
+                    "status": "pending",
+                    "tx_hash": None,
+                    "tx_blob": None,
+                    "last_ledger_sequence": None,
+                    "error": None
+                })
+                visit(receiver, allocation.get("allocations"), transfer_id)
+
+        visit(plan["sender"], plan.get("allocations"), plan["sender"])
+        if not transfers:
+            raise ValueError("Allocation plan has no transfers")
+        return transfers
+
+    def _schedule_allocation_rounds(self, transfers, balances, outflow):
+        """
+        Helper to group senders into rounds. A round only contains senders whose
+        funds are either already on the ledger or delivered in an earlier round.
+        """
+        funders = {}
+        for t in transfers:
+            funders.setdefault(t["receiver"], set()).add(t["sender"])
+
+        round_of = {}
+
+        def get_round(sender, stack=()):
+            if sender in round_of:
+                return round_of[sender]
+            if balances.get(sender, 0) >= outflow[sender] or sender in stack:
+                round_of[sender] = 0
+            else:
+                round_of[sender] = 1 + max(
+                    (get_round(f, stack + (sender,)) for f in funders.get(sender, ())), default=-1)
+            return round_of[sender]
+
+        rounds = {}
+        for sender in outflow:
+            rounds.setdefault(get_round(sender), []).append(sender)
+        return [sorted(rounds[r]) for r in sorted(rounds)]
+
+    def _submit_sender_batch(self, sender, batch):
+        """
+        Helper to submit all transfers of one sender in sequence order.
+        Only the first transaction is autofilled, the following ones reuse its
+        fee and ledger window with consecutive sequence numbers, and the whole
+        batch is signed at once.
+        """
+        sender_wallet = self._get_wallet(sender)
+        try:
+            base_tx = autofill(Payment(
+                account=sender_wallet.classic_address,
+                amount=str(batch[0]["amount_drops"]),
+                destination=self._get_wallet(batch[0]["receiver"]).classic_address
+            ), self.client)
+            payments = [base_tx] + [
+                Payment(
+                    account=sender_wallet.classic_address,
+                    amount=str(t["amount_drops"]),
+                    destination=self._get_wallet(t["receiver"]).classic_address,
+                    sequence=base_tx.sequence + i,
+                    fee=base_tx.fee,
+                    last_ledger_sequence=base_tx.last_ledger_sequence,
+                    network_id=base_tx.network_id
+                )
+                for i, t in enumerate(batch[1:], 1)
+            ]
+            signed = self._sign_payments(sender_wallet, payments)
+        except Exception as e:
+            for t in batch:
+                t["status"] = "failed"
+                t["error"] = str(e)
+            return batch
+
+        submitted = []
+        for i, (t, (tx_blob, tx_hash)) in enumerate(zip(batch, signed)):
+            t["tx_hash"] = tx_hash
+            t["tx_blob"] = tx_blob
+            t["last_ledger_sequence"] = base_tx.last_ledger_sequence
+            try:
+                response = self.client.request(SubmitOnly(tx_blob=tx_blob))
+            except Exception as e:
+                # No answer: the transaction may have reached the network
+                error, in_doubt = str(e), True
+            else:
+                engine_result = response.result.get("engine_result", "")
+                if not response.is_successful():
+                    error, in_doubt = response.result.get("error_message", "Submit failed"), False
+                elif engine_result in ("tesSUCCESS", "terQUEUED"):
+                    t["status"] = "submitted"
+                    submitted.append(t)
+                    continue
+                elif engine_result.startswith("tec"):
+                    # The sequence number was consumed, later transfers can still apply
+                    t["status"] = "failed"
+                    t["error"] = response.result.get("engine_result_message", engine_result)
+                    continue
+                else:
+                    # ter results are held and may still apply, others are final
+                    error = response.result.get("engine_result_message", engine_result)
+                    in_doubt = engine_result.startswith("ter")
+
+            # Later transfers would have a sequence gap, so stop this sender here
+            t["error"] = error
+            if in_doubt:
+                # Its outcome is looked up by hash below, it must not be signed again
+                t["status"] = "unconfirmed"
+                submitted.append(t)
+            else:
+                t["status"] = "failed"
+            for rest in batch[i + 1:]:
+                rest["status"] = "not_submitted"
+                rest["error"] = f"Earlier transfer from {sender} failed"
+            break
+
+        for t in submitted:
+            try:
+                result = self._wait_for_validation(t["tx_hash"], base_tx.last_ledger_sequence)
+            except Exception as e:
+                t["status"] = "unconfirmed"
+                t["error"] = f"Could not check the transaction: {e}"
+                continue
+            if result == "tesSUCCESS":
+                t["status"] = "validated"
+                t["error"] = None
+            else:
+                t["status"] = "failed"
+                t["error"] = f"Transaction not validated: {result}"
+        return batch
+
+    def _sign_payments(self, wallet: Wallet, payments):
+        """
+        Helper to sign autofilled payments of one wallet, in the signing process
+        pool when it is enabled (SIGNING_WORKERS).
+        Returns:
+            List of (tx_blob, tx_hash)
+        """
+        if self.signer is not None:
+            wallet_id = self._get_dept_name(wallet.classic_address)
+            return self.signer.sign_batch([(wallet_id, payment) for payment in payments])
+        return [sign_json(payment.to_xrpl(), wallet) for payment in payments]
+
+    def _wait_for_validation(self, tx_hash: str, last_ledger_sequence: int, poll_interval: float = 1.0):
+        """Helper to poll until a transaction is validated or its ledger window expires."""
+        while True:
+            response = self.client.request(Tx(transaction=tx_hash))
+            if response.is_successful() and response.result.get("validated"):
+                return response.result.get("meta", {}).get("TransactionResult", "unknown")
+            if get_latest_validated_ledger_sequence(self.client) > last_ledger_sequence:
+                return "expired"
+            time.sleep(poll_interval)
+
+    def get_all_balances(self):
+        """Return a dict of the government + department wallet balances (owned wallets only)."""
+        return self._run_sync(self.get_all_balances_async)
+
+    async def get_all_balances_async(self, client=None):
+        """Async get_all_balances(), querying every wallet concurrently."""
+        wallets = [(wallet_id, wallet) for wallet_id, wallet in self._all_wallets()
+                   if wallet_id not in ("tax_pool", "exit_pool")]
+        balances = await asyncio.gather(
+            *(self.get_wallet_balance_drops_async(wallet, client) for _, wallet in wallets))
+        return {wallet_id: drops_to_xrp(drops) for (wallet_id, _), drops in zip(wallets, balances)}
+
     def get_transactions(self, wallet=None):
         """Get all transactions for a wallet or all wallets"""
+        return self._run_sync(self.get_transactions_async, wallet)
+
+    async def get_transactions_async(self, wallet=None, client=None):
+        """Async get_transactions(), fetching the wallets' histories concurrently."""
+        client = client or self.async_client
         try:
-            transactions = []
-            processed_tx_hashes = set()  # To avoid duplicate transactions
-            
             # Determine which wallets to check
             if wallet:
                 print(f"Checking transactions for specific wallet: {wallet.classic_address}")
                 wallets_to_check = [(None, wallet)]
             else:
                 print("Checking transactions for all wallets")
-                wallets_to_check = [
-                    ('tax_pool', self.tax_pool),
-                    ('government', self.gov_wallet),
-                    ('exit_pool', self.exit_pool)
-                ]
-                # Add all department wallets
-                for dept_id, dept_wallet in self.department_wallets.items():
-                    wallets_to_check.append((dept_id, dept_wallet))
+                wallets_to_check = self._all_wallets()
 
             print(f"Total wallets to check: {len(wallets_to_check)}")
+
+            # Get account transaction history with higher limit, for all wallets at once
+            responses = await asyncio.gather(*(
+                request_async(client, AccountTx(
+                    account=dept_wallet.classic_address,
+                    ledger_index_min=-1,  # Get all historical transactions
+                    ledger_index_max=-1,
+                    limit=200  # Increased limit
+                ))
+                for _, dept_wallet in wallets_to_check
+            ), return_exceptions=True)
             
-            # Check each wallet's transactions
-            for dept_name, dept_wallet in wallets_to_check:
-                print(f"\nChecking {dept_name if dept_name else 'wallet'}: {dept_wallet.classic_address}")
-                
-                try:
-                    # Get account transaction history with higher limit
-                    tx_request = AccountTx(
-                        account=dept_wallet.classic_address,
-                        ledger_index_min=-1,  # Get all historical transactions
-                        ledger_index_max=-1,
-                        limit=200  # Increased limit
-                    )
-                    response = self.client.request(tx_request)
-                    
-                    if not response.is_successful():
-                        print(f"Error getting transactions: {response.result.get('error_message', 'Unknown error')}")
-                        continue
-                    
-                    # Process each transaction
-                    for tx_info in response.result.get('transactions', []):
-                        try:
-                            # Get transaction data
-                            tx = tx_info.get('tx_json') or tx_info.get('tx') or tx_info.get('transaction')
-                            if not tx:
-                                print("No transaction data found")
-                                continue
-                            
-                            # Get transaction hash
-                            tx_hash = tx.get('hash', '') or tx_info.get('hash', '')
-                            if not tx_hash:
-                                print("No transaction hash found")
-                                continue
-                            
-                            # Skip if we've already processed this transaction
-                            if tx_hash in processed_tx_hashes:
-                                print(f"Skipping duplicate transaction: {tx_hash}")
-                                continue
-                            
-                            # Only process Payment type transactions
-                            if tx.get('TransactionType') != 'Payment':
-                                print(f"Skipping non-payment transaction: {tx.get('TransactionType')}")
-                                continue
-                            
-                            # Get sender and receiver
-                            sender = tx.get('Account', '')
-                            receiver = tx.get('Destination', '')
-                            if not sender or not receiver:
-                                print("Missing sender or receiver")
-                                continue
-                            
-                            # Convert addresses to department names
-                            sender_name = self._get_dept_name(sender)
-                            receiver_name = self._get_dept_name(receiver)
-                            if not sender_name or not receiver_name:
-                                print(f"Unknown sender or receiver: {sender} -> {receiver}")
-                                continue
-                            
-                            # Get amount
-                            meta = tx_info.get('meta', {})
-                            amount = None
-                            for amount_field in ['Amount', 'DeliverMax', 'delivered_amount']:
-                                if amount_field in tx:
-                                    amount = tx[amount_field]
-                                    break
-                                elif amount_field in meta:
-                                    amount = meta[amount_field]
-                                    break
-                            
-                            if not amount:
-                                print("No amount found")
-                                continue
-                            
-                            # Convert amount to XRP
-                            try:
-                                amount_xrp = float(amount) / 1_000_000
-                            except (ValueError, TypeError):
-                                print(f"Invalid amount format: {amount}")
-                                continue
-                            
-                            # Get timestamp
-                            timestamp = tx.get('date', 0)
-                            if timestamp:
-                                timestamp += 946684800  # Convert Ripple epoch to Unix timestamp
-                            
-                            # Check if transaction was successful
-                            if meta.get('TransactionResult') != 'tesSUCCESS':
-                                print(f"Transaction not successful: {meta.get('TransactionResult')}")
-                                continue
-                            
-                            # Add transaction to list
-                            processed_tx_hashes.add(tx_hash)
-                            transactions.append({
-                                'type': 'Tax Payment' if tx.get('SourceTag') else 'Payment',
-                                'sender': sender_name,
-                                'receiver': receiver_name,
-                                'amount_xrp': amount_xrp,
-                                'timestamp': timestamp,
-                                'tx_hash': tx_hash,
-                                'success': True
-                            })
-                            print(f"Added transaction: {tx_hash} - {sender_name} -> {receiver_name}: {amount_xrp} XRP")
-                            
-                        except Exception as tx_error:
-                            print(f"Error processing transaction: {tx_error}")
-                            continue
-                        
-                except Exception as wallet_error:
-                    print(f"Error checking wallet {dept_name}: {wallet_error}")
-                    continue
-                
-            print(f"Total transactions found: {len(transactions)}")
-            # Sort transactions by timestamp, newest first
-            transactions.sort(key=lambda x: x['timestamp'], reverse=True)
-            return transactions
-            
+            # Normalizing (and logging) every entry is CPU work, keep it off the event loop
+            return await asyncio.to_thread(self._collect_transactions, wallets_to_check, responses)
+
         except Exception as e:
             print(f"Error getting transactions: {e}")
             traceback.print_exc()
             return []
 
-    def get_department_hierarchy(self, dept_id):
+    def _collect_transactions(self, wallets_to_check, responses):
         """
-        Get hierarchical transaction data showing the entire transaction tree
-        Returns aggregated transaction data showing full transaction flow
+        Helper to turn the AccountTx responses of get_transactions_async() into
+        transaction records, without duplicates, newest first.
         """
-        try:
-            hierarchy_data = {
-                'nodes': [],
-                'links': [],
-                'transactions': {},
-                'chains': []
-            }
-            
-            # Initialize with all wallets
-            wallets_to_check = list(self.department_wallets.items())
-            wallets_to_check.append(('government', self.gov_wallet))
-            wallets_to_check.append(('tax_pool', self.tax_pool))
-            wallets_to_check.append(('exit_pool', self.exit_pool))
-            
-            print(f"Total wallets to check: {len(wallets_to_check)}")
-            
-            # First, add all wallets as nodes
-            for dept_name, _ in wallets_to_check:
-                hierarchy_data['nodes'].append({
-                    'id': dept_name,
-                    'name': dept_name.replace('_', ' ').title(),
-                    'level': 0  # We'll adjust levels later
-                })
-            
-            # Get all transactions for all wallets
-            all_transactions = []
-            processed_tx_hashes = set()
-            
-            for dept_name, wallet in wallets_to_check:
-                print(f"\nGetting transactions for {dept_name}")
-                txs = self.get_transactions(wallet)
-                for tx in txs:
-                    if tx['tx_hash'] not in processed_tx_hashes:
-                        processed_tx_hashes.add(tx['tx_hash'])
-                        all_transactions.append(tx)
-            
-            print(f"Total unique transactions found: {len(all_transactions)}")
-            
-            # Sort transactions by timestamp to establish flow
-            all_transactions.sort(key=lambda x: x['timestamp'])
+        transactions = []
+        processed_tx_hashes = set()  # To avoid duplicate transactions
+
+        # Check each wallet's transactions
+        for (dept_name, dept_wallet), response in zip(wallets_to_check, responses):
+            print(f"\nChecking {dept_name if dept_name else 'wallet'}: {dept_wallet.classic_address}")
             
-            # Process all transactions to create links
-            for tx in all_transactions:
-                sender = tx['sender']
-                receiver = tx['receiver']
+            try:
+                if isinstance(response, Exception):
+                    raise response
+
+                if not response.is_successful():
+                    print(f"Error getting transactions: {response.result.get('error_message', 'Unknown error')}")
+                    continue
                 
-                # Only process if both parties are in our wallet list
-                if any(name == sender for name, _ in wallets_to_check) and \
-                   any(name == receiver for name, _ in wallets_to_check):
-                    
-                    # Add or update link
-                    existing_link = next((l for l in hierarchy_data['links'] 
-                                       if l['source'] == sender and l['target'] == receiver), None)
+                # Process each transaction
+                for tx_info in response.result.get('transactions', []):
+                    try:
+                        record = self._normalize_transaction(tx_info)
+
+                        # Skip if we've already processed this transaction
+                        if record.hash_bytes in processed_tx_hashes:
+                            print(f"Skipping duplicate transaction: {record.tx_hash}")
+                            continue
+
+                        # Add transaction to list
+                        processed_tx_hashes.add(record.hash_bytes)
+                        transactions.append(record)
+                        print(f"Added transaction: {record.tx_hash} - {record.sender} -> {record.receiver}: {record.amount_xrp} XRP")
+                        
+                    except Exception as tx_error:
+                        print(f"Skipping transaction: {tx_error}")
+                        continue
                     
-                    if existing_link:
-                        existing_link['value'] += float(tx['amount_xrp'])
-                        existing_link['transactions'].append(tx)
-                    else:
-                        hierarchy_data['links'].append({
-                            'source': sender,
-                            'target': receiver,
-                            'value': float(tx['amount_xrp']),
-                            'transactions': [tx]
-                        })
-            
-            # Calculate levels based on transaction flow from the selected department
-            def calculate_levels(start_dept, visited=None, level=0):
-                if visited is None:
-                    visited = set()
-                
-                if start_dept in visited:
-                    return
-                
-                visited.add(start_dept)
-                
-                # Update level for this department
-                node = next(node for node in hierarchy_data['nodes'] if node['id'] == start_dept)
-                node['level'] = level
-                
-                # Find all outgoing transactions
-                outgoing_links = [link for link in hierarchy_data['links'] if link['source'] == start_dept]
-                
-                # Recursively update levels for connected departments
-                for link in outgoing_links:
-                    calculate_levels(link['target'], visited, level + 1)
-            
-            # Calculate levels starting from the selected department
-            calculate_levels(dept_id)
-            
-            # Calculate transaction metrics for all nodes
-            for node in hierarchy_data['nodes']:
-                dept = node['id']
-                dept_wallet = next(wallet for name, wallet in wallets_to_check if name == dept)
-                
-                # Get all transactions for this department
-                dept_txs = [tx for tx in all_transactions 
-                           if tx['sender'] == dept or tx['receiver'] == dept]
-                
-                sent_txs = [tx for tx in dept_txs if tx['sender'] == dept]
-                received_txs = [tx for tx in dept_txs if tx['receiver'] == dept]
-                
-                hierarchy_data['transactions'][dept] = {
-                    'total_sent': sum(float(tx['amount_xrp']) for tx in sent_txs),
-                    'total_received': sum(float(tx['amount_xrp']) for tx in received_txs),
-                    'balance': self.get_wallet_balance(dept_wallet),
-                    'transaction_count': len(dept_txs),
-                    'sent_transactions': sent_txs,
-                    'received_transactions': received_txs
-                }
+            except Exception as wallet_error:
+                print(f"Error checking wallet {dept_name}: {wallet_error}")
+                continue
             
-            print(f"\nFinal Statistics:")
-            print(f"Total wallets: {len(hierarchy_data['nodes'])}")
-            print(f"Total links: {len(hierarchy_data['links'])}")
-            print(f"Total transactions: {len(all_transactions)}")
-            
-            return hierarchy_data
-            
-        except Exception as e:
-            print(f"Error building hierarchy: {e}")
-            traceback.print_exc()
-            return {
-                'nodes': [],
-                'links': [],
-                'transactions': {},
-                'chains': []
+        print(f"Total transactions found: {len(transactions)}")
+        # Sort transactions by timestamp, newest first
+        transactions.sort(key=lambda x: x.timestamp, reverse=True)
+        return transactions
+
+    def _normalize_transaction(self, tx_info):
+        """
+        Helper to turn an AccountTx entry into a compact transaction record (TxRecord).
+        Raises ValueError for anything that is not a successful payment between
+        two system wallets.
+        """
+        return payment_record(tx_info, self._wallet_names)
+
+    def _all_wallets(self):
+        """Helper to list (wallet_id, wallet) for every system wallet owned by this shard"""
+        wallets = [
+            ('tax_pool', self.tax_pool),
+            ('government', self.gov_wallet),
+            ('exit_pool', self.exit_pool)
+        ]
+        wallets.extend(self.department_wallets.items())
+        if self.owned_wallet_ids is not None:
+            wallets = [(wallet_id, wallet) for wallet_id, wallet in wallets if wallet_id in self.owned_wallet_ids]
+        return wallets
+
+    def owns(self, wallet_id: str) -> bool:
+        """Whether this shard owns (ingests and signs for) a wallet"""
+        if wallet_id == "GOV_WALLET":
+            wallet_id = "government"
+        return self.owned_wallet_ids is None or wallet_id in self.owned_wallet_ids
+
+    def get_shard_summary(self):
+        """
+        Summary of this shard for the cross-jurisdiction aggregator: owned wallets
+        with their balances and payment totals, and the payment edges whose sender
+        is owned here (so every edge is reported by exactly one shard).
+        """
+        if self.background_sync is None:
+            self.sync_ledger()
+
+        wallets = {}
+        for wallet_id, wallet in self._all_wallets():
+            balance_drops = self.balance_history.balance_at(wallet.classic_address)
+            # Amounts stay in drops between shards, the aggregator converts them
+            wallets[wallet_id] = {
+                "address": wallet.classic_address,
+                "balance_drops": balance_drops or 0,
+                "sent_drops": self.flow_graph.total_sent.get(wallet_id, 0),
+                "received_drops": self.flow_graph.total_received.get(wallet_id, 0)
             }
 
-    def _get_dept_name(self, address: str) -> str:
-        """Helper to get department name from wallet address"""
-        try:
-            # Check system wallets first
-            if address == self.tax_pool.classic_address:
-                return "tax_pool"
-            if address == self.exit_pool.classic_address:
-                return "exit_pool"
-            if address == self.gov_wallet.classic_address:
-                return "government"
-            
-            # Check department wallets
-            for dept_name, wallet in self.department_wallets.items():
-                if address == wallet.classic_address:
-                    return dept_name
-            
-            # If no match found, return None instead of the address
-            return None
-            
-        except Exception as e:
-            print(f"Error in _get_dept_name for address {address}: {e}")
-            return None
+        with self.flow_graph.lock:
+            edges = [{"source": source, "target": target, **edge}
+                     for (source, target), edge in self.flow_graph.edges.items()
+                     if self.owns(source)]
 
-# Instantiate the tax system once (global to the Flask app)
-tax_system = XRPLTaxSystem()
+        return {
+            "jurisdiction": self.jurisdiction,
+            "wallets": wallets,
+            "edges": edges,
+            "last_ledger_index": max(self._last_ledger_index.values(), default=0),
+            "anomalies": self.anomaly_detector.get_stats(),
+            "hierarchy_views": self.hierarchy_views.get_stats(),
+            "unreconciled": self.reconciler.get_report()["unreconciled"]
+        }
 
-# ------------------- FLASK ROUTES -------------------
+    def sync_ledger(self):
+        """
+        Ingest the transactions validated since the last sync for every wallet.
+        New transactions are passed to the hooks oldest first.
+        Returns:
+            Number of new transactions
+        """
+        with self._ingest_lock:
+            new_entries = []
+            fetched = {}
+            failed = []
+            for _, wallet in self._all_wallets():
+                address = wallet.classic_address
+                try:
+                    entries, fetched[address] = self._fetch_new_transactions(wallet)
+                except Exception as e:
+                    print(f"Error getting transactions for {address}: {e}")
+                    failed.append(address)
+                    continue
+                new_entries.extend(entries)
 
-@app.route('/')
-def index():
-    """Render an index page (you need an index.html template or remove this route)."""
-    return render_template('index.html')
+            # Transactions are ingested in ledger order, so past the last ledger of a
+            # wallet that failed (whose later transactions are unknown) nothing is
+            # ingested yet; every wallet fetches from there again on the next sync
+            if failed:
+                safe_index = min(self._last_ledger_index.get(address, 0) for address in failed)
+                new_entries = [tx_info for tx_info in new_entries
+                               if self._entry_ledger_index(tx_info) <= safe_index]
+                fetched = {address: min(index, safe_index) for address, index in fetched.items()}
 
-@app.route('/admin')
-def admin():
-    """Render an index page (you need an index.html template or remove this route)."""
-    return render_template('admin.html')
+            # Order by ledger, then by position inside the ledger
+            new_entries.sort(key=lambda tx_info: (
+                self._entry_ledger_index(tx_info),
+                tx_info.get('meta', {}).get('TransactionIndex', 0)
+            ))
 
-@app.route('/api/balances', methods=['GET'])
-def get_balances():
-    """Return JSON with current balances of all wallets."""
-    return jsonify(tax_system.get_all_balances())
+            count = 0
+            for tx_info in new_entries:
+                tx = tx_info.get('tx_json') or tx_info.get('tx') or {}
+                tx_hash = tx.get('hash') or tx_info.get('hash')
+                if not tx_hash or tx_hash in self._ingested_hashes:
+                    continue
+                self._ingested_hashes.add(tx_hash)
+                count += 1
 
-@app.route('/api/pay-tax', methods=['POST'])
-def pay_tax():
-    """POST JSON: {"amount": number, "tax_payer_id": string}"""
-    try:
-        data = request.json
-        amount = float(data["amount"])
-        tax_payer_id = data["tax_payer_id"]
-        result = tax_system.process_tax_payment(amount, tax_payer_id)
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 400
+                for hook in self.ingest_hooks:
+                    self._run_hook(hook, tx_info, tx_hash)
 
-@app.route('/api/transfer', methods=['POST'])
-def transfer():
-    """
-    POST JSON: {
-        "sender": "dept_id",
-        "receiver": "dept_id",
-        "amount": number
+                try:
+                    record = self._normalize_transaction(tx_info)
+                except ValueError:
+                    continue
+                self.ledger_log.append(record)
+                for hook in self.payment_hooks:
+                    self._run_hook(hook, record, tx_hash)
+
+            # Only now are the fetched transactions part of the ingested state
+            for address, ledger_index in fetched.items():
+                if ledger_index is not None and ledger_index > self._last_ledger_index.get(address, -1):
+                    self._last_ledger_index[address] = ledger_index
+
+            if count:
+                print(f"Ingested {count} new transactions")
+
+            for hook in self.sync_hooks:
+                self._run_hook(hook, count, "sync")
+            return count
+
+    def _reconcile(self, new_transactions):
+        """
+        Sync hook: reconcile the wallets touched by the new transactions, and spot
+        check one wallet per sync (round robin) against the node's balance.
+        """
+        if not self.reconciler.reserve_drops:
+            response = self.client.request(ServerState())
+            if response.is_successful():
+                validated = response.result.get("state", {}).get("validated_ledger", {})
+                self.reconciler.reserve_drops = int(validated.get("reserve_base", 0))
+
+        unreconciled = self.reconciler.check()
+        if new_transactions and unreconciled:
+            print(f"Reconciliation: unexplained balance differences for {', '.join(unreconciled)}")
+
+        wallets = self._all_wallets()
+        wallet_id, wallet = wallets[self._spot_check_index % len(wallets)]
+        self._spot_check_index += 1
+        response = self.client.request(AccountInfo(account=wallet.classic_address, ledger_index="validated"))
+        if response.is_successful() and "account_data" in response.result:
+            # Only compare once ingest has caught up with the ledger the balance was read from
+            if response.result.get("ledger_index", 0) <= self._last_ledger_index.get(wallet.classic_address, 0):
+                self.reconciler.record_spot_check(wallet.classic_address, int(response.result["account_data"]["Balance"]))
+
+    def _advance_hierarchy_views(self, new_transactions):
+        """
+        Sync hook: serve the hierarchy views as of the last ingested ledger. Any
+        new transaction counts, not only payments: fees and failed (tec)
+        transactions change the balances shown in the views too.
+        """
+        if new_transactions:
+            self.hierarchy_views.advance(max(self._last_ledger_index.values(), default=0))
+
+    def _checkpoint(self, new_transactions):
+        """Sync hook: snapshot the ingested state every SNAPSHOT_INTERVAL seconds if it changed"""
+        checkpoint_time, checkpoint_count = self._last_checkpoint
+        if not self.snapshot_path or time.time() - checkpoint_time < SNAPSHOT_INTERVAL:
+            return
+        if len(self._ingested_hashes) == checkpoint_count:
+            return
+        self._write_snapshot()
+
+    def save_snapshot(self):
+        """Snapshot the ingested state now (e.g. before a planned restart)"""
+        with self._ingest_lock:
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        """
+        Helper to write the snapshot: the payment records as fixed-size rows, the
+        balance history as int64 columns, the reconciliation components and the
+        last ingested ledger of every wallet. The ingest lock must be held.
+        """
+        codes = {}
+        rows = bytearray()
+        for record in self.ledger_log:
+            rows += _SNAPSHOT_ROW.pack(record.data,
+                                       codes.setdefault(record.sender, len(codes)),
+                                       codes.setdefault(record.receiver, len(codes)))
+        balance_accounts, balance_columns = self.balance_history.export_columns()
+
+        meta = {
+            "created": time.time(),
+            "network": getattr(self.client, 'url', None),
+            "wallets": {wallet_id: wallet.classic_address for wallet_id, wallet in self._all_wallets()},
+            "last_ledger_index": self._last_ledger_index,
+            "record_wallet_ids": list(codes),
+            "balance_accounts": balance_accounts,
+            "provenance_mode": self.provenance.mode
+        }
+        sections = {"records": rows}
+        sections.update((f"balance_{name}", column) for name, column in balance_columns.items())
+        sections.update((f"state_{name}", json.dumps(component.get_state(), separators=(',', ':')).encode())
+                        for name, component in self._snapshot_states.items())
+
+        start = time.perf_counter()
+        write_snapshot(self.snapshot_path, meta, sections)
+        self._last_checkpoint = (time.time(), len(self._ingested_hashes))
+        print(f"Snapshot of {len(self.ledger_log)} payments written to {self.snapshot_path} "
+              f"in {time.perf_counter() - start:.2f}s")
+
+    def load_snapshot(self):
+        """
+        Warm start: restore the ingested state from the memory-mapped snapshot, so
+        the next sync only fetches the ledgers validated since the checkpoint. The
+        payment hooks (graph, indexes, hierarchy views) are rebuilt from the
+        snapshot's records without any XRPL request. A missing, corrupt, outdated
+        or foreign snapshot is ignored, and the state is rebuilt from the ledger.
+        Returns:
+            Number of payments restored
+        """
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return 0
+
+        start = time.perf_counter()
+        try:
+            with Snapshot(self.snapshot_path) as snapshot:
+                meta = snapshot.meta
+                self._validate_snapshot(meta)
+                wallet_ids = meta["record_wallet_ids"]
+                records = [TxRecord.from_data(data, wallet_ids[sender], wallet_ids[receiver])
+                           for data, sender, receiver in _SNAPSHOT_ROW.iter_unpack(snapshot.section("records"))]
+                balance_columns = {}
+                for name in ('ledger_indexes', 'timestamps', 'deltas'):
+                    column = balance_columns[name] = array('q')
+                    column.frombytes(snapshot.section(f"balance_{name}"))
+                # Plain JSON: loading a snapshot never runs code from the file
+                states = {name: json.loads(bytes(snapshot.section(f"state_{name}")))
+                          for name in self._snapshot_states}
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+            print(f"Ignoring snapshot {self.snapshot_path} ({e}), rebuilding from the ledger")
+            return 0
+
+        with self._ingest_lock:
+            self.balance_history.load_columns(meta["balance_accounts"], balance_columns)
+            for name, component in self._snapshot_states.items():
+                component.load_state(states[name])
+            self._last_ledger_index = dict(meta["last_ledger_index"])
+
+            # Components restored from their state (including the anomaly
+            # detector, so old anomalies are not recorded again) are not replayed
+            restored = [component.ingest for component in self._snapshot_states.values()]
+            hooks = [hook for hook in self.payment_hooks if hook not in restored]
+            for record in records:
+                tx_hash = record.tx_hash
+                self._ingested_hashes.add(tx_hash)
+                self.ledger_log.append(record)
+                for hook in hooks:
+                    self._run_hook(hook, record, tx_hash)
+            self.hierarchy_views.advance(max(self._last_ledger_index.values(), default=0))
+            self._last_checkpoint = (time.time(), len(self._ingested_hashes))
+
+        print(f"Restored {len(records)} payments up to ledger "
+              f"{max(self._last_ledger_index.values(), default=0)} from {self.snapshot_path} "
+              f"in {time.perf_counter() - start:.2f}s")
+        return len(records)
+
+    def _validate_snapshot(self, meta):
+        """Helper to reject snapshots of another network or wallet set, or of a reset network"""
+        if meta.get("network") != getattr(self.client, 'url', None):
+            raise ValueError(f"snapshot of network {meta.get('network')}")
+        if meta.get("wallets") != {wallet_id: wallet.classic_address for wallet_id, wallet in self._all_wallets()}:
+            raise ValueError("snapshot of another wallet set")
+        if meta.get("provenance_mode") != self.provenance.mode:
+            raise ValueError(f"snapshot of provenance mode {meta.get('provenance_mode')}")
+
+        last_ledger_index = max(meta["last_ledger_index"].values(), default=0)
+        try:
+            validated = get_latest_validated_ledger_sequence(self.client)
+        except Exception:
+            return  # Node unreachable: keep the snapshot, the sync will catch up later
+        if last_ledger_index > validated:
+            raise ValueError(f"snapshot ledger {last_ledger_index} is ahead of the network ({validated})")
+
+    @staticmethod
+    def _run_hook(hook, data, tx_hash):
+        """Helper to run one ingest hook without letting it stop the ingestion"""
+        try:
+            hook(data)
+        except Exception as e:
+            print(f"Error in ingest hook for {tx_hash}: {e}")
+            traceback.print_exc()
+
+    def _fetch_new_transactions(self, wallet: Wallet):
+        """
+        Helper to page through a wallet's transactions since its last ingested ledger.
+        Returns:
+            (validated AccountTx entries, last ledger index covered)
+        Raises:
+            XRPLRequestFailureException if the node returns an error
+        """
+        address = wallet.classic_address
+        entries = []
+        marker = None
+        last_index = self._last_ledger_index.get(address)
+        while True:
+            response = self.client.request(AccountTx(
+                account=address,
+                ledger_index_min=last_index + 1 if last_index is not None else -1,
+                ledger_index_max=-1,
+                forward=True,
+                limit=200,
+                marker=marker
+            ))
+            if not response.is_successful():
+                raise XRPLRequestFailureException(response.result)
+
+            entries.extend(tx_info for tx_info in response.result.get('transactions', [])
+                           if tx_info.get('validated', True))
+            marker = response.result.get('marker')
+            if not marker:
+                return entries, response.result.get('ledger_index_max', last_index)
+
+    _entry_ledger_index = staticmethod(entry_ledger_index)
+
+    def start_background_sync(self, interval: float = LEDGER_SYNC_INTERVAL):
+        """Start a daemon thread that calls sync_ledger() about once per ledger close."""
+        def run():
+            while True:
+                try:
+                    self.sync_ledger()
+                except Exception as e:
+                    print(f"Error syncing ledger: {e}")
+                time.sleep(interval)
+
+        self.background_sync = threading.Thread(target=run, name="ledger-sync", daemon=True)
+        self.background_sync.start()
+
+    def get_provenance(self, source: str, sink: str, start=None, end=None):
+        """
+        Follow the funds that entered `source` (optionally within a time window)
+        to `sink`, with the amount per path.
+        """
+        if self.background_sync is None:
+            self.sync_ledger()
+        return self.provenance.query(source, sink, start, end)
+
+    def find_transaction(self, tx_hash: str):
+        """Ingested payment record by transaction hash, or None"""
+        if self.background_sync is None:
+            self.sync_ledger()
+        return self.tx_index.get(tx_hash)
+
+    def find_tax_payments(self, tax_payer_id: str):
+        """Tax payments tagged with the payer tag of a tax payer, oldest first"""
+        if self.background_sync is None:
+            self.sync_ledger()
+        return self.tx_index.by_payer(payer_tag(tax_payer_id))
+
+    def get_transactions_in_range(self, ledger_min=None, ledger_max=None, wallet_id=None, offset=0, limit=100):
+        """
+        One page of the ingested payments in a ledger range, optionally only those
+        of one wallet.
+        Returns:
+            (list of records, total number of matching payments)
+        """
+        if wallet_id is not None:
+            wallet = self._get_wallet(wallet_id)
+            if wallet is None:
+                raise ValueError(f"Invalid wallet ID: {wallet_id}")
+            wallet_id = self._get_dept_name(wallet.classic_address)
+        if self.background_sync is None:
+            self.sync_ledger()
+        return self.tx_index.ledger_range(ledger_min, ledger_max, wallet_id, offset, limit)
+
+    def iter_transactions(self, wallet_ids=None, start=None, end=None):
+        """
+        Stream payments page by page straight from the XRPL, without holding the
+        history in memory (see LedgerReader.iter_transactions).
+        Args:
+            wallet_ids: IDs of the wallets to export (all wallets of this shard if None)
+            start: Only payments at or after this Unix time
+            end: Only payments before this Unix time
+        Yields:
+            Transaction records, oldest first for each wallet
+        """
+        reader = LedgerReader(self.client, self._wallet_names, [wallet_id for wallet_id, _ in self._all_wallets()])
+        return reader.iter_transactions(wallet_ids, start, end)
+
+    def get_transaction_graph(self, top_k=DEFAULT_TOP_K, min_value=0.0):
+        """
+        Graph of the wallets laid out by the department hierarchy, with payments
+        aggregated per edge and small flows collapsed into "other" buckets.
+        Args:
+            top_k: Maximum number of links kept per sending wallet
+            min_value: Links below this amount (XRP) are collapsed
+        """
+        if self.background_sync is None:
+            self.sync_ledger()
+
+        levels = hierarchy_levels(self.department_parents, ["tax_pool", "government"], ["exit_pool"])
+        positions = layout_positions(levels, self.department_parents)
+
+        nodes = []
+        for wallet_id, wallet in self._all_wallets():
+            balance_drops = self.balance_history.balance_at(wallet.classic_address)
+            nodes.append({
+                "id": wallet_id,
+                "name": wallet_id.replace('_', ' ').title(),
+                "level": levels[wallet_id],
+                "x": positions[wallet_id][0],
+                "y": positions[wallet_id][1],
+                "balance": drops_to_xrp(balance_drops or 0),
+                "totalSent": drops_to_xrp(self.flow_graph.total_sent.get(wallet_id, 0)),
+                "totalReceived": drops_to_xrp(self.flow_graph.total_received.get(wallet_id, 0))
+            })
+        return build_lod_graph(nodes, self.flow_graph, top_k, min_value)
+
+    def get_graph_edge(self, source, target, top_k=DEFAULT_TOP_K, min_value=0.0, offset=0, limit=100):
+        """
+        Drill down into one link of the transaction graph: the individual
+        transactions of an edge, or the edges collapsed into an "other" bucket.
+        """
+        if self.background_sync is None:
+            self.sync_ledger()
+
+        if target == f"{OTHER_PREFIX}{source}":
+            with self.flow_graph.lock:
+                outgoing = [(t, dict(edge)) for (s, t), edge in self.flow_graph.edges.items() if s == source]
+            _, collapsed = split_edges(outgoing, top_k, min_value)
+            return {
+                "source": source,
+                "target": target,
+                "total": len(collapsed),
+                "links": [edge_link(source, t, edge) for t, edge in collapsed[offset:offset + limit]]
+            }
+
+        transactions, total = self.flow_graph.edge_transactions(source, target, offset, limit)
+        return {
+            "source": source,
+            "target": target,
+            "total": total,
+            "transactions": transactions
+        }
+
+    def get_balance_at(self, wallet_id: str, ledger_index=None, timestamp=None):
+        """
+        Get a wallet's balance (in XRP) at the end of a ledger or at a point in time,
+        from the ingested history instead of the XRPL node.
+        Args:
+            wallet_id: ID of the wallet
+            ledger_index: Ledger index (inclusive)
+            timestamp: Unix timestamp (inclusive), used if no ledger_index is given
+        """
+        wallet = self._get_wallet(wallet_id)
+        if wallet is None:
+            raise ValueError(f"Invalid wallet ID: {wallet_id}")
+        if self.background_sync is None:
+            self.sync_ledger()
+
+        balance_drops = self.balance_history.balance_at(wallet.classic_address, ledger_index, timestamp)
+        if balance_drops is None:
+            raise ValueError(f"No balance history for wallet: {wallet_id}")
+        return drops_to_xrp(balance_drops)
+
+    def get_department_hierarchy(self, dept_id, normalized=False):
+        """
+        Get hierarchical transaction data showing the entire transaction tree
+        Returns aggregated transaction data showing full transaction flow, with
+        levels following the payments out of the selected department
+        """
+        try:
+            if self.background_sync is None:
+                self.sync_ledger()
+            hierarchy_data = self.hierarchy_views.view(dept_id, normalized)
+            if hierarchy_data is None:
+                raise ValueError(f"Invalid department ID: {dept_id}")
+            return hierarchy_data
+
+        except Exception as e:
+            print(f"Error building hierarchy: {e}")
+            traceback.print_exc()
+            return {
+                'nodes': [],
+                'links': [],
+                'transactions': {},
+                'chains': []
+            }
+
+    def _build_hierarchy_graph(self, ledger_index):
+        """
+        Helper to build the part of the department hierarchy shared by every
+        department from the payments ingested up to `ledger_index`: the wallets,
+        the links between them and every wallet's totals, balance and transactions.
+        """
+        wallets = self._all_wallets()
+        sent = {wallet_id: [] for wallet_id, _ in wallets}
+        received = {wallet_id: [] for wallet_id, _ in wallets}
+        links = {}
+        count = 0
+
+        for tx in self.ledger_log[:]:
+            # A sync running meanwhile may already have appended later ledgers
+            if tx.ledger_index > ledger_index:
+                break
+            count += 1
+            sender_txs, receiver_txs = sent.get(tx.sender), received.get(tx.receiver)
+            if sender_txs is not None:
+                sender_txs.append(tx)
+            if receiver_txs is not None:
+                receiver_txs.append(tx)
+            # Only link wallets that are both in our wallet list
+            if sender_txs is not None and receiver_txs is not None:
+                link = links.get((tx.sender, tx.receiver))
+                if link is None:
+                    link = links[(tx.sender, tx.receiver)] = {
+                        'source': tx.sender,
+                        'target': tx.receiver,
+                        'value': 0,
+                        'transactions': []
+                    }
+                link['value'] += tx.amount_drops
+                link['transactions'].append(tx)
+
+        # Link values are summed in drops, converted once
+        for link in links.values():
+            link['value'] = drops_to_xrp(link['value'])
+
+        transactions = {}
+        for wallet_id, wallet in wallets:
+            # Balance at the graph's ledger, from the node only for wallets without history
+            balance_drops = self.balance_history.balance_at(wallet.classic_address, ledger_index=ledger_index)
+            transactions[wallet_id] = {
+                'total_sent': drops_to_xrp(sum(tx.amount_drops for tx in sent[wallet_id])),
+                'total_received': drops_to_xrp(sum(tx.amount_drops for tx in received[wallet_id])),
+                'balance': drops_to_xrp(balance_drops) if balance_drops is not None else self.get_wallet_balance(wallet),
+                'transaction_count': len(sent[wallet_id]) + len(received[wallet_id]),
+                'sent_transactions': sent[wallet_id],
+                'received_transactions': received[wallet_id]
+            }
+
+        print(f"Built hierarchy graph at ledger {ledger_index}: {len(wallets)} wallets, "
+              f"{len(links)} links, {count} transactions")
+        return {
+            'nodes': [{'id': wallet_id, 'name': wallet_id.replace('_', ' ').title()} for wallet_id, _ in wallets],
+            'links': list(links.values()),
+            'transactions': transactions
+        }
+
+    def _get_wallet(self, wallet_id: str):
+        """Helper to get a system wallet from its ID (None if unknown)"""
+        if wallet_id in ("GOV_WALLET", "government"):
+            return self.gov_wallet
+        if wallet_id == "tax_pool":
+            return self.tax_pool
+        if wallet_id == "exit_pool":
+            return self.exit_pool
+        return self.department_wallets.get(wallet_id)
+
+    def _get_dept_name(self, address: str) -> str:
+        """Helper to get department name from wallet address"""
+        # If no match found, return None instead of the address
+        return self._wallet_names.get(address)
+
+# Instantiate the tax system once (global to the Flask app)
+tax_system = XRPLTaxSystem(jurisdiction=os.getenv('JURISDICTION'))
+tax_system.load_snapshot()
+
+# On-demand sampling profiler for production diagnosis (admin only)
+profiler = SamplingProfiler(interval=float(os.getenv('PROFILE_INTERVAL', DEFAULT_INTERVAL)))
+
+def _is_admin(headers=None) -> bool:
+    """
+    Whether the request carries the admin token (ADMIN_TOKEN; admin routes are
+    disabled without it). `headers` defaults to the current Flask request's.
+    """
+    admin_token = os.getenv('ADMIN_TOKEN')
+    if not admin_token:
+        return False
+    headers = request.headers if headers is None else headers
+    token = headers.get('X-Admin-Token', '')
+    authorization = headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        token = authorization[len('Bearer '):]
+    return hmac.compare_digest(token.encode(), admin_token.encode())
+
+def start_profile(headers):
+    """
+    Start profiling the current thread when an admin sent the X-Profile header.
+    Returns:
+        Profile session to pass to finish_profile(), or None
+    """
+    if headers.get('X-Profile') and _is_admin(headers):
+        try:
+            return profiler.start({threading.get_ident()})
+        except ValueError:
+            pass  # Too many profiles running, serve the request unprofiled
+    return None
+
+def finish_profile(session, response):
+    """Stop a request's profile and attach its ID, to fetch from /api/admin/profile/<id>"""
+    if session is not None:
+        result = profiler.stop(session)
+        response.headers['X-Profile-Id'] = str(result['id'])
+        response.headers['X-Profile-Samples'] = str(result['samples'])
+    return response
+
+@app.before_request
+def start_request_profile():
+    """Profile this request's thread when an admin sends the X-Profile header"""
+    g.profile_session = start_profile(request.headers)
+
+@app.after_request
+def stop_request_profile(response):
+    """Attach the ID of the request's profile, if any"""
+    return finish_profile(g.pop('profile_session', None), response)
+
+# ------------------- SHARED ROUTE HELPERS -------------------
+# Request parsing and response bodies of the routes that asgi.py also serves
+# as async views, so both request paths answer the same way
+
+def error_response(error):
+    """Body and status of a failed API request"""
+    return {"success": False, "error": str(error)}, 400
+
+def _json_object(data):
+    """Helper to check that a request body parsed (get_json(silent=True)) into a JSON object"""
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    return data
+
+def tax_payment_args(data):
+    """(amount, tax payer ID) of a /api/pay-tax request body"""
+    data = _json_object(data)
+    return data["amount"], data["tax_payer_id"]
+
+def transfer_args(data):
+    """(sender, receiver, amount) of a /api/transfer request body"""
+    data = _json_object(data)
+    return data["sender"], data["receiver"], data["amount"]
+
+def history_wallet(wallet_id):
+    """Wallet whose history /api/transactions/<wallet_id> serves (ValueError if there is none)"""
+    wallet = tax_system._get_wallet(wallet_id)
+    if wallet is None or wallet_id == "GOV_WALLET":
+        raise ValueError(f"Invalid wallet ID: {wallet_id}")
+    return wallet
+
+def transactions_response(transactions):
+    """Body of /api/transactions"""
+    return {"success": True, "transactions": transactions}
+
+def wallet_transactions_response(wallet_id, wallet, balance, transactions):
+    """Body of /api/transactions/<wallet_id>"""
+    return {
+        "success": True,
+        "wallet_id": wallet_id,
+        "wallet_address": wallet.classic_address,
+        "wallet_balance": balance,
+        "transactions": transactions
+    }
+
+# ------------------- FLASK ROUTES -------------------
+
+@app.route('/')
+def index():
+    """Render an index page (you need an index.html template or remove this route)."""
+    return render_template('index.html')
+
+@app.route('/admin')
+def admin():
+    """Render an index page (you need an index.html template or remove this route)."""
+    return render_template('admin.html')
+
+@app.route('/api/balances', methods=['GET'])
+def get_balances():
+    """Return JSON with current balances of all wallets."""
+    return jsonify(tax_system.get_all_balances())
+
+@app.route('/api/pay-tax', methods=['POST'])
+def pay_tax():
+    """POST JSON: {"amount": number, "tax_payer_id": string}"""
+    try:
+        return jsonify(tax_system.process_tax_payment(*tax_payment_args(request.get_json(silent=True))))
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/transfer', methods=['POST'])
+def transfer():
+    """
+    POST JSON: {
+        "sender": "dept_id",
+        "receiver": "dept_id",
+        "amount": number
     }
     """
     try:
-        data = request.json
-        sender = data["sender"]
-        receiver = data["receiver"]
-        amount = float(data["amount"])
-        
-        result = tax_system.distribute_funds(sender, receiver, amount)
-        return jsonify(result)
+        return jsonify(tax_system.distribute_funds(*transfer_args(request.get_json(silent=True))))
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/allocate', methods=['POST'])
+def allocate():
+    """
+    POST JSON: {
+        "plan": {
+            "sender": "GOV_WALLET",
+            "allocations": [
+                {"receiver": "dept_id", "amount": number, "allocations": [...]}
+            ]
+        },
+        "completed": ["transfer_id", ...],  (optional, to resume a previous run)
+        "unconfirmed": [{...}, ...]         (optional, the "unconfirmed" entries of that run)
+    }
+    """
+    try:
+        data = _json_object(request.get_json(silent=True))
+        return jsonify(tax_system.allocate_budget(data["plan"], data.get("completed"), data.get("unconfirmed")))
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 400
+        return error_response(e)
 
 @app.route('/api/transactions', methods=['GET'])
 def get_transactions():
     """Get all transactions for the system"""
     try:
-        transactions = tax_system.get_transactions()
-        return jsonify({
-            "success": True,
-            "transactions": transactions
-        })
+        return transactions_response(tax_system.get_transactions())
     except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 400
+        return error_response(e)
 
 
 @app.route('/transactions')
@@ -643,41 +1634,14 @@ def transactions():
 
 @app.route('/api/transactions/<wallet_id>', methods=['GET'])
 def get_wallet_transactions(wallet_id):
-    """Get transactions for a specific wallet"""
+    """Get transactions and the current balance of a specific wallet"""
     try:
-        # Get the wallet object based on wallet_id
-        if wallet_id == 'government':
-            wallet = tax_system.gov_wallet
-        elif wallet_id == 'tax_pool':
-            wallet = tax_system.tax_pool
-        elif wallet_id == 'exit_pool':
-            wallet = tax_system.exit_pool
-        elif wallet_id in tax_system.department_wallets:
-            wallet = tax_system.department_wallets[wallet_id]
-        else:
-            return jsonify({
-                "success": False,
-                "error": f"Invalid wallet ID: {wallet_id}"
-            }), 400
-
-        # Get transactions for this wallet
+        wallet = history_wallet(wallet_id)
         transactions = tax_system.get_transactions(wallet)
-        
-        # Get current balance
         balance = tax_system.get_wallet_balance(wallet)
-        
-        return jsonify({
-            "success": True,
-            "wallet_id": wallet_id,
-            "wallet_address": wallet.classic_address,
-            "wallet_balance": balance,
-            "transactions": transactions
-        })
+        return wallet_transactions_response(wallet_id, wallet, balance, transactions)
     except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 400
+        return error_response(e)
 
 @app.route('/department-tracking')
 def department_tracking():
@@ -686,14 +1650,20 @@ def department_tracking():
 
 @app.route('/api/department-hierarchy/<dept_id>')
 def get_department_data(dept_id):
-    """Get hierarchical transaction data for a department"""
+    """
+    Get hierarchical transaction data for a department.
+    ?format=normalized sends every transaction once (transaction_list), with
+    links and per-wallet lists referencing them by index; the default is the
+    nested shape.
+    """
     try:
-        hierarchy_data = tax_system.get_department_hierarchy(dept_id)
-        if hierarchy_data:
-            return jsonify({
+        hierarchy_data = tax_system.get_department_hierarchy(
+            dept_id, normalized=request.args.get('format') == 'normalized')
+        if hierarchy_data['nodes']:
+            return api_response({
                 "success": True,
                 "data": hierarchy_data
-            })
+            }, request=request)
         else:
             return jsonify({
                 "success": False,
@@ -705,6 +1675,308 @@ def get_department_data(dept_id):
             "error": str(e)
         }), 400
 
+@app.route('/api/provenance', methods=['GET'])
+def get_provenance():
+    """
+    GET /api/provenance?source=tax_pool&sink=dept_id&start=unix_ts&end=unix_ts
+    How much of the funds that entered source (between start and end) reached sink,
+    and through which paths.
+    """
+    try:
+        source = request.args["source"]
+        sink = request.args["sink"]
+        start = request.args.get("start", type=float)
+        end = request.args.get("end", type=float)
+        return jsonify({
+            "success": True,
+            "data": tax_system.get_provenance(source, sink, start, end)
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+@app.route('/api/tx/<tx_hash>', methods=['GET'])
+def get_transaction_by_hash(tx_hash):
+    """Look up one payment by transaction hash"""
+    try:
+        transaction = tax_system.find_transaction(tx_hash)
+        if transaction is None:
+            return jsonify({
+                "success": False,
+                "error": f"Transaction not found (or not validated yet): {tx_hash}"
+            }), 404
+        return jsonify({
+            "success": True,
+            "transaction": transaction
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+@app.route('/api/tx/payer/<tax_payer_id>', methods=['GET'])
+def get_tax_payments_by_payer(tax_payer_id):
+    """
+    GET /api/tx/payer/<tax_payer_id>
+    Tax payments of one tax payer, found by the payer tag (SourceTag) of its ID
+    (admin only: the tag links a payer to its payments on the public ledger).
+    """
+    if not _is_admin():
+        return jsonify({"success": False, "error": "Admin token required"}), 403
+    try:
+        transactions = tax_system.find_tax_payments(tax_payer_id)
+        return jsonify({
+            "success": True,
+            "tax_payer_id": tax_payer_id,
+            "payer_tag": payer_tag(tax_payer_id),
+            "transactions": transactions
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+@app.route('/api/tx/ledger', methods=['GET'])
+def get_transactions_by_ledger():
+    """
+    GET /api/tx/ledger?min=ledger_index&max=ledger_index&wallet=wallet_id&offset=0&limit=100
+    Payments validated in a ledger range, oldest first.
+    """
+    try:
+        transactions, total = tax_system.get_transactions_in_range(
+            ledger_min=request.args.get("min", type=int),
+            ledger_max=request.args.get("max", type=int),
+            wallet_id=request.args.get("wallet"),
+            offset=request.args.get("offset", 0, type=int),
+            limit=request.args.get("limit", 100, type=int)
+        )
+        return jsonify({
+            "success": True,
+            "total": total,
+            "transactions": transactions
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+@app.route('/api/balance-history/<wallet_id>', methods=['GET'])
+def get_balance_history(wallet_id):
+    """
+    GET /api/balance-history/<wallet_id>?ledger_index=N&ledger_index=M...
+    or  /api/balance-history/<wallet_id>?timestamp=unix_ts&timestamp=...
+    Balance of a wallet at the end of each given ledger or point in time.
+    """
+    try:
+        ledger_indexes = request.args.getlist("ledger_index", type=int)
+        timestamps = request.args.getlist("timestamp", type=float)
+        if ledger_indexes:
+            balances = [{"ledger_index": index,
+                         "balance": tax_system.get_balance_at(wallet_id, ledger_index=index)}
+                        for index in ledger_indexes]
+        elif timestamps:
+            balances = [{"timestamp": ts,
+                         "balance": tax_system.get_balance_at(wallet_id, timestamp=ts)}
+                        for ts in timestamps]
+        else:
+            balances = [{"balance": tax_system.get_balance_at(wallet_id)}]
+
+        return jsonify({
+            "success": True,
+            "wallet_id": wallet_id,
+            "balances": balances
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+@app.route('/api/export/transactions.csv', methods=['GET'])
+def export_transactions_csv():
+    """
+    GET /api/export/transactions.csv?wallet=dept_id&wallet=...&start=unix_ts&end=unix_ts
+    Stream the public spending ledger as chunked CSV.
+    """
+    try:
+        records = tax_system.iter_transactions(
+            request.args.getlist("wallet"),
+            request.args.get("start", type=float),
+            request.args.get("end", type=float)
+        )
+        # Read the first record now so invalid filters still get a JSON error
+        first = next(records, None)
+        if first is not None:
+            records = itertools.chain([first], records)
+        return Response(
+            stream_with_context(iter_csv(records)),
+            mimetype='text/csv',
+            headers={"Content-Disposition": "attachment; filename=transactions.csv"}
+        )
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+@app.route('/api/transaction-graph', methods=['GET'])
+def get_transaction_graph():
+    """
+    GET /api/transaction-graph?top_k=5&min_value=0
+    Laid out, level-of-detail transaction graph for the department tracking view.
+    """
+    try:
+        graph = tax_system.get_transaction_graph(
+            request.args.get("top_k", DEFAULT_TOP_K, type=int),
+            request.args.get("min_value", 0.0, type=float)
+        )
+        return jsonify({
+            "success": True,
+            "data": graph
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+@app.route('/api/transaction-graph/edge', methods=['GET'])
+def get_transaction_graph_edge():
+    """
+    GET /api/transaction-graph/edge?source=id&target=id&offset=0&limit=100
+    Individual transactions of one link (or the links collapsed into an "other"
+    bucket, with the same top_k/min_value as the graph request).
+    """
+    try:
+        edge = tax_system.get_graph_edge(
+            request.args["source"],
+            request.args["target"],
+            request.args.get("top_k", DEFAULT_TOP_K, type=int),
+            request.args.get("min_value", 0.0, type=float),
+            request.args.get("offset", 0, type=int),
+            min(request.args.get("limit", 100, type=int), 1000)
+        )
+        return jsonify({
+            "success": True,
+            "data": edge
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+@app.route('/api/signing-metrics', methods=['GET'])
+def get_signing_metrics():
+    """Throughput and latency of the signing process pool (if enabled)"""
+    if tax_system.signer is None:
+        return jsonify({
+            "success": False,
+            "error": "Signing pool is disabled (set SIGNING_WORKERS to enable it)"
+        }), 400
+    return jsonify({
+        "success": True,
+        "metrics": tax_system.signer.get_metrics()
+    })
+
+@app.route('/api/anomalies', methods=['GET'])
+def get_anomalies():
+    """
+    GET /api/anomalies?since=unix_ts&kind=amount|rate|fast_exit&limit=100
+    Most recent payments flagged by the anomaly detector, newest first.
+    """
+    try:
+        if tax_system.background_sync is None:
+            tax_system.sync_ledger()
+        return jsonify({
+            "success": True,
+            "stats": tax_system.anomaly_detector.get_stats(),
+            "anomalies": tax_system.anomaly_detector.get_events(
+                since=request.args.get("since", type=float),
+                kind=request.args.get("kind"),
+                limit=request.args.get("limit", 100, type=int)
+            )
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+@app.route('/api/shard/summary', methods=['GET'])
+def get_shard_summary():
+    """Summary of this shard's wallets and payment edges, for the aggregator"""
+    try:
+        return api_response({
+            "success": True,
+            "data": tax_system.get_shard_summary()
+        }, request=request)
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+@app.route('/api/reconciliation', methods=['GET'])
+def get_reconciliation():
+    """Latest reconciliation of derived and on-ledger balances for every wallet"""
+    try:
+        if tax_system.background_sync is None:
+            tax_system.sync_ledger()
+        return jsonify({
+            "success": True,
+            "data": tax_system.reconciler.get_report()
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics"""
+    return Response(tax_system.reconciler.get_metrics(), mimetype='text/plain; version=0.0.4')
+
+def _profile_response(result):
+    """Helper to return a profile as collapsed stacks (default, for flamegraph tools) or JSON"""
+    if request.args.get('format') == 'json':
+        return jsonify({
+            "success": True,
+            "data": dict(result, top=top_functions(result, request.args.get('top', 20, type=int)))
+        })
+    response = Response(format_collapsed(result), mimetype='text/plain')
+    response.headers['X-Profile-Id'] = str(result['id'])
+    return response
+
+@app.route('/api/admin/profile', methods=['GET'])
+def profile_server():
+    """
+    Sample every thread for ?seconds= (default 10, at most 60) and return the
+    profile. Requires the admin token.
+    """
+    if not _is_admin():
+        return jsonify({"success": False, "error": "Admin token required"}), 403
+    try:
+        return _profile_response(profiler.profile(request.args.get('seconds', 10, type=float)))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 429
+
+@app.route('/api/admin/profile/<int:profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """A finished profile (e.g. of a request sent with X-Profile) by ID. Requires the admin token."""
+    if not _is_admin():
+        return jsonify({"success": False, "error": "Admin token required"}), 403
+    result = profiler.get_result(profile_id)
+    if result is None:
+        return jsonify({"success": False, "error": f"Unknown profile: {profile_id}"}), 404
+    return _profile_response(result)
+
 @app.route('/api/transaction-tree')
 def get_transaction_tree():
     """Get the complete transaction tree data"""
@@ -712,42 +1984,13 @@ def get_transaction_tree():
         # Get all wallets and their balances
         nodes = []
         
-        # Add government wallet
-        gov_balance = tax_system.get_wallet_balance(tax_system.gov_wallet)
-        nodes.append({
-            "id": "government",
-            "name": "Federal Government",
-            "balance": gov_balance,
-            "totalSent": 0,
-            "totalReceived": 0
-        })
-        
-        # Add pool wallets
-        tax_balance = tax_system.get_wallet_balance(tax_system.tax_pool)
-        nodes.append({
-            "id": "tax_pool",
-            "name": "Tax Pool",
-            "balance": tax_balance,
-            "totalSent": 0,
-            "totalReceived": 0
-        })
-        
-        exit_balance = tax_system.get_wallet_balance(tax_system.exit_pool)
-        nodes.append({
-            "id": "exit_pool",
-            "name": "Exit Pool",
-            "balance": exit_balance,
-            "totalSent": 0,
-            "totalReceived": 0
-        })
-        
-        # Add department wallets
-        for dept_id, wallet in tax_system.department_wallets.items():
-            balance = tax_system.get_wallet_balance(wallet)
+        # Add the government, pool and department wallets of this shard
+        names = {"government": "Federal Government", "tax_pool": "Tax Pool", "exit_pool": "Exit Pool"}
+        for wallet_id, wallet in tax_system._all_wallets():
             nodes.append({
-                "id": dept_id,
-                "name": dept_id.replace('_', ' ').title(),
-                "balance": balance,
+                "id": wallet_id,
+                "name": names.get(wallet_id, wallet_id.replace('_', ' ').title()),
+                "balance": tax_system.get_wallet_balance(wallet),
                 "totalSent": 0,
                 "totalReceived": 0
             })
@@ -755,23 +1998,25 @@ def get_transaction_tree():
         # Get all transactions
         transactions = tax_system.get_transactions()
         
-        # Create links and update totals
+        # Update node totals (exact sums in drops)
+        sent = {}
+        received = {}
+        for tx in transactions:
+            sent[tx.sender] = sent.get(tx.sender, 0) + tx.amount_drops
+            received[tx.receiver] = received.get(tx.receiver, 0) + tx.amount_drops
+        for node in nodes:
+            node["totalSent"] = drops_to_xrp(sent.get(node["id"], 0))
+            node["totalReceived"] = drops_to_xrp(received.get(node["id"], 0))
+
+        # Create links with transaction details
         links = []
         for tx in transactions:
-            # Update node totals
-            for node in nodes:
-                if node["id"] == tx["sender"]:
-                    node["totalSent"] += float(tx["amount_xrp"])
-                if node["id"] == tx["receiver"]:
-                    node["totalReceived"] += float(tx["amount_xrp"])
-            
-            # Add link with transaction details
             links.append({
-                "source": tx["sender"],
-                "target": tx["receiver"],
-                "value": float(tx["amount_xrp"]),
-                "timestamp": tx["timestamp"],
-                "tx_hash": tx["tx_hash"]
+                "source": tx.sender,
+                "target": tx.receiver,
+                "value": tx.amount_xrp,
+                "timestamp": tx.timestamp,
+                "tx_hash": tx.tx_hash
             })
         
         # Create hierarchical structure
@@ -783,14 +2028,10 @@ def get_transaction_tree():
             "links": links
         }
         
-        # Debug print
-        print("Tree data structure:")
-        print(json.dumps(tree_data, indent=2))
-        
-        return jsonify({
+        return api_response({
             "success": True,
             "data": tree_data
-        })
+        }, request=request)
         
     except Exception as e:
         return jsonify({
@@ -814,5 +2055,11 @@ if __name__ == '__main__':
     print("\n-- Initial Balances --")
     print(tax_system.get_all_balances())
 
+    # Keep derived state (provenance, ...) up to date with the ledger
+    tax_system.start_background_sync()
+
+    # kill -USR2 <pid> writes a profile of the whole process to profiles/
+    install_signal_handler(profiler, float(os.getenv('PROFILE_SIGNAL_SECONDS', '10')))
+
     # Start Flask server
-    app.run(debug=False, port=80, host='0.0.0.0')
+    app.run(debug=False, port=int(os.getenv('PORT', '80')), host='0.0.0.0')
@@ -0,0 +1,147 @@
+from quart import Quart, request, jsonify, g
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from werkzeug.exceptions import HTTPException
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+
+from app import app as flask_app, tax_system, profiler, install_signal_handler
+from app import (start_profile, finish_profile, error_response, tax_payment_args, transfer_args,
+                 history_wallet, transactions_response, wallet_transactions_response)
+from serialization import RecordJSONProvider
+from amounts import drops_to_xrp
+
+# Threads serving the routes that stay synchronous (the Flask app)
+WSGI_THREADS = int(os.getenv('WSGI_THREADS', '16'))
+
+# Pending connections the listening socket queues before refusing new ones
+LISTEN_BACKLOG = 1024
+
+# Largest request body passed to the Flask app (bytes)
+MAX_WSGI_BODY = 16 * 1024 * 1024
+
+# ------------------- SETUP QUART -------------------
+# Async views of the routes that wait on the XRPL for every request: their
+# ledger calls go through the pooled async client on the server's event loop,
+# so a request waiting on the ledger holds no thread. Every other route (served
+# from the ingested state, or long batch jobs like /api/allocate) is the Flask
+# app, run on a pool of WSGI_THREADS threads.
+async_app = Quart(__name__)
+async_app.json = RecordJSONProvider(async_app)
+
+
+@async_app.before_serving
+async def start_serving():
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(WSGI_THREADS, thread_name_prefix="wsgi"))
+    # Keep derived state (provenance, ...) up to date with the ledger
+    if tax_system.background_sync is None:
+        tax_system.start_background_sync()
+
+
+@async_app.after_serving
+async def stop_serving():
+    await tax_system.async_client.aclose()
+
+# ------------------- REQUEST HOOKS -------------------
+
+@async_app.before_request
+async def start_request_profile():
+    """Profile the event loop thread (which other requests share) when an admin sends X-Profile"""
+    g.profile_session = start_profile(request.headers)
+
+@async_app.after_request
+async def stop_request_profile(response):
+    """Attach the ID of the request's profile, if any"""
+    return finish_profile(g.pop('profile_session', None), response)
+
+# ------------------- ASYNC ROUTES -------------------
+# Same requests and responses as the Flask routes (shared helpers in app.py)
+
+@async_app.route('/api/balances', methods=['GET'])
+async def get_balances():
+    """Return JSON with current balances of all wallets."""
+    return jsonify(await tax_system.get_all_balances_async())
+
+@async_app.route('/api/pay-tax', methods=['POST'])
+async def pay_tax():
+    """POST JSON: {"amount": number, "tax_payer_id": string}"""
+    try:
+        return jsonify(await tax_system.process_tax_payment_async(*tax_payment_args(await request.get_json(silent=True))))
+    except Exception as e:
+        return error_response(e)
+
+@async_app.route('/api/transfer', methods=['POST'])
+async def transfer():
+    """POST JSON: {"sender": "dept_id", "receiver": "dept_id", "amount": number}"""
+    try:
+        return jsonify(await tax_system.distribute_funds_async(*transfer_args(await request.get_json(silent=True))))
+    except Exception as e:
+        return error_response(e)
+
+@async_app.route('/api/transactions', methods=['GET'])
+async def get_transactions():
+    """Get all transactions for the system"""
+    try:
+        return transactions_response(await tax_system.get_transactions_async())
+    except Exception as e:
+        return error_response(e)
+
+@async_app.route('/api/transactions/<wallet_id>', methods=['GET'])
+async def get_wallet_transactions(wallet_id):
+    """Get transactions and the current balance of a specific wallet"""
+    try:
+        wallet = history_wallet(wallet_id)
+        transactions, balance_drops = await asyncio.gather(
+            tax_system.get_transactions_async(wallet),
+            tax_system.get_wallet_balance_drops_async(wallet))
+        return wallet_transactions_response(wallet_id, wallet, drops_to_xrp(balance_drops), transactions)
+    except Exception as e:
+        return error_response(e)
+
+# ------------------- ASGI APPLICATION -------------------
+
+class AsyncDispatcher:
+    """
+    ASGI application sending the requests that match a route of the async app
+    to it, and every other request to the WSGI app. Lifespan events go to the
+    async app.
+    """
+
+    def __init__(self, async_app, wsgi_app, async_views=True):
+        self.async_app = async_app
+        self.wsgi_app = wsgi_app
+        self.async_views = async_views
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan" or (self.async_views and self._is_async_route(scope)):
+            return await self.async_app(scope, receive, send)
+        return await self.wsgi_app(scope, receive, send)
+
+    def _is_async_route(self, scope):
+        """Helper: whether the async app has a route for this request's path and method"""
+        if scope["type"] != "http":
+            return False
+        try:
+            self.async_app.url_map.bind("").match(scope["path"], method=scope["method"])
+        except HTTPException:
+            return False
+        return True
+
+
+# ASYNC_VIEWS=0 serves every route from the WSGI threads (the synchronous
+# request path), e.g. to compare both under load
+app = AsyncDispatcher(async_app, AsyncioWSGIMiddleware(flask_app, MAX_WSGI_BODY),
+                      async_views=os.getenv('ASYNC_VIEWS', '1') != '0')
+
+# ------------------- MAIN ENTRY POINT -------------------
+if __name__ == '__main__':
+    # kill -USR2 <pid> writes a profile of the whole process to profiles/
+    install_signal_handler(profiler, float(os.getenv('PROFILE_SIGNAL_SECONDS', '10')))
+
+    config = Config()
+    config.bind = [f"0.0.0.0:{os.getenv('PORT', '80')}"]
+    config.backlog = LISTEN_BACKLOG
+    asyncio.run(serve(app, config))
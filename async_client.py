@@ -0,0 +1,139 @@
+from json import JSONDecodeError
+import asyncio
+import threading
+
+import httpx
+from xrpl.asyncio.clients.async_client import AsyncClient
+from xrpl.asyncio.clients.client import REQUEST_TIMEOUT
+from xrpl.asyncio.clients.exceptions import XRPLRequestFailureException
+from xrpl.asyncio.clients.utils import json_to_response, request_to_json_rpc
+from xrpl.clients.sync_client import SyncClient
+
+# Connections kept open to the XRPL node (requests beyond it wait for a free one)
+DEFAULT_MAX_CONNECTIONS = 100
+
+# Connections per httpx pool. httpcore matches waiting requests to connections
+# in O(requests x connections) on every request, which dominates past a few
+# dozen requests in flight, so the connections are split over small pools.
+CONNECTIONS_PER_POOL = 16
+
+
+class PooledJsonRpcClient(AsyncClient):
+    """
+    Async JSON-RPC client of an XRPL node that keeps its HTTP connections open.
+    xrpl-py's AsyncJsonRpcClient (and JsonRpcClient under it) opens a new HTTP
+    client, and so a new connection, for every request; this one sends the
+    requests of an event loop through a few httpx.AsyncClient pools, each
+    request going to the pool with the fewest requests in flight. Usable
+    anywhere xrpl-py takes an async client (xrpl.asyncio.*).
+    """
+
+    def __init__(self, url, max_connections=DEFAULT_MAX_CONNECTIONS, timeout=REQUEST_TIMEOUT):
+        super().__init__(url)
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._pools = []                # [httpx.AsyncClient, requests in flight], opened on demand
+        self._loop = None
+
+    async def _request_impl(self, request, *, timeout=None):
+        pool = self._get_pool()
+        pool[1] += 1
+        try:
+            response = await pool[0].post(
+                self.url,
+                json=request_to_json_rpc(request),
+                timeout=timeout or self.timeout
+            )
+        finally:
+            pool[1] -= 1
+        try:
+            return json_to_response(response.json())
+        except JSONDecodeError:
+            raise XRPLRequestFailureException({
+                "error": response.status_code,
+                "error_message": response.text
+            })
+
+    async def aclose(self):
+        """Close the pooled connections (on the event loop that opened them)"""
+        pools, self._pools, self._loop = self._pools, [], None
+        for http, _ in pools:
+            await http.aclose()
+
+    def _get_pool(self):
+        """
+        Helper to return the least busy HTTP pool of the running event loop,
+        opening a new pool when every open one has all its connections busy.
+        """
+        # Connections belong to the loop that opened them, a new loop gets its own pools
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._pools = []
+            self._loop = loop
+        size = min(self.max_connections, CONNECTIONS_PER_POOL)
+        pool = min(self._pools, key=lambda p: p[1], default=None)
+        if pool is None or (pool[1] >= size and len(self._pools) * size < self.max_connections):
+            limits = httpx.Limits(max_connections=size, max_keepalive_connections=size)
+            pool = [httpx.AsyncClient(limits=limits, timeout=self.timeout), 0]
+            self._pools.append(pool)
+        return pool
+
+
+class EventLoopThread:
+    """An event loop running on a daemon thread of its own, started on first use"""
+
+    def __init__(self, name):
+        self.name = name
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, coroutine):
+        """Schedule a coroutine on the loop, returning a concurrent.futures.Future"""
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self.loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine):
+        """Run a coroutine on the loop and wait for its result (from any other thread)"""
+        if self._thread is not None and threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError(f"{self.name}: cannot wait for a coroutine on its own loop thread")
+        return self.submit(coroutine).result()
+
+
+class PooledSyncJsonRpcClient(SyncClient):
+    """
+    Sync JSON-RPC client of an XRPL node that keeps its HTTP connections open,
+    usable anywhere xrpl-py takes a sync client (JsonRpcClient). Requests from
+    every thread run on one event loop thread through a PooledJsonRpcClient
+    (async_client), so they share its connections; the calling thread waits for
+    the response. The loop thread starts on the first request.
+    """
+
+    def __init__(self, url, max_connections=DEFAULT_MAX_CONNECTIONS, timeout=REQUEST_TIMEOUT):
+        super().__init__(url)
+        self.async_client = PooledJsonRpcClient(url, max_connections, timeout)
+        self.loop_thread = EventLoopThread("xrpl-client")
+
+    def request(self, request):
+        return self.loop_thread.run(self.async_client.request(request))
+
+    async def _request_impl(self, request, *, timeout=None):
+        # Awaited from another event loop (xrpl-py's asyncio functions)
+        return await asyncio.wrap_future(self.loop_thread.submit(self.async_client.request(request)))
+
+
+async def request_async(client, request):
+    """
+    Send a request with any xrpl-py client from async code. Async clients are
+    awaited through their public request(). The request() of sync clients
+    (JsonRpcClient, PooledSyncJsonRpcClient, LocalLedgerClient) blocks, so it
+    runs on a worker thread.
+    """
+    if isinstance(client, AsyncClient):
+        return await client.request(request)
+    return await asyncio.to_thread(client.request, request)
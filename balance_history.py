@@ -0,0 +1,155 @@
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+import threading
+
+# Number of balance changes between two stored balance snapshots
+CHECKPOINT_INTERVAL = 64
+
+RIPPLE_EPOCH_OFFSET = 946684800
+
+
+def balance_changes(tx_info):
+    """
+    Read the XRP balance changes of a transaction from its metadata.
+    Covers every AccountRoot the transaction touched (payments, fees, account
+    creation and deletion), not only the payment amount.
+    Args:
+        tx_info: AccountTx entry with "meta"
+    Returns:
+        List of (address, previous_balance_drops, final_balance_drops); the previous
+        balance is 0 for accounts created by the transaction
+    """
+    changes = []
+    for node in tx_info.get('meta', {}).get('AffectedNodes', []):
+        node_type, fields = next(iter(node.items()))
+        if fields.get('LedgerEntryType') != 'AccountRoot':
+            continue
+
+        if node_type == 'CreatedNode':
+            new_fields = fields.get('NewFields', {})
+            changes.append((new_fields.get('Account'), 0, int(new_fields.get('Balance', 0))))
+        else:
+            previous = fields.get('PreviousFields', {})
+            final = fields.get('FinalFields', {})
+            if 'Balance' not in previous:
+                continue  # Touched without a balance change
+            final_balance = int(final.get('Balance', 0)) if node_type == 'ModifiedNode' else 0
+            changes.append((final.get('Account'), int(previous['Balance']), final_balance))
+    return changes
+
+
+class _AccountHistory:
+    """Balance changes of one account, with a snapshot every CHECKPOINT_INTERVAL changes"""
+
+    __slots__ = ('base', 'ledger_indexes', 'timestamps', 'deltas', 'snapshots', 'balance')
+
+    def __init__(self, base):
+        self.base = base            # Balance before the first recorded change
+        self.ledger_indexes = []
+        self.timestamps = []
+        self.deltas = []
+        self.snapshots = []         # snapshots[i] = balance after the first (i + 1) * CHECKPOINT_INTERVAL changes
+        self.balance = base
+
+    def append(self, ledger_index, timestamp, delta):
+        self.ledger_indexes.append(ledger_index)
+        self.timestamps.append(timestamp)
+        self.deltas.append(delta)
+        self.balance += delta
+        if len(self.deltas) % CHECKPOINT_INTERVAL == 0:
+            self.snapshots.append(self.balance)
+
+    def load(self, ledger_indexes, timestamps, deltas):
+        """Replace the recorded changes (the base balance is kept)"""
+        self.ledger_indexes = list(ledger_indexes)
+        self.timestamps = list(timestamps)
+        self.deltas = list(deltas)
+        balances = list(accumulate(self.deltas, initial=self.base))
+        self.snapshots = balances[CHECKPOINT_INTERVAL::CHECKPOINT_INTERVAL]
+        self.balance = balances[-1]
+
+    def balance_after(self, count):
+        """Balance after the first `count` changes: one snapshot lookup plus a short replay"""
+        checkpoint = count // CHECKPOINT_INTERVAL
+        balance = self.snapshots[checkpoint - 1] if checkpoint else self.base
+        return balance + sum(self.deltas[checkpoint * CHECKPOINT_INTERVAL:count])
+
+
+class BalanceHistoryIndex:
+    """
+    Point-in-time XRP balances for a set of accounts, built from ingested
+    transaction metadata. Transactions must be ingested in ledger order.
+    """
+
+    def __init__(self, addresses=None):
+        # Only index these accounts (None indexes every account seen)
+        self.addresses = set(addresses) if addresses is not None else None
+        self.accounts = {}
+        self.lock = threading.Lock()
+
+    def ingest(self, tx_info):
+        """Record the balance changes of one AccountTx entry"""
+        tx = tx_info.get('tx_json') or tx_info.get('tx') or {}
+        ledger_index = tx_info.get('ledger_index') or tx.get('ledger_index', 0)
+        timestamp = tx.get('date', 0) + RIPPLE_EPOCH_OFFSET if tx.get('date') else 0
+
+        with self.lock:
+            for address, previous, final in balance_changes(tx_info):
+                if self.addresses is not None and address not in self.addresses:
+                    continue
+                history = self.accounts.get(address)
+                if history is None:
+                    history = self.accounts[address] = _AccountHistory(previous)
+                history.append(ledger_index, timestamp, final - previous)
+
+    def balance_at(self, address, ledger_index=None, timestamp=None):
+        """
+        Balance (in drops) of an account at the end of a ledger or at a point in time.
+        Args:
+            address: Classic address of the account
+            ledger_index: Ledger index (inclusive)
+            timestamp: Unix timestamp (inclusive), used if no ledger_index is given
+        Returns:
+            Balance in drops, 0 if the account did not exist yet, or None if the
+            account has no recorded history
+        """
+        with self.lock:
+            history = self.accounts.get(address)
+            if history is None:
+                return None
+            if ledger_index is not None:
+                count = bisect_right(history.ledger_indexes, ledger_index)
+            elif timestamp is not None:
+                count = bisect_right(history.timestamps, timestamp)
+            else:
+                return history.balance
+            return history.balance_after(count)
+
+    def export_columns(self):
+        """
+        Recorded changes of every account as int64 columns, for a snapshot.
+        Returns:
+            (list of [address, base balance, number of changes],
+             dictionary of column name -> array('q') over all accounts)
+        """
+        accounts = []
+        columns = {name: array('q') for name in ('ledger_indexes', 'timestamps', 'deltas')}
+        with self.lock:
+            for address, history in self.accounts.items():
+                accounts.append([address, history.base, len(history.deltas)])
+                for name, column in columns.items():
+                    column.extend(getattr(history, name))
+        return accounts, columns
+
+    def load_columns(self, accounts, columns):
+        """Replace the index with the output of export_columns()"""
+        with self.lock:
+            self.accounts = {}
+            position = 0
+            for address, base, count in accounts:
+                end = position + count
+                history = self.accounts[address] = _AccountHistory(base)
+                history.load(*(columns[name][position:end]
+                               for name in ('ledger_indexes', 'timestamps', 'deltas')))
+                position = end
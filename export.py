@@ -0,0 +1,210 @@
+from datetime import datetime, timezone
+import csv
+import io
+import os
+
+from xrpl.models.requests import AccountTx, Ledger
+from xrpl.ledger import get_latest_validated_ledger_sequence
+
+from records import payment_record
+
+# Seconds between the Unix epoch and the Ripple epoch (2000-01-01)
+RIPPLE_EPOCH_OFFSET = 946684800
+
+# Columns of the exported spending ledger, in order
+EXPORT_COLUMNS = ['tx_hash', 'ledger_index', 'timestamp', 'type', 'sender', 'receiver', 'amount_xrp', 'amount_drops']
+
+# Rows buffered before a CSV chunk is yielded
+CSV_CHUNK_ROWS = 500
+
+# Rows buffered (over all partitions) before a Parquet part file is written
+PARQUET_BATCH_ROWS = 50_000
+
+
+class LedgerReader:
+    """
+    Read the payments between system wallets straight from an XRPL node, page by
+    page, without holding the history in memory. Needs only a client and the
+    wallet addresses, so offline tools (xrpl-ledger-export.py) can use it without
+    starting the tax system.
+    """
+
+    def __init__(self, client, wallet_names, exported=None):
+        """
+        Args:
+            client: XRPL client
+            wallet_names: Classic address -> wallet ID of every system wallet
+            exported: IDs of the wallets read when none are given (default: all)
+        """
+        self.client = client
+        self.wallet_names = wallet_names
+        self.addresses = {wallet_id: address for address, wallet_id in wallet_names.items()}
+        self.exported = list(exported) if exported is not None else list(self.addresses)
+
+    def iter_transactions(self, wallet_ids=None, start=None, end=None):
+        """
+        Stream payments page by page. Each payment is yielded once: while reading
+        its sender's history, or its receiver's if the sender is not part of the
+        export. A start time is resolved to its ledger first, so earlier history
+        is not read.
+        Args:
+            wallet_ids: IDs of the wallets to export (self.exported if None)
+            start: Only payments at or after this Unix time
+            end: Only payments before this Unix time
+        Yields:
+            Transaction records, oldest first for each wallet
+        """
+        names = []
+        for wallet_id in wallet_ids or self.exported:
+            name = "government" if wallet_id == "GOV_WALLET" else wallet_id
+            if name not in self.addresses:
+                raise ValueError(f"Invalid wallet ID: {wallet_id}")
+            names.append(name)
+        selected = set(names)
+        ledger_index_min = self.first_ledger_at(start) if start is not None else -1
+
+        for name in names:
+            marker = None
+            while True:
+                response = self.client.request(AccountTx(
+                    account=self.addresses[name],
+                    ledger_index_min=ledger_index_min,
+                    ledger_index_max=-1,
+                    forward=True,
+                    limit=200,
+                    marker=marker
+                ))
+                if not response.is_successful():
+                    raise ValueError(f"Error getting transactions for {name}: {response.result.get('error_message', 'Unknown error')}")
+
+                past_end = False
+                for tx_info in response.result.get('transactions', []):
+                    try:
+                        record = payment_record(tx_info, self.wallet_names)
+                    except ValueError:
+                        continue
+                    if end is not None and record.timestamp >= end:
+                        past_end = True
+                        break
+                    if start is not None and record.timestamp < start:
+                        continue
+                    if record.sender == name or (record.receiver == name and record.sender not in selected):
+                        yield record
+
+                marker = response.result.get('marker')
+                if past_end or not marker:
+                    break
+
+    def first_ledger_at(self, timestamp):
+        """
+        Index of the first validated ledger closed at or after a Unix time, by
+        binary search over ledger close times (about 30 ledger requests on a
+        full-history node). Ledgers the node does not have count as older.
+        """
+        close_time = int(timestamp) - RIPPLE_EPOCH_OFFSET
+        low, high = 1, get_latest_validated_ledger_sequence(self.client)
+        while low < high:
+            middle = (low + high) // 2
+            response = self.client.request(Ledger(ledger_index=middle))
+            if response.is_successful():
+                closed_before = response.result['ledger']['close_time'] < close_time
+            elif response.result.get('error') == 'lgrNotFound':
+                closed_before = True
+            else:
+                raise ValueError(f"Error getting ledger {middle}: {response.result.get('error_message', 'Unknown error')}")
+            if closed_before:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+
+def iter_csv(records, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Stream transaction records as CSV text chunks (header first).
+    Only one chunk is held in memory at a time.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+
+    rows = 0
+    for record in records:
+        writer.writerow([getattr(record, column) for column in EXPORT_COLUMNS])
+        rows += 1
+        if rows % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def write_csv(records, path):
+    """Write transaction records to a CSV file, chunk by chunk"""
+    with open(path, 'w', newline='') as f:
+        for chunk in iter_csv(records):
+            f.write(chunk)
+
+
+def write_parquet(records, output_dir, batch_rows=PARQUET_BATCH_ROWS):
+    """
+    Write transaction records as Parquet files partitioned by month and sending
+    wallet (output_dir/month=YYYY-MM/wallet=<sender>/part-N.parquet).
+    Records come oldest first (per wallet), so the partitions of other months
+    are written out when the month changes, and the largest partition whenever
+    `batch_rows` rows are buffered: memory stays bounded by `batch_rows`.
+    Returns:
+        Number of records written
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([
+        ('tx_hash', pa.string()),
+        ('ledger_index', pa.int64()),
+        ('timestamp', pa.int64()),
+        ('type', pa.string()),
+        ('sender', pa.string()),
+        ('receiver', pa.string()),
+        ('amount_xrp', pa.float64()),
+        ('amount_drops', pa.int64()),
+    ])
+    buffers = {}
+    part_numbers = {}
+
+    def flush(partition):
+        month, wallet = partition
+        directory = os.path.join(output_dir, f"month={month}", f"wallet={wallet}")
+        os.makedirs(directory, exist_ok=True)
+        part = part_numbers.get(partition, 0)
+        part_numbers[partition] = part + 1
+        rows = buffers.pop(partition)
+        table = pa.table({column: [getattr(row, column) for row in rows] for column in EXPORT_COLUMNS}, schema=schema)
+        pq.write_table(table, os.path.join(directory, f"part-{part:05d}.parquet"))
+
+    count = 0
+    buffered = 0
+    current_month = None
+    for record in records:
+        month = datetime.fromtimestamp(record.timestamp, tz=timezone.utc).strftime('%Y-%m')
+        if month != current_month:
+            for partition in [p for p in buffers if p[0] != month]:
+                buffered -= len(buffers[partition])
+                flush(partition)
+            current_month = month
+        partition = (month, record.sender)
+        buffers.setdefault(partition, []).append(record)
+        count += 1
+        buffered += 1
+        if buffered >= batch_rows:
+            largest = max(buffers, key=lambda p: len(buffers[p]))
+            buffered -= len(buffers[largest])
+            flush(largest)
+
+    for partition in list(buffers):
+        flush(partition)
+    return count
@@ -0,0 +1,172 @@
+from amounts import to_drops, drops_to_xrp
+import threading
+
+# Default number of outgoing links kept per wallet before the rest is collapsed
+DEFAULT_TOP_K = 5
+
+# Prefix of the "other" bucket node collecting a wallet's small flows
+OTHER_PREFIX = "other:"
+
+
+class FlowGraph:
+    """
+    Payments aggregated per (source, target) edge, maintained incrementally
+    as payments are ingested. Values and totals are integer drops. Individual
+    transactions are kept per edge (references to the ingested records) for
+    drill-down requests.
+    """
+
+    def __init__(self):
+        self.edges = {}          # (source, target) -> {"value", "count", "last_timestamp"}
+        self.transactions = {}   # (source, target) -> [records], oldest first
+        self.total_sent = {}
+        self.total_received = {}
+        self.lock = threading.Lock()
+
+    def ingest(self, tx):
+        """Add one payment to its edge aggregate"""
+        key = (tx.sender, tx.receiver)
+        amount = tx.amount_drops
+        with self.lock:
+            edge = self.edges.get(key)
+            if edge is None:
+                edge = self.edges[key] = {"value": 0, "count": 0, "last_timestamp": 0}
+                self.transactions[key] = []
+            edge["value"] += amount
+            edge["count"] += 1
+            edge["last_timestamp"] = max(edge["last_timestamp"], tx.timestamp)
+            self.transactions[key].append(tx)
+            self.total_sent[tx.sender] = self.total_sent.get(tx.sender, 0) + amount
+            self.total_received[tx.receiver] = self.total_received.get(tx.receiver, 0) + amount
+
+    def edge_transactions(self, source, target, offset=0, limit=100):
+        """One page of the individual transactions of an edge, newest first"""
+        with self.lock:
+            txs = self.transactions.get((source, target), [])
+            end = len(txs) - offset
+            return list(reversed(txs[max(end - limit, 0):max(end, 0)])), len(txs)
+
+
+def hierarchy_levels(parents, roots, sinks=()):
+    """
+    Levels of the wallets in the department hierarchy.
+    Args:
+        parents: Dictionary of wallet ID -> parent wallet ID
+        roots: Wallet IDs at the top, in order (level 0, 1, ...)
+        sinks: Wallet IDs placed one level below the deepest department
+    Returns:
+        Dictionary of wallet ID -> level
+    """
+    levels = {root: i for i, root in enumerate(roots)}
+
+    def level_of(wallet_id, seen=()):
+        if wallet_id in levels:
+            return levels[wallet_id]
+        parent = parents.get(wallet_id)
+        if parent is None or parent in seen:
+            levels[wallet_id] = len(roots)
+        else:
+            levels[wallet_id] = level_of(parent, seen + (wallet_id,)) + 1
+        return levels[wallet_id]
+
+    for wallet_id in parents:
+        level_of(wallet_id)
+    deepest = max(levels.values(), default=0)
+    for sink in sinks:
+        levels[sink] = deepest + 1
+    return levels
+
+
+def layout_positions(levels, parents):
+    """
+    Normalized positions for a layered layout: x from the level, y spread evenly
+    inside the level with children ordered by their parent's position.
+    Returns:
+        Dictionary of wallet ID -> (x, y), both in [0, 1]
+    """
+    by_level = {}
+    for wallet_id, level in levels.items():
+        by_level.setdefault(level, []).append(wallet_id)
+
+    max_level = max(by_level, default=0) or 1
+    positions = {}
+    for level in sorted(by_level):
+        members = sorted(by_level[level], key=lambda w: (
+            positions.get(parents.get(w), (0, 0.5))[1], w))
+        for i, wallet_id in enumerate(members):
+            positions[wallet_id] = (level / max_level, (i + 1) / (len(members) + 1))
+    return positions
+
+
+def build_lod_graph(nodes, flow_graph, top_k=DEFAULT_TOP_K, min_value=0.0):
+    """
+    Level-of-detail view of the flow graph: per wallet, the `top_k` largest
+    outgoing edges of at least `min_value` XRP are kept and the rest is collapsed
+    into one "other" bucket, so the payload is bounded by wallets * (top_k + 1).
+    Args:
+        nodes: Node dictionaries with at least "id", "level", "x" and "y"
+        flow_graph: FlowGraph to read the edges from
+        top_k: Maximum number of links kept per source wallet
+        min_value: Links below this amount (XRP) are collapsed
+    Returns:
+        Dictionary with "nodes" and "links" (values in XRP)
+    """
+    nodes = [dict(node) for node in nodes]
+    node_by_id = {node["id"]: node for node in nodes}
+    max_level = max((node["level"] for node in nodes), default=0) or 1
+    links = []
+
+    for source, outgoing in _group_by_source(flow_graph).items():
+        kept, collapsed = split_edges(outgoing, top_k, min_value)
+        for target, edge in kept:
+            links.append(edge_link(source, target, edge))
+
+        if collapsed and source in node_by_id:
+            bucket_id = f"{OTHER_PREFIX}{source}"
+            source_node = node_by_id[source]
+            nodes.append({
+                "id": bucket_id,
+                "name": f"Other ({len(collapsed)})",
+                "level": source_node["level"] + 1,
+                # Halfway to the next level, just below the source wallet
+                "x": (source_node["level"] + 0.5) / max_level,
+                "y": min(source_node["y"] + 0.05, 1.0),
+                "balance": None,
+                "totalSent": 0.0,
+                "totalReceived": drops_to_xrp(sum(edge["value"] for _, edge in collapsed)),
+                "bucket": True
+            })
+            links.append({
+                "source": source,
+                "target": bucket_id,
+                "value": drops_to_xrp(sum(edge["value"] for _, edge in collapsed)),
+                "count": sum(edge["count"] for _, edge in collapsed),
+                "last_timestamp": max(edge["last_timestamp"] for _, edge in collapsed),
+                "collapsed": len(collapsed)
+            })
+
+    return {"nodes": nodes, "links": links}
+
+
+def edge_link(source, target, edge):
+    """Link dictionary of an edge, with its value converted to XRP"""
+    return {"source": source, "target": target, **edge, "value": drops_to_xrp(edge["value"])}
+
+
+def split_edges(outgoing, top_k, min_value):
+    """Split a wallet's outgoing (target, edge) list into kept and collapsed edges (min_value in XRP)"""
+    min_drops = to_drops(min_value)
+    ranked = sorted(outgoing, key=lambda item: item[1]["value"], reverse=True)
+    kept = [item for item in ranked if item[1]["value"] >= min_drops][:top_k]
+    kept_targets = {target for target, _ in kept}
+    collapsed = [item for item in ranked if item[0] not in kept_targets]
+    return kept, collapsed
+
+
+def _group_by_source(flow_graph):
+    """Helper to group a snapshot of the edges by source wallet"""
+    with flow_graph.lock:
+        grouped = {}
+        for (source, target), edge in flow_graph.edges.items():
+            grouped.setdefault(source, []).append((target, dict(edge)))
+        return grouped
@@ -0,0 +1,169 @@
+from bisect import bisect_right
+from collections import OrderedDict
+import threading
+
+# Department level views kept in the LRU
+DEFAULT_MAX_VIEWS = 256
+
+
+class _LevelView:
+    """Levels of one department's view and what they depend on"""
+
+    __slots__ = ('ledger_index', 'edge_count', 'reachable', 'levels')
+
+    def __init__(self, ledger_index, edge_count, reachable, levels):
+        self.ledger_index = ledger_index    # Ledger the levels were computed at
+        self.edge_count = edge_count        # Edges known at that point
+        self.reachable = reachable          # Wallets reached from the department
+        self.levels = levels
+
+
+class HierarchyViews:
+    """
+    Department hierarchy views over the ingested payments.
+
+    The part shared by every department (nodes, links and per-wallet metrics)
+    only depends on the ingested transactions, so it is built once per ingested
+    ledger by `build_graph(ledger_index)` and reused, along with its normalized
+    form. The owner calls advance() with the last ingested ledger after every
+    ingest that added transactions (payments or not, as balances change with
+    fees too). Only the levels depend on the department: they are the
+    depth-first visit of the payment links from it as of the graph's ledger,
+    memoized per department in a bounded LRU. A view computed at an older
+    ledger stays valid until a payment creates a new link out of a wallet it
+    reaches.
+    """
+
+    def __init__(self, build_graph, normalize=None, include=None, max_views=DEFAULT_MAX_VIEWS):
+        """
+        Args:
+            build_graph: Callable(ledger_index) returning a dictionary with
+                         "nodes", "links" and "transactions" as of that ledger
+            normalize: Optional callable giving the normalized form of a view
+            include: Optional predicate on wallet IDs; links with a wallet it
+                     rejects are not part of the hierarchy
+            max_views: Maximum number of department level views kept
+        """
+        self.build_graph = build_graph
+        self.normalize = normalize
+        self.include = include
+        self.max_views = max_views
+        self.ledger_index = 0
+        self.adjacency = {}             # source -> {target: ledger of the first payment}, in that order
+        self.edge_sources = []          # Source of every link, in creation order
+        self.edge_ledgers = []          # Ledger every link was created at, in creation order
+        self.builds = 0
+        self.hits = 0
+        self.misses = 0
+        self._graph = None              # (ledger_index, graph, normalized graph or None)
+        self._views = OrderedDict()     # dept_id -> _LevelView
+        self.lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def ingest(self, tx):
+        """Record the link one payment may create"""
+        if self.include and not (self.include(tx.sender) and self.include(tx.receiver)):
+            return
+        with self.lock:
+            targets = self.adjacency.setdefault(tx.sender, {})
+            if tx.receiver not in targets:
+                targets[tx.receiver] = tx.ledger_index
+                self.edge_sources.append(tx.sender)
+                self.edge_ledgers.append(tx.ledger_index)
+
+    def advance(self, ledger_index):
+        """Serve views as of this ledger (the last one ingested) from now on"""
+        with self.lock:
+            self.ledger_index = max(self.ledger_index, ledger_index)
+
+    def view(self, dept_id, normalized=False):
+        """
+        Hierarchy of the ingested payments seen from one department.
+        Returns:
+            Dictionary with "nodes" (with their level), "links", "transactions",
+            "chains" and "ledger_index", or None if the department is not a node
+        """
+        ledger_index, graph, normalized_graph = self._get_graph(normalized)
+        if not any(node['id'] == dept_id for node in graph['nodes']):
+            return None
+        levels = self._get_levels(dept_id, ledger_index)
+
+        data = normalized_graph if normalized else graph
+        return dict(data,
+                    nodes=[dict(node, level=levels.get(node['id'], 0)) for node in graph['nodes']],
+                    chains=[],
+                    ledger_index=ledger_index)
+
+    def get_stats(self):
+        """Ledger served, graph builds and level memo hits/misses"""
+        with self.lock:
+            return {
+                "ledger_index": self.ledger_index,
+                "graph_builds": self.builds,
+                "level_hits": self.hits,
+                "level_misses": self.misses,
+                "views": len(self._views)
+            }
+
+    def _get_graph(self, normalized):
+        """Helper to return the shared graph of the current ledger, building it once"""
+        with self._build_lock:
+            with self.lock:
+                ledger_index = self.ledger_index
+                cached = self._graph
+            if cached is None or cached[0] != ledger_index:
+                cached = (ledger_index, self.build_graph(ledger_index), None)
+                with self.lock:
+                    self.builds += 1
+            if normalized and cached[2] is None and self.normalize:
+                cached = (cached[0], cached[1], self.normalize(cached[1]))
+            self._graph = cached
+        return cached
+
+    def _get_levels(self, dept_id, ledger_index):
+        """
+        Helper to return the memoized levels of a department as of a ledger,
+        recomputing them if a link created since invalidated them
+        """
+        with self.lock:
+            # Links of later ledgers may already be ingested, they are not part of this view
+            edge_count = bisect_right(self.edge_ledgers, ledger_index)
+            view = self._views.get(dept_id)
+            if view is not None and view.ledger_index <= ledger_index and not any(
+                    source in view.reachable for source in self.edge_sources[view.edge_count:edge_count]):
+                view.ledger_index = ledger_index
+                view.edge_count = edge_count
+                self._views.move_to_end(dept_id)
+                self.hits += 1
+                return view.levels
+
+            self.misses += 1
+            levels = self._depth_first_levels(dept_id, ledger_index)
+            if view is not None and view.ledger_index > ledger_index:
+                return levels   # Asked for an older ledger than the memoized view
+            self._views[dept_id] = _LevelView(ledger_index, edge_count, set(levels), levels)
+            self._views.move_to_end(dept_id)
+            while len(self._views) > self.max_views:
+                self._views.popitem(last=False)
+            return levels
+
+    def _depth_first_levels(self, start, ledger_index):
+        """
+        Helper: level of every wallet reached from `start` through the links
+        created up to `ledger_index`, assigned on its first visit in depth-first
+        order of the links (as the recursive traversal did). The lock must be held.
+        """
+        def targets_of(source):
+            return iter(self.adjacency.get(source, {}).items())
+
+        levels = {start: 0}
+        stack = [(targets_of(start), 1)]
+        while stack:
+            targets, level = stack[-1]
+            target, created = next(targets, (None, None))
+            if target is None:
+                stack.pop()
+            elif created <= ledger_index and target not in levels:
+                levels[target] = level
+                stack.append((targets_of(target), level + 1))
+        return levels
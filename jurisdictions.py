@@ -0,0 +1,83 @@
+import json
+import os
+
+# Wallets shared by the whole system, owned by the root jurisdiction
+SYSTEM_WALLETS = ['tax_pool', 'government', 'exit_pool']
+
+# Jurisdiction ID -> parent jurisdiction and its departments (department ID -> parent wallet ID).
+# Override with a JSON file of the same shape in JURISDICTIONS_FILE.
+DEFAULT_JURISDICTIONS = {
+    "federal": {
+        "parent": None,
+        "departments": {
+            "dept_transport": "government",
+            "dept_labor": "government",
+            "dept_education": "government"
+        }
+    },
+    "penn": {
+        "parent": "federal",
+        "departments": {
+            "penn_dept_transport": "dept_transport",
+            "penn_dept_labor": "dept_labor",
+            "penn_dept_education": "dept_education"
+        }
+    },
+    "pitt": {
+        "parent": "penn",
+        "departments": {
+            "pitt_dept_transport": "penn_dept_transport",
+            "pitt_dept_labor": "penn_dept_labor",
+            "pitt_dept_education": "penn_dept_education"
+        }
+    },
+    "squirrel_hill": {
+        "parent": "pitt",
+        "departments": {
+            "squirrel_hill_dept_transport": "pitt_dept_transport"
+        }
+    }
+}
+
+
+def load_jurisdictions(path=None):
+    """Jurisdictions from a JSON file (JURISDICTIONS_FILE), or the defaults"""
+    path = path or os.getenv('JURISDICTIONS_FILE')
+    if not path:
+        return DEFAULT_JURISDICTIONS
+    with open(path) as f:
+        jurisdictions = json.load(f)
+    roots = [name for name, config in jurisdictions.items() if not config.get('parent')]
+    if len(roots) != 1:
+        raise ValueError(f"Expected exactly one root jurisdiction, found: {roots}")
+    return jurisdictions
+
+
+def department_parents(jurisdictions):
+    """Department ID -> parent wallet ID across every jurisdiction"""
+    parents = {}
+    for config in jurisdictions.values():
+        parents.update(config['departments'])
+    return parents
+
+
+def owned_wallet_ids(jurisdictions, jurisdiction):
+    """
+    IDs of the wallets owned by one jurisdiction: its departments, plus the
+    system wallets for the root jurisdiction.
+    """
+    if jurisdiction not in jurisdictions:
+        raise ValueError(f"Unknown jurisdiction: {jurisdiction}")
+    config = jurisdictions[jurisdiction]
+    owned = list(config['departments'])
+    if not config.get('parent'):
+        owned = SYSTEM_WALLETS + owned
+    return owned
+
+
+def jurisdiction_of(jurisdictions, wallet_id):
+    """Jurisdiction owning a wallet, or None"""
+    for name, config in jurisdictions.items():
+        if wallet_id in config['departments'] or (wallet_id in SYSTEM_WALLETS and not config.get('parent')):
+            return name
+    return None
@@ -0,0 +1,359 @@
+from bisect import bisect_left, bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+from xrpl.asyncio.clients.utils import json_to_response
+from xrpl.clients.sync_client import SyncClient
+from xrpl.core.binarycodec import decode
+
+RIPPLE_EPOCH_OFFSET = 946684800
+
+# Account that funds new accounts, like a faucet
+GENESIS_ADDRESS = "rHb9CJAWyB4rj91VRWn96DkukG4bwdtyTh"
+
+BASE_FEE = 10
+RESERVE_BASE = 1_000_000
+RESERVE_INC = 200_000
+
+# Largest AccountTx page, as on rippled
+MAX_PAGE_SIZE = 400
+
+
+def _error(error, message=None):
+    return {"status": "error", "error": error, "error_message": message or error}
+
+
+class LocalLedger:
+    """
+    In-memory stand-in for an XRPL node, for tests and benchmarks at scale.
+    Only XRP payments are modelled: balances, sequence numbers, fees and
+    AccountRoot metadata in the format AccountTx returns (API v2). Payments go
+    into the open ledger and become visible once it is closed (validated).
+    Answers the rippled methods the tracker uses (account_info, account_tx, tx,
+    ledger, fee, server_info, server_state, submit) through handle(), an
+    in-process client (LocalLedgerClient) or JSON-RPC over HTTP (serve()).
+    Signatures are not checked.
+    """
+
+    def __init__(self, start_time=None):
+        self.accounts = {}                  # address -> [balance drops, sequence]
+        self.entries = []                   # AccountTx entries, in ledger order
+        self.by_hash = {}                   # transaction hash -> entry
+        self.account_entries = {}           # address -> ([ledger index], [entry position])
+        self.validated_index = 1
+        self.close_time = int(start_time if start_time is not None else time.time()) - RIPPLE_EPOCH_OFFSET
+        self.close_times = [self.close_time, self.close_time]  # ledger index -> close time (Ripple epoch)
+        self._open = []                     # entries of the open ledger
+        self._count = 0
+        self.lock = threading.RLock()
+
+    # ----- ledger changes -----
+
+    def fund(self, address, drops, timestamp=None):
+        """Send `drops` to an address from the genesis account (creating it if needed)"""
+        with self.lock:
+            genesis = self.accounts.setdefault(GENESIS_ADDRESS, [10 ** 17, 1])
+            genesis[0] += drops + BASE_FEE
+            return self.pay(GENESIS_ADDRESS, address, drops, timestamp)
+
+    def pay(self, sender, destination, drops, timestamp=None, source_tag=None, fee=BASE_FEE, sequence=None, tx_hash=None):
+        """
+        Apply an XRP payment to the open ledger.
+        Returns:
+            (engine result, transaction hash)
+        """
+        with self.lock:
+            account = self.accounts.get(sender)
+            if account is None:
+                return "terNO_ACCOUNT", None
+            if sender == destination:
+                return "temREDUNDANT", None
+            if sequence is not None and sequence != account[1]:
+                return ("tefPAST_SEQ" if sequence < account[1] else "terPRE_SEQ"), None
+            if account[0] < fee:
+                return "terINSUF_FEE_B", None
+
+            self._count += 1
+            tx_json = {
+                "TransactionType": "Payment",
+                "Account": sender,
+                "Destination": destination,
+                "DeliverMax": str(drops),
+                "Fee": str(fee),
+                "Sequence": account[1],
+                "Flags": 0,
+                "date": (int(timestamp) - RIPPLE_EPOCH_OFFSET) if timestamp is not None else self.close_time,
+                "ledger_index": self.validated_index + 1
+            }
+            if source_tag is not None:
+                tx_json["SourceTag"] = source_tag
+            tx_hash = tx_hash or hashlib.sha512(
+                f"{sender}:{account[1]}:{destination}:{drops}:{self._count}".encode()).hexdigest()[:64].upper()
+
+            nodes = []
+            previous = account[0]
+            account[0] -= fee
+            account[1] += 1
+            receiver = self.accounts.get(destination)
+            if account[0] < drops:
+                result = "tecUNFUNDED_PAYMENT"
+            elif receiver is None and drops < RESERVE_BASE:
+                result = "tecNO_DST_INSUF_XRP"
+            else:
+                result = "tesSUCCESS"
+                account[0] -= drops
+                if receiver is None:
+                    receiver = self.accounts[destination] = [drops, 1]
+                    nodes.append({"CreatedNode": {"LedgerEntryType": "AccountRoot", "NewFields": {
+                        "Account": destination, "Balance": str(drops), "Sequence": 1}}})
+                else:
+                    nodes.append(self._modified(destination, receiver[0], receiver[0] + drops, receiver[1]))
+                    receiver[0] += drops
+            nodes.insert(0, self._modified(sender, previous, account[0], account[1], account[1] - 1))
+
+            meta = {
+                "TransactionIndex": len(self._open),
+                "TransactionResult": result,
+                "AffectedNodes": nodes
+            }
+            if result == "tesSUCCESS":
+                meta["delivered_amount"] = str(drops)
+            entry = {"hash": tx_hash, "tx_json": tx_json, "meta": meta, "validated": False,
+                     "ledger_index": self.validated_index + 1}
+            self._open.append(entry)
+            self.by_hash[tx_hash] = entry
+            return result, tx_hash
+
+    @staticmethod
+    def _modified(address, previous, final, sequence, previous_sequence=None):
+        previous_fields = {"Balance": str(previous)}
+        if previous_sequence is not None:
+            previous_fields["Sequence"] = previous_sequence
+        return {"ModifiedNode": {"LedgerEntryType": "AccountRoot",
+                                 "FinalFields": {"Account": address, "Balance": str(final), "Sequence": sequence},
+                                 "PreviousFields": previous_fields}}
+
+    def close(self, close_time=None):
+        """Validate the open ledger. Returns its ledger index."""
+        with self.lock:
+            self.validated_index += 1
+            if close_time is not None:
+                self.close_time = max(self.close_time, int(close_time) - RIPPLE_EPOCH_OFFSET)
+            self.close_times.append(self.close_time)
+            for entry in self._open:
+                entry["validated"] = True
+                position = len(self.entries)
+                self.entries.append(entry)
+                tx = entry["tx_json"]
+                for address in {tx["Account"], tx["Destination"]}:
+                    ledgers, positions = self.account_entries.setdefault(address, ([], []))
+                    ledgers.append(self.validated_index)
+                    positions.append(position)
+            self._open = []
+            return self.validated_index
+
+    def start_closing(self, interval=4.0):
+        """Close a ledger every `interval` seconds on a daemon thread (like the network)"""
+        def run():
+            while True:
+                time.sleep(interval)
+                self.close(time.time())
+
+        thread = threading.Thread(target=run, name="ledger-close", daemon=True)
+        thread.start()
+        return thread
+
+    # ----- rippled API -----
+
+    def handle(self, method, params=None):
+        """Answer one rippled API request with its result dictionary (including "status")"""
+        handler = getattr(self, f"_api_{method}", None)
+        if handler is None:
+            return _error("unknownCmd", f"Unsupported method: {method}")
+        with self.lock:
+            result = handler(params or {})
+        result.setdefault("status", "success")
+        return result
+
+    def _ledger_index(self, value):
+        if value in (None, "validated", "closed"):
+            return self.validated_index
+        if value in ("current", "open"):
+            return self.validated_index + 1
+        return int(value)
+
+    def _api_account_info(self, params):
+        account = self.accounts.get(params.get("account"))
+        if account is None:
+            return _error("actNotFound", "Account not found.")
+        return {
+            "account_data": {"Account": params["account"], "Balance": str(account[0]), "Sequence": account[1],
+                             "Flags": 0, "OwnerCount": 0, "LedgerEntryType": "AccountRoot"},
+            "ledger_index": self._ledger_index(params.get("ledger_index")),
+            "validated": params.get("ledger_index") not in ("current", "open")
+        }
+
+    def _api_account_tx(self, params):
+        address = params.get("account")
+        if address not in self.accounts:
+            return _error("actNotFound", "Account not found.")
+        ledger_min = params.get("ledger_index_min", -1)
+        ledger_max = params.get("ledger_index_max", -1)
+        ledger_min = 1 if ledger_min in (None, -1) else ledger_min
+        ledger_max = self.validated_index if ledger_max in (None, -1) else min(ledger_max, self.validated_index)
+        limit = min(params.get("limit") or 200, MAX_PAGE_SIZE)
+        forward = params.get("forward", False)
+
+        ledgers, positions = self.account_entries.get(address, ([], []))
+        start, end = bisect_left(ledgers, ledger_min), bisect_right(ledgers, ledger_max)
+        marker = params.get("marker")
+        if forward:
+            first = max(start, marker["seq"]) if marker else start
+            selected = range(first, min(first + limit, end))
+            next_seq = first + limit if first + limit < end else None
+        else:
+            last = min(end, marker["seq"]) if marker else end
+            selected = range(last - 1, max(last - limit, start) - 1, -1)
+            next_seq = last - limit if last - limit > start else None
+
+        result = {
+            "account": address,
+            "ledger_index_min": ledger_min,
+            "ledger_index_max": ledger_max,
+            "limit": limit,
+            "validated": True,
+            "transactions": [self.entries[positions[i]] for i in selected]
+        }
+        if next_seq is not None:
+            result["marker"] = {"ledger": ledgers[next_seq], "seq": next_seq}
+        return result
+
+    def _api_tx(self, params):
+        entry = self.by_hash.get(str(params.get("transaction", "")).upper())
+        if entry is None:
+            return _error("txnNotFound", "Transaction not found.")
+        return dict(entry)
+
+    def _api_ledger(self, params):
+        ledger_index = self._ledger_index(params.get("ledger_index"))
+        if not 1 <= ledger_index <= self.validated_index + 1:
+            return _error("lgrNotFound", "ledgerNotFound")
+        close_time = self.close_times[ledger_index] if ledger_index <= self.validated_index else self.close_time
+        return {
+            "ledger_index": ledger_index,
+            "ledger_hash": hashlib.sha256(str(ledger_index).encode()).hexdigest().upper(),
+            "validated": ledger_index <= self.validated_index,
+            "ledger": {"ledger_index": str(ledger_index), "close_time": close_time,
+                       "closed": ledger_index <= self.validated_index}
+        }
+
+    def _api_fee(self, params):
+        return {
+            "current_ledger_size": str(len(self._open)),
+            "current_queue_size": "0",
+            "drops": {"base_fee": str(BASE_FEE), "median_fee": "5000",
+                      "minimum_fee": str(BASE_FEE), "open_ledger_fee": str(BASE_FEE)},
+            "expected_ledger_size": "1000",
+            "ledger_current_index": self.validated_index + 1,
+            "levels": {"median_level": "128000", "minimum_level": "256",
+                       "open_ledger_level": "256", "reference_level": "256"},
+            "max_queue_size": "2000"
+        }
+
+    def _validated_ledger(self):
+        return {"seq": self.validated_index, "base_fee": BASE_FEE, "reserve_base": RESERVE_BASE,
+                "reserve_inc": RESERVE_INC, "close_time": self.close_time}
+
+    def _api_server_info(self, params):
+        return {"info": {"build_version": "local", "complete_ledgers": f"1-{self.validated_index}",
+                         "server_state": "full", "validated_ledger": self._validated_ledger()}}
+
+    def _api_server_state(self, params):
+        return {"state": {"build_version": "local", "complete_ledgers": f"1-{self.validated_index}",
+                          "server_state": "full", "validated_ledger": self._validated_ledger()}}
+
+    def _api_submit(self, params):
+        blob = params.get("tx_blob", "")
+        try:
+            tx = decode(blob)
+        except Exception as e:
+            return _error("invalidTransaction", str(e))
+        if tx.get("TransactionType") != "Payment" or not isinstance(tx.get("Amount"), str):
+            return _error("notSupported", "Only XRP payments are supported")
+
+        tx_hash = hashlib.sha512(bytes.fromhex("54584E00" + blob)).digest()[:32].hex().upper()
+        engine_result, _ = self.pay(tx["Account"], tx["Destination"], int(tx["Amount"]),
+                                    time.time(), tx.get("SourceTag"), int(tx.get("Fee", BASE_FEE)),
+                                    tx.get("Sequence"), tx_hash)
+        return {
+            "accepted": engine_result.startswith(("tes", "tec")),
+            "applied": engine_result.startswith(("tes", "tec")),
+            "engine_result": engine_result,
+            "engine_result_message": engine_result,
+            "tx_blob": blob,
+            "tx_json": dict(tx, hash=tx_hash)
+        }
+
+
+class LocalLedgerClient(SyncClient):
+    """
+    In-process xrpl-py client of a LocalLedger, usable anywhere a JsonRpcClient
+    is (request(), autofill, submit), with an optional simulated round-trip time.
+    """
+
+    def __init__(self, ledger, latency=0.0):
+        super().__init__(url=f"local://{id(ledger):x}")
+        self.ledger = ledger
+        self.latency = latency
+
+    async def _request_impl(self, request, *, timeout=None):
+        params = request.to_dict()
+        method = params.pop("method")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        # Round-trip through JSON like a network client, so callers never share ledger state
+        return json_to_response({"result": json.loads(json.dumps(self.ledger.handle(method, params)))})
+
+
+def serve(ledger, host="127.0.0.1", port=5005, latency=0.0):
+    """
+    Serve a LocalLedger as a rippled JSON-RPC endpoint (http://host:port/) on a
+    daemon thread, one thread per connection, adding `latency` seconds to every
+    response. Returns the server (server.shutdown() stops it).
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are separate writes, which Nagle would hold for a delayed ACK
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                params = (body.get("params") or [{}])[0]
+                result = ledger.handle(body.get("method"), params)
+            except (ValueError, TypeError, AttributeError, KeyError) as e:
+                result = _error("invalidParams", str(e))
+            if latency:
+                time.sleep(latency)
+            data = json.dumps({"result": result}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        # Queue bursts of new connections (the default of 5 makes clients retry after 1s)
+        request_queue_size = 1024
+
+    server = Server((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="local-ledger-rpc", daemon=True).start()
+    return server
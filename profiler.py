@@ -0,0 +1,208 @@
+from collections import Counter, OrderedDict
+import itertools
+import os
+import re
+import signal
+import sys
+import threading
+import time
+
+# Seconds between two samples (100 Hz)
+DEFAULT_INTERVAL = 0.01
+
+# Longest profile a single request or signal may run (seconds)
+MAX_DURATION = 60
+
+# Profiles that may run at the same time
+MAX_SESSIONS = 4
+
+# Finished profiles kept for retrieval by ID
+MAX_RESULTS = 20
+
+# Deepest stack recorded per sample (deeper frames are cut at the root side)
+MAX_STACK_DEPTH = 200
+
+
+class _Session:
+    """One running profile: the threads it samples and the stack counts so far"""
+
+    __slots__ = ('id', 'thread_ids', 'counts', 'samples', 'started')
+
+    def __init__(self, session_id, thread_ids):
+        self.id = session_id
+        self.thread_ids = thread_ids    # None samples every thread
+        self.counts = Counter()         # collapsed stack -> samples
+        self.samples = 0
+        self.started = time.time()
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for a running server. While at least one profile is
+    running, a daemon thread reads the stacks of the other threads
+    (sys._current_frames()) every `interval` seconds and counts them as collapsed
+    stacks ("thread;outer;...;inner"), the input format of flamegraph.pl and
+    speedscope. The profiled threads are not instrumented, so the overhead is
+    one stack walk per thread per sample, paid on the sampling thread.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, max_sessions=MAX_SESSIONS, max_results=MAX_RESULTS):
+        self.interval = interval
+        self.max_sessions = max_sessions
+        self.max_results = max_results
+        self.sessions = []
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._labels = {}               # code object -> frame label
+        self._thread = None
+
+    def start(self, thread_ids=None):
+        """
+        Start a profile.
+        Args:
+            thread_ids: Only sample these thread idents (None: every thread)
+        Returns:
+            Session, to pass to stop()
+        """
+        with self.lock:
+            if len(self.sessions) >= self.max_sessions:
+                raise ValueError(f"Too many profiles running (at most {self.max_sessions})")
+            session = _Session(next(self._ids), frozenset(thread_ids) if thread_ids is not None else None)
+            self.sessions.append(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        return session
+
+    def stop(self, session):
+        """Stop a profile and return (and keep) its result"""
+        with self.lock:
+            if session in self.sessions:
+                self.sessions.remove(session)
+            result = {
+                "id": session.id,
+                "started": session.started,
+                "duration": time.time() - session.started,
+                "interval": self.interval,
+                "samples": session.samples,
+                "stacks": dict(session.counts)
+            }
+            self.results[session.id] = result
+            while len(self.results) > self.max_results:
+                self.results.popitem(last=False)
+        return result
+
+    def profile(self, seconds, thread_ids=None):
+        """Profile for `seconds` (at most MAX_DURATION) and return the result"""
+        session = self.start(thread_ids)
+        try:
+            time.sleep(min(max(seconds, 0), MAX_DURATION))
+        finally:
+            result = self.stop(session)
+        return result
+
+    def get_result(self, profile_id):
+        """Result of a finished profile, or None if it is unknown or expired"""
+        with self.lock:
+            return self.results.get(profile_id)
+
+    def _run(self):
+        """Sampling loop, runs while any session is active"""
+        own_ident = threading.get_ident()
+        while True:
+            with self.lock:
+                sessions = list(self.sessions)
+                if not sessions:
+                    self._thread = None
+                    return
+
+            names = {thread.ident: _thread_label(thread.name) for thread in threading.enumerate()}
+            stacks = {}
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident != own_ident:
+                    stacks[ident] = f"{names.get(ident, 'thread')};{self._collapse(frame)}"
+            # Do not keep the other threads' frames (and their locals) alive
+            del frames, frame
+
+            with self.lock:
+                for session in sessions:
+                    session.samples += 1
+                    for ident, stack in stacks.items():
+                        if session.thread_ids is None or ident in session.thread_ids:
+                            session.counts[stack] += 1
+            time.sleep(self.interval)
+
+    def _collapse(self, frame):
+        """Helper to render a stack as 'outer;...;inner'"""
+        labels = []
+        while frame is not None and len(labels) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                name = getattr(code, 'co_qualname', code.co_name)
+                label = self._labels[code] = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            labels.append(label)
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+
+def _thread_label(name):
+    """Helper to group worker threads: 'Thread-12 (process_request_thread)' -> 'Thread (process_request_thread)'"""
+    return re.sub(r'-\d+', '', name).replace(';', ',')
+
+
+def format_collapsed(result):
+    """Collapsed stack text of a profile result: one 'stack count' line per stack"""
+    return "".join(f"{stack} {count}\n" for stack, count in
+                   sorted(result["stacks"].items(), key=lambda item: item[1], reverse=True))
+
+
+def top_functions(result, limit=20):
+    """
+    Functions with the most samples in a profile result.
+    Returns:
+        List of {"function", "self", "total"} sorted by total samples: "self"
+        counts samples where the function was running, "total" samples where it
+        was anywhere on the stack
+    """
+    own = Counter()
+    total = Counter()
+    for stack, count in result["stacks"].items():
+        frames = stack.split(";")[1:]
+        if frames:
+            own[frames[-1]] += count
+        for label in set(frames):
+            total[label] += count
+    return [{"function": label, "self": own[label], "total": count}
+            for label, count in total.most_common(limit)]
+
+
+def install_signal_handler(profiler, seconds=10, directory="profiles", signum=None):
+    """
+    Profile the whole process for `seconds` when the process receives SIGUSR2
+    (kill -USR2 <pid>), and write the collapsed stacks to `directory`. Must be
+    called from the main thread; does nothing on platforms without SIGUSR2.
+    """
+    signum = signum or getattr(signal, 'SIGUSR2', None)
+    if signum is None:
+        return
+
+    def write_profile():
+        try:
+            result = profiler.profile(seconds)
+        except ValueError as e:
+            print(f"Profiler: {e}")
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"profile-{os.getpid()}-{int(result['started'])}.folded")
+        with open(path, 'w') as f:
+            f.write(format_collapsed(result))
+        print(f"Profiler: {result['samples']} samples written to {path} (profile ID {result['id']})")
+
+    def handler(signum, frame):
+        # The profile runs on its own thread, the signal handler returns at once
+        threading.Thread(target=write_profile, name="signal-profile", daemon=True).start()
+
+    signal.signal(signum, handler)
@@ -0,0 +1,234 @@
+from collections import deque
+from amounts import drops_to_xrp
+import threading
+
+# Width of the time buckets used for provenance time windows (seconds)
+PROVENANCE_BUCKET_SECONDS = 3600
+
+# Longest path (in wallets) kept for a lot of funds, older hops are dropped
+MAX_PROVENANCE_HOPS = 8
+
+# Proportional mode: (age, width) in seconds. Funds held at a wallet for longer
+# than `age` have the entry times along their path coarsened to `width`, so
+# their lots merge and a wallet's lot count stays bounded as history grows
+PROVENANCE_COARSENING = ((86400, 86400), (30 * 86400, 30 * 86400))
+
+# Proportional mode: lots a wallet holds before it is first compacted
+MIN_COMPACTION_LOTS = 64
+
+
+class ProvenanceEngine:
+    """
+    Follow funds through the wallet graph ("follow the money").
+
+    Every wallet holds lots of funds tagged with the path they took and the time
+    they entered each wallet on that path. When a wallet sends a payment, lots
+    are taken out of it either oldest first ("fifo") or pro rata across all lots
+    ("proportional") and moved to the receiver with the receiver appended to
+    their path. Funds a wallet spends without having received them through a
+    tracked payment (opening balances, faucet or external deposits) become new
+    lots that start at that wallet. All amounts are integer drops, so lots and
+    summaries add up exactly.
+
+    Each time funds arrive at a wallet, the flow summary of every (source, sink)
+    pair on their path is updated, so source -> sink queries only read the
+    precomputed summaries and never replay history.
+
+    Pro rata spending touches every lot of the sender, so in that mode lots
+    that have been held for a while are compacted: their entry times are
+    coarsened (PROVENANCE_COARSENING) and equal lots merge. Time windows of
+    the funds they pass on later are resolved to that coarser granularity.
+    """
+
+    def __init__(self, mode="fifo", bucket_seconds=PROVENANCE_BUCKET_SECONDS, max_hops=MAX_PROVENANCE_HOPS):
+        if mode not in ("fifo", "proportional"):
+            raise ValueError(f"Invalid attribution mode: {mode}")
+        self.mode = mode
+        self.bucket_seconds = bucket_seconds
+        self.max_hops = max_hops
+
+        # wallet -> lots; a lot is [path, entry_buckets, amount]
+        # (deque for fifo, dict keyed on (path, entry_buckets) for proportional)
+        self.holdings = {}
+
+        # (source, sink) -> {path: {entry_bucket_at_source: amount}}
+        self.flows = {}
+
+        # Proportional mode: wallet -> drops held in its lots, and the lot
+        # count at which the wallet is compacted next
+        self.totals = {}
+        self._compact_at = {}
+
+        self.lock = threading.Lock()
+
+    def ingest(self, tx):
+        """
+        Apply one payment to the holdings and flow summaries.
+        Payments must be ingested in ledger order.
+        Args:
+            tx: Transaction record (TxRecord)
+        """
+        with self.lock:
+            bucket = self._bucket(tx.timestamp)
+            lots = self._take(tx.sender, tx.amount_drops, bucket)
+            for path, entry_buckets, amount in lots:
+                self._arrive(tx.receiver, path, entry_buckets, amount, bucket)
+
+    def get_state(self):
+        """Holdings and flow summaries as JSON-serializable lists, for a snapshot"""
+        with self.lock:
+            if self.mode == "fifo":
+                holdings = {wallet: [[list(path), list(buckets), amount] for path, buckets, amount in lots]
+                            for wallet, lots in self.holdings.items()}
+            else:
+                holdings = {wallet: [[list(path), list(buckets), amount] for (path, buckets), amount in lots.items()]
+                            for wallet, lots in self.holdings.items()}
+            return {
+                "mode": self.mode,
+                "holdings": holdings,
+                "flows": [[source, sink, [[list(path), list(buckets.items())] for path, buckets in paths.items()]]
+                          for (source, sink), paths in self.flows.items()]
+            }
+
+    def load_state(self, state):
+        """Replace the holdings and flow summaries with the output of get_state()"""
+        if state["mode"] != self.mode:
+            raise ValueError(f"Provenance state of mode {state['mode']}, engine uses {self.mode}")
+        with self.lock:
+            if self.mode == "fifo":
+                self.holdings = {wallet: deque([tuple(path), tuple(buckets), amount] for path, buckets, amount in lots)
+                                 for wallet, lots in state["holdings"].items()}
+            else:
+                self.holdings = {wallet: {(tuple(path), tuple(buckets)): amount for path, buckets, amount in lots}
+                                 for wallet, lots in state["holdings"].items()}
+                self.totals = {wallet: sum(lots.values()) for wallet, lots in self.holdings.items()}
+                self._compact_at = {}
+            self.flows = {(source, sink): {tuple(path): dict(buckets) for path, buckets in paths}
+                          for source, sink, paths in state["flows"]}
+
+    def query(self, source, sink, start=None, end=None):
+        """
+        How much of the funds that entered `source` ended up at `sink`, and through
+        which paths.
+        Args:
+            source: Wallet ID where the funds entered
+            sink: Wallet ID where the funds arrived
+            start: Only count funds that entered source at or after this Unix time
+            end: Only count funds that entered source before this Unix time
+        Returns:
+            Dictionary with the total and the amount per path (largest first), in XRP
+        """
+        start_bucket = self._bucket(start) if start is not None else None
+        end_bucket = self._bucket(end) if end is not None else None
+
+        with self.lock:
+            paths = []
+            for path, buckets in self.flows.get((source, sink), {}).items():
+                amount = sum(
+                    value for bucket, value in buckets.items()
+                    if (start_bucket is None or bucket >= start_bucket)
+                    and (end_bucket is None or bucket < end_bucket)
+                )
+                if amount > 0:
+                    paths.append((list(path), amount))
+
+        paths.sort(key=lambda p: p[1], reverse=True)
+        return {
+            'source': source,
+            'sink': sink,
+            'mode': self.mode,
+            'start': start,
+            'end': end,
+            'total': drops_to_xrp(sum(amount for _, amount in paths)),
+            'paths': [{'path': path, 'amount': drops_to_xrp(amount)} for path, amount in paths]
+        }
+
+    def _bucket(self, timestamp):
+        """Helper to map a Unix timestamp to the start of its time bucket"""
+        return int(timestamp) // self.bucket_seconds * self.bucket_seconds
+
+    def _take(self, wallet, amount, bucket):
+        """Helper to remove `amount` drops from a wallet's lots, returning the lots taken"""
+        taken = []
+        if self.mode == "fifo":
+            lots = self.holdings.setdefault(wallet, deque())
+            remaining = amount
+            while remaining > 0 and lots:
+                lot = lots[0]
+                portion = min(lot[2], remaining)
+                taken.append((lot[0], lot[1], portion))
+                remaining -= portion
+                lot[2] -= portion
+                if lot[2] == 0:
+                    lots.popleft()
+        else:
+            lots = self.holdings.setdefault(wallet, {})
+            total = self.totals.get(wallet, 0)
+            spent = min(amount, total)
+            if spent:
+                # Pro rata in whole drops; the rounding remainder (less than one
+                # drop per lot) goes one drop each to the first lots with funds left
+                portions = {key: value * spent // total for key, value in lots.items()}
+                remainder = spent - sum(portions.values())
+                for key in lots:
+                    if remainder == 0:
+                        break
+                    if lots[key] > portions[key]:
+                        portions[key] += 1
+                        remainder -= 1
+                for key, portion in portions.items():
+                    if portion:
+                        taken.append((key[0], key[1], portion))
+                        lots[key] -= portion
+                        if lots[key] == 0:
+                            del lots[key]
+                self.totals[wallet] = total - spent
+            remaining = amount - spent
+
+        # Spending more than the tracked funds: the rest originates at this wallet
+        if remaining > 0:
+            taken.append(((wallet,), (bucket,), remaining))
+        return taken
+
+    def _arrive(self, wallet, path, entry_buckets, amount, bucket):
+        """Helper to add a lot to a wallet and update the flow summaries on its path"""
+        if wallet in path:
+            # Erase the loop, the funds re-enter the wallet they already passed
+            index = path.index(wallet)
+            path, entry_buckets = path[:index], entry_buckets[:index]
+        path = (path + (wallet,))[-self.max_hops:]
+        entry_buckets = (entry_buckets + (bucket,))[-self.max_hops:]
+
+        for i in range(len(path) - 1):
+            summary = self.flows.setdefault((path[i], wallet), {}).setdefault(path[i:], {})
+            summary[entry_buckets[i]] = summary.get(entry_buckets[i], 0) + amount
+
+        if self.mode == "fifo":
+            lots = self.holdings.setdefault(wallet, deque())
+            if lots and lots[-1][0] == path and lots[-1][1] == entry_buckets:
+                lots[-1][2] += amount
+            else:
+                lots.append([path, entry_buckets, amount])
+        else:
+            lots = self.holdings.setdefault(wallet, {})
+            lots[(path, entry_buckets)] = lots.get((path, entry_buckets), 0) + amount
+            self.totals[wallet] = self.totals.get(wallet, 0) + amount
+            if len(lots) > self._compact_at.get(wallet, MIN_COMPACTION_LOTS):
+                self._compact(wallet, bucket)
+
+    def _compact(self, wallet, bucket):
+        """
+        Helper to merge a wallet's older lots (proportional mode) by coarsening
+        their entry times by age. Runs again once the lot count has doubled, so
+        compaction costs O(1) per payment on average.
+        """
+        compacted = {}
+        for (path, entry_buckets), amount in self.holdings[wallet].items():
+            age = bucket - entry_buckets[-1]
+            for min_age, width in PROVENANCE_COARSENING:
+                if age >= min_age:
+                    entry_buckets = tuple(b // width * width for b in entry_buckets)
+            key = (path, entry_buckets)
+            compacted[key] = compacted.get(key, 0) + amount
+        self.holdings[wallet] = compacted
+        self._compact_at[wallet] = max(MIN_COMPACTION_LOTS, 2 * len(compacted))
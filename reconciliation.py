@@ -0,0 +1,233 @@
+from balance_history import balance_changes
+from amounts import drops_to_xrp
+import threading
+import time
+
+
+class _WalletLedger:
+    """Running components of one wallet's balance, in drops"""
+
+    __slots__ = ('opening', 'internal_in', 'internal_out', 'external_in', 'external_out',
+                 'fees', 'other', 'unexplained', 'on_ledger', 'ledger_index')
+
+    def __init__(self, opening):
+        self.opening = opening          # Balance before the first ingested transaction
+        self.internal_in = 0            # Payments from other system wallets
+        self.internal_out = 0           # Payments to other system wallets
+        self.external_in = 0            # Payments from unknown addresses (faucet, taxpayers, ...)
+        self.external_out = 0           # Payments to unknown addresses (vendors, ...)
+        self.fees = 0                   # Transaction fees paid by the wallet
+        self.other = 0                  # Balance changes of non-payment transactions
+        self.unexplained = 0            # Missed transactions and unexplained payment effects
+        self.on_ledger = opening        # Validated balance from the transaction metadata
+        self.ledger_index = 0
+
+
+class Reconciler:
+    """
+    Continuous reconciliation between the balance derived from system payments
+    (total_received - total_sent, as shown in the department hierarchy) and the
+    validated on-ledger balance of every owned wallet. Payments with any system
+    wallet, owned or not (another shard's), count as internal.
+
+    Every ingested transaction updates the running components of the wallets it
+    touches in O(1); check() only re-evaluates wallets touched since the last
+    check. The difference between the two balances is attributed to the opening
+    balance, fees, payments with external counterparties and other transactions;
+    whatever is left is unexplained.
+    """
+
+    def __init__(self, wallet_names, owned=None):
+        """
+        Args:
+            wallet_names: Dictionary of classic address -> wallet ID of every system
+                wallet (payments between them are internal)
+            owned: Addresses of the wallets to reconcile (default: all of them),
+                e.g. those of one shard
+        """
+        self.wallet_names = dict(wallet_names)
+        self.owned = set(owned) if owned is not None else set(self.wallet_names)
+        self.wallets = {}
+        self.results = {}
+        self.reserve_drops = 0
+        self.checks = 0
+        self.last_checked_ledger = 0
+        self.last_check_time = 0.0
+        self.spot_checks = 0
+        self.spot_check_mismatches = {}
+        self._dirty = set()
+        self._ledger_index = 0
+        self.lock = threading.Lock()
+
+    def ingest(self, tx_info):
+        """Update the running balance components from one AccountTx entry"""
+        tx = tx_info.get('tx_json') or tx_info.get('tx') or {}
+        meta = tx_info.get('meta', {})
+        ledger_index = tx_info.get('ledger_index') or tx.get('ledger_index', 0)
+        account = tx.get('Account')
+
+        with self.lock:
+            self._ledger_index = max(self._ledger_index, ledger_index)
+            is_payment = tx.get('TransactionType') == 'Payment'
+            delivered = meta.get('delivered_amount', meta.get('DeliveredAmount'))
+            if not (is_payment and meta.get('TransactionResult') == 'tesSUCCESS' and isinstance(delivered, str)):
+                delivered = 0  # Failed payment or non-XRP amount, only the fee applies
+            delivered = int(delivered)
+            destination = tx.get('Destination')
+
+            for address, previous, final in balance_changes(tx_info):
+                if address not in self.owned:
+                    continue
+                wallet = self.wallets.get(address)
+                if wallet is None:
+                    wallet = self.wallets[address] = _WalletLedger(previous)
+                elif previous != wallet.on_ledger:
+                    # Some transaction touching this wallet was never ingested
+                    wallet.unexplained += previous - wallet.on_ledger
+                wallet.on_ledger = final
+                wallet.ledger_index = ledger_index
+                self._dirty.add(address)
+
+                expected = 0
+                if address == account:
+                    fee = int(tx.get('Fee', 0))
+                    wallet.fees += fee
+                    expected -= fee
+                if delivered and address == account and destination != account:
+                    expected -= delivered
+                    if destination in self.wallet_names:
+                        wallet.internal_out += delivered
+                    else:
+                        wallet.external_out += delivered
+                if delivered and address == destination and destination != account:
+                    expected += delivered
+                    if account in self.wallet_names:
+                        wallet.internal_in += delivered
+                    else:
+                        wallet.external_in += delivered
+
+                # What the fee and payment amount do not explain
+                if is_payment:
+                    wallet.unexplained += (final - previous) - expected
+                else:
+                    wallet.other += (final - previous) - expected
+
+    def check(self):
+        """
+        Re-evaluate the wallets touched since the last check.
+        Returns:
+            List of wallet IDs whose balances do not reconcile
+        """
+        with self.lock:
+            for address in self._dirty:
+                self.results[address] = self._reconcile(address)
+            self._dirty.clear()
+            self.checks += 1
+            self.last_checked_ledger = self._ledger_index
+            self.last_check_time = time.time()
+            return [r['wallet_id'] for r in self.results.values() if r['unexplained'] != 0]
+
+    def get_metrics(self):
+        """Reconciliation metrics in the Prometheus text format"""
+        report = self.get_report()
+        lines = [
+            "# HELP transparenx_reconciliation_checks_total Reconciliation checks run",
+            "# TYPE transparenx_reconciliation_checks_total counter",
+            f"transparenx_reconciliation_checks_total {report['checks']}",
+            "# HELP transparenx_reconciliation_last_ledger Last ledger index reconciled",
+            "# TYPE transparenx_reconciliation_last_ledger gauge",
+            f"transparenx_reconciliation_last_ledger {report['last_checked_ledger']}",
+            "# HELP transparenx_reconciliation_unreconciled_wallets Wallets with unexplained differences",
+            "# TYPE transparenx_reconciliation_unreconciled_wallets gauge",
+            f"transparenx_reconciliation_unreconciled_wallets {len(report['unreconciled'])}",
+            "# HELP transparenx_reconciliation_spot_check_mismatches Wallets whose node balance differs from ingest",
+            "# TYPE transparenx_reconciliation_spot_check_mismatches gauge",
+            f"transparenx_reconciliation_spot_check_mismatches {len(report['spot_check_mismatches'])}",
+            "# HELP transparenx_reconciliation_discrepancy_xrp On-ledger minus derived balance",
+            "# TYPE transparenx_reconciliation_discrepancy_xrp gauge",
+        ]
+        lines += [f'transparenx_reconciliation_discrepancy_xrp{{wallet="{r["wallet_id"]}"}} {r["discrepancy"]}'
+                  for r in report['wallets']]
+        lines += [
+            "# HELP transparenx_reconciliation_unexplained_xrp Discrepancy not attributed to a known cause",
+            "# TYPE transparenx_reconciliation_unexplained_xrp gauge",
+        ]
+        lines += [f'transparenx_reconciliation_unexplained_xrp{{wallet="{r["wallet_id"]}"}} {r["unexplained"]}'
+                  for r in report['wallets']]
+        return "\n".join(lines) + "\n"
+
+    def get_state(self):
+        """Running components of every wallet, for a snapshot"""
+        with self.lock:
+            return {
+                "ledger_index": self._ledger_index,
+                "wallets": {address: [getattr(wallet, field) for field in _WalletLedger.__slots__]
+                            for address, wallet in self.wallets.items()}
+            }
+
+    def load_state(self, state):
+        """Replace the running components with the output of get_state()"""
+        with self.lock:
+            self.wallets = {}
+            for address, values in state["wallets"].items():
+                wallet = self.wallets[address] = _WalletLedger(0)
+                for field, value in zip(_WalletLedger.__slots__, values):
+                    setattr(wallet, field, value)
+            self._ledger_index = state["ledger_index"]
+            self.results = {}
+            self._dirty = set(self.wallets)
+
+    def record_spot_check(self, address, ledger_balance_drops):
+        """
+        Compare a balance read directly from the XRPL node with the balance from
+        the ingested metadata. A mismatch means transactions were missed by ingest.
+        """
+        with self.lock:
+            self.spot_checks += 1
+            wallet = self.wallets.get(address)
+            derived = wallet.on_ledger if wallet else 0
+            if ledger_balance_drops != derived:
+                self.spot_check_mismatches[self.wallet_names.get(address, address)] = {
+                    "ledger_balance": drops_to_xrp(ledger_balance_drops),
+                    "ingested_balance": drops_to_xrp(derived),
+                    "checked_at": time.time()
+                }
+            else:
+                self.spot_check_mismatches.pop(self.wallet_names.get(address, address), None)
+
+    def get_report(self):
+        """Summary and per-wallet reconciliation results (in XRP)"""
+        with self.lock:
+            wallets = sorted(self.results.values(), key=lambda r: r['wallet_id'])
+            return {
+                "checks": self.checks,
+                "last_checked_ledger": self.last_checked_ledger,
+                "last_check_time": self.last_check_time,
+                "reserve": drops_to_xrp(self.reserve_drops),
+                "reconciled": sum(1 for r in wallets if r['unexplained'] == 0),
+                "unreconciled": [r['wallet_id'] for r in wallets if r['unexplained'] != 0],
+                "spot_checks": self.spot_checks,
+                "spot_check_mismatches": dict(self.spot_check_mismatches),
+                "wallets": wallets
+            }
+
+    def _reconcile(self, address):
+        """Helper to attribute the difference between derived and on-ledger balance"""
+        w = self.wallets[address]
+        derived = w.internal_in - w.internal_out
+        return {
+            "wallet_id": self.wallet_names[address],
+            "ledger_index": w.ledger_index,
+            "on_ledger_balance": drops_to_xrp(w.on_ledger),
+            "derived_balance": drops_to_xrp(derived),
+            "discrepancy": drops_to_xrp(w.on_ledger - derived),
+            "attribution": {
+                "opening_balance": drops_to_xrp(w.opening),
+                "fees": drops_to_xrp(-w.fees),
+                "external_in": drops_to_xrp(w.external_in),
+                "external_out": drops_to_xrp(-w.external_out),
+                "other_transactions": drops_to_xrp(w.other)
+            },
+            "reserve": drops_to_xrp(min(self.reserve_drops, w.on_ledger)),
+            "unexplained": drops_to_xrp(w.unexplained)
+        }
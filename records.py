@@ -0,0 +1,220 @@
+from struct import Struct
+import sys
+
+from amounts import drops_to_xrp
+
+# Numeric fields packed after the 32-byte hash: amount (drops), timestamp,
+# ledger index, SourceTag (-1 if none)
+_NUMBERS = Struct('<qIIq')
+HASH_SIZE = 32
+
+# Size of TxRecord.data
+RECORD_SIZE = HASH_SIZE + _NUMBERS.size
+
+
+class TxRecord:
+    """
+    Compact record of one successful payment between system wallets.
+    The transaction hash (32 raw bytes) and the numeric fields (integer drops,
+    timestamp, ledger index, SourceTag) are packed into one bytes object, and the
+    wallet IDs are interned strings shared by every record. to_dict() gives the
+    public (JSON) form, and is only meant for the serialization boundary.
+    """
+
+    __slots__ = ('data', 'sender', 'receiver')
+
+    def __init__(self, tx_hash, sender, receiver, amount_drops, timestamp, ledger_index, source_tag=None):
+        hash_bytes = bytes.fromhex(tx_hash) if isinstance(tx_hash, str) else tx_hash
+        if len(hash_bytes) != HASH_SIZE:
+            raise ValueError(f"Invalid transaction hash: {tx_hash}")
+        self.data = hash_bytes + _NUMBERS.pack(
+            amount_drops, timestamp, ledger_index, -1 if source_tag is None else source_tag)
+        self.sender = sys.intern(sender)
+        self.receiver = sys.intern(receiver)
+
+    @classmethod
+    def from_data(cls, data, sender, receiver):
+        """Record from its packed data (e.g. read back from a snapshot)"""
+        if len(data) != RECORD_SIZE:
+            raise ValueError("Invalid record data")
+        record = cls.__new__(cls)
+        record.data = bytes(data)
+        record.sender = sys.intern(sender)
+        record.receiver = sys.intern(receiver)
+        return record
+
+    @property
+    def hash_bytes(self):
+        return self.data[:HASH_SIZE]
+
+    @property
+    def tx_hash(self):
+        return self.data[:HASH_SIZE].hex().upper()
+
+    @property
+    def amount_drops(self):
+        return _NUMBERS.unpack_from(self.data, HASH_SIZE)[0]
+
+    @property
+    def amount_xrp(self):
+        return drops_to_xrp(self.amount_drops)
+
+    @property
+    def timestamp(self):
+        return _NUMBERS.unpack_from(self.data, HASH_SIZE)[1]
+
+    @property
+    def ledger_index(self):
+        return _NUMBERS.unpack_from(self.data, HASH_SIZE)[2]
+
+    @property
+    def source_tag(self):
+        tag = _NUMBERS.unpack_from(self.data, HASH_SIZE)[3]
+        return None if tag < 0 else tag
+
+    @property
+    def type(self):
+        return 'Tax Payment' if self.source_tag else 'Payment'
+
+    @property
+    def success(self):
+        return True
+
+    def to_dict(self):
+        amount_drops, timestamp, ledger_index, source_tag = _NUMBERS.unpack_from(self.data, HASH_SIZE)
+        return {
+            'type': 'Tax Payment' if source_tag > 0 else 'Payment',
+            'sender': self.sender,
+            'receiver': self.receiver,
+            'amount_xrp': drops_to_xrp(amount_drops),
+            'amount_drops': amount_drops,
+            'timestamp': timestamp,
+            'tx_hash': self.tx_hash,
+            'ledger_index': ledger_index,
+            'source_tag': None if source_tag < 0 else source_tag,
+            'success': True
+        }
+
+    def __repr__(self):
+        return f"TxRecord({self.tx_hash[:12]}... {self.sender} -> {self.receiver} {self.amount_drops} drops)"
+
+
+def payment_record(tx_info, wallet_names):
+    """
+    Turn an AccountTx entry into a compact transaction record (TxRecord).
+    Raises ValueError for anything that is not a successful payment between
+    two system wallets.
+    Args:
+        tx_info: AccountTx entry (API v1 or v2)
+        wallet_names: Classic address -> wallet ID of every system wallet
+    """
+    # Get transaction data
+    tx = tx_info.get('tx_json') or tx_info.get('tx') or tx_info.get('transaction')
+    if not tx:
+        raise ValueError("No transaction data found")
+
+    # Get transaction hash
+    tx_hash = tx.get('hash', '') or tx_info.get('hash', '')
+    if not tx_hash:
+        raise ValueError("No transaction hash found")
+
+    # Only process Payment type transactions
+    if tx.get('TransactionType') != 'Payment':
+        raise ValueError(f"Non-payment transaction: {tx.get('TransactionType')}")
+
+    # Get sender and receiver
+    sender = tx.get('Account', '')
+    receiver = tx.get('Destination', '')
+    if not sender or not receiver:
+        raise ValueError("Missing sender or receiver")
+
+    # Convert addresses to department names
+    sender_name = wallet_names.get(sender)
+    receiver_name = wallet_names.get(receiver)
+    if not sender_name or not receiver_name:
+        raise ValueError(f"Unknown sender or receiver: {sender} -> {receiver}")
+
+    # Get amount
+    meta = tx_info.get('meta', {})
+    amount = None
+    for amount_field in ['Amount', 'DeliverMax', 'delivered_amount']:
+        if amount_field in tx:
+            amount = tx[amount_field]
+            break
+        elif amount_field in meta:
+            amount = meta[amount_field]
+            break
+
+    if not amount:
+        raise ValueError("No amount found")
+
+    # XRP amounts are strings of drops (issued currencies are objects)
+    try:
+        amount_drops = int(amount)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid amount format: {amount}")
+
+    # Get timestamp
+    timestamp = tx.get('date', 0)
+    if timestamp:
+        timestamp += 946684800  # Convert Ripple epoch to Unix timestamp
+
+    # Check if transaction was successful
+    if meta.get('TransactionResult') != 'tesSUCCESS':
+        raise ValueError(f"Transaction not successful: {meta.get('TransactionResult')}")
+
+    return TxRecord(
+        tx_hash,
+        sender_name,
+        receiver_name,
+        amount_drops,
+        timestamp,
+        entry_ledger_index(tx_info),
+        tx.get('SourceTag')
+    )
+
+
+def entry_ledger_index(tx_info):
+    """Ledger index of an AccountTx entry (API v1 and v2)"""
+    tx = tx_info.get('tx_json') or tx_info.get('tx') or {}
+    return tx_info.get('ledger_index') or tx.get('ledger_index', 0)
+
+
+def benchmark_records(count=100_000):
+    """Print the memory per transaction held as dictionaries and as TxRecords"""
+    import hashlib
+    import tracemalloc
+
+    wallets = [f"dept_{i:03d}" for i in range(20)]
+
+    def make(factory):
+        tracemalloc.start()
+        records = [factory(hashlib.sha256(str(i).encode()).hexdigest().upper(),
+                           wallets[i % 20], wallets[(i * 7 + 1) % 20], 1_000_000 + i,
+                           1_700_000_000 + i, 90_000_000 + i // 10) for i in range(count)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return records, size
+
+    def as_dict(tx_hash, sender, receiver, drops, timestamp, ledger_index):
+        # The previous record layout
+        return {
+            'type': 'Payment',
+            'sender': sender,
+            'receiver': receiver,
+            'amount_xrp': drops_to_xrp(drops),
+            'timestamp': timestamp,
+            'tx_hash': tx_hash,
+            'ledger_index': ledger_index,
+            'source_tag': None,
+            'success': True
+        }
+
+    _, dict_size = make(as_dict)
+    _, record_size = make(TxRecord)
+    print(f"dict:     {dict_size / count:6.0f} bytes/transaction")
+    print(f"TxRecord: {record_size / count:6.0f} bytes/transaction ({dict_size / record_size:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    benchmark_records()
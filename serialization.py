@@ -0,0 +1,169 @@
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+from decimal import Decimal
+import gzip
+import json
+import os
+
+from records import TxRecord
+
+# Responses smaller than this are not compressed
+MIN_COMPRESS_BYTES = 1024
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _json_default(obj):
+    """
+    Fallback for the types the serializers do not know: records, Decimal (as an
+    exact string), bytes (as upper-case hex, like hashes) and sets. Anything else
+    raises TypeError instead of being sent as its str().
+    """
+    if isinstance(obj, TxRecord):
+        return obj.to_dict()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return bytes(obj).hex().upper()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class RecordJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes compact records (TxRecord) through to_dict()"""
+
+    @staticmethod
+    def default(obj):
+        if isinstance(obj, TxRecord):
+            return obj.to_dict()
+        return DefaultJSONProvider.default(obj)
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, separators=(',', ':'), default=_json_default).encode()
+
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _msgspec_dumps(obj):
+    return _msgspec_encoder.encode(obj)
+
+
+_msgspec_encoder = msgspec.json.Encoder(enc_hook=_json_default) if msgspec else None
+
+JSON_SERIALIZERS = {'json': _stdlib_dumps}
+if orjson:
+    JSON_SERIALIZERS['orjson'] = _orjson_dumps
+if msgspec:
+    JSON_SERIALIZERS['msgspec'] = _msgspec_dumps
+
+
+def get_serializer(name=None):
+    """
+    JSON serializer returning bytes: the requested one if it is installed,
+    otherwise the fastest available (orjson, msgspec, then the standard library).
+    """
+    name = name or os.getenv('JSON_SERIALIZER')
+    if name in JSON_SERIALIZERS:
+        return JSON_SERIALIZERS[name]
+    for name in ('orjson', 'msgspec', 'json'):
+        if name in JSON_SERIALIZERS:
+            return JSON_SERIALIZERS[name]
+
+
+dumps = get_serializer()
+
+
+def msgpack_dumps(obj):
+    """Serialize to MessagePack, or return None if no MessagePack library is installed"""
+    if msgspec:
+        return msgspec.msgpack.encode(obj, enc_hook=_json_default)
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack.packb(obj, default=_json_default)
+
+
+def api_response(payload, status=200, request=None):
+    """
+    Response for an API payload with content negotiation: MessagePack if the
+    client accepts it, JSON otherwise, compressed with br or gzip when the client
+    accepts it and the body is large enough.
+    """
+    body = None
+    mimetype = 'application/json'
+    if request is not None and request.accept_mimetypes.best_match(
+            ('application/json',) + MSGPACK_MIMETYPES, default='application/json') in MSGPACK_MIMETYPES:
+        body = msgpack_dumps(payload)
+        if body is not None:
+            mimetype = 'application/msgpack'
+    if body is None:
+        body = dumps(payload)
+
+    response = Response(body, status=status, mimetype=mimetype)
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    if request is None or len(body) < MIN_COMPRESS_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli and accepted['br']:
+        response.set_data(brotli.compress(body, quality=4))
+        response.content_encoding = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.content_encoding = 'gzip'
+    return response
+
+
+def normalize_hierarchy(hierarchy_data):
+    """
+    Normalized form of a department hierarchy: every transaction is sent once in
+    a top-level list, and links and per-wallet statistics reference it by index.
+    """
+    transactions = []
+    index_by_hash = {}
+
+    def ref(tx):
+        index = index_by_hash.get(tx.hash_bytes)
+        if index is None:
+            index = index_by_hash[tx.hash_bytes] = len(transactions)
+            transactions.append(tx)
+        return index
+
+    links = [{
+        'source': link['source'],
+        'target': link['target'],
+        'value': link['value'],
+        'transactions': [ref(tx) for tx in link['transactions']]
+    } for link in hierarchy_data['links']]
+
+    stats = {}
+    for wallet_id, wallet_stats in hierarchy_data['transactions'].items():
+        stats[wallet_id] = dict(wallet_stats,
+                                sent_transactions=[ref(tx) for tx in wallet_stats['sent_transactions']],
+                                received_transactions=[ref(tx) for tx in wallet_stats['received_transactions']])
+
+    return dict(hierarchy_data,
+                format='normalized',
+                links=links,
+                transactions=stats,
+                transaction_list=transactions)
@@ -0,0 +1,174 @@
+from xrpl.core.binarycodec import encode, encode_for_signing
+from xrpl.core.keypairs import sign as keypairs_sign
+from xrpl.wallet import Wallet
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha512
+import multiprocessing
+import threading
+import time
+import os
+
+# Transactions sent to a worker process in one task
+DEFAULT_CHUNK_SIZE = 32
+
+# Prefix of the data hashed for a transaction ID ("TXN\0")
+TRANSACTION_HASH_PREFIX = "54584E00"
+
+# Wallets of the current worker process, loaded once by _init_worker
+_worker_wallets = {}
+
+
+def _init_worker(seeds):
+    """Load the wallet keys once per worker process (seeds: wallet ID -> (seed, algorithm))"""
+    global _worker_wallets
+    _worker_wallets = {wallet_id: Wallet.from_seed(seed, algorithm=algorithm)
+                       for wallet_id, (seed, algorithm) in seeds.items()}
+
+
+def _sign_chunk(items):
+    """Sign a chunk of (wallet_id, tx_json) pairs in a worker process"""
+    return [sign_json(tx_json, _worker_wallets[wallet_id]) for wallet_id, tx_json in items]
+
+
+def sign_json(tx_json, wallet):
+    """
+    Sign an autofilled transaction in its XRPL JSON form (classic addresses only).
+    Returns:
+        (tx_blob, tx_hash)
+    """
+    tx_json = dict(tx_json, SigningPubKey=wallet.public_key)
+    tx_json["TxnSignature"] = keypairs_sign(bytes.fromhex(encode_for_signing(tx_json)), wallet.private_key)
+    tx_blob = encode(tx_json)
+    return tx_blob, transaction_hash(tx_blob)
+
+
+def transaction_hash(tx_blob):
+    """Transaction ID (hash) of a signed transaction blob"""
+    return sha512(bytes.fromhex(TRANSACTION_HASH_PREFIX + tx_blob)).digest().hex().upper()[:64]
+
+
+class SigningService:
+    """
+    Sign batches of autofilled transactions in a pool of worker processes,
+    so signing and serialization are not limited by the GIL. Every worker loads
+    the wallet keys once at startup and then only receives transactions.
+    """
+
+    def __init__(self, wallets, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Args:
+            wallets: Dictionary of wallet ID -> Wallet that may be used for signing
+            workers: Number of worker processes (default: CPU count)
+            chunk_size: Transactions sent to a worker in one task
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.wallet_ids = set(wallets)
+
+        # Fork so the workers do not re-import the application module
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            # The key algorithm is passed along, from_seed() would assume ed25519
+            initargs=({wallet_id: (wallet.seed, wallet.algorithm) for wallet_id, wallet in wallets.items()},)
+        )
+
+        self.lock = threading.Lock()
+        self.signed = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self.last_batch_seconds = 0.0
+        self.max_batch_seconds = 0.0
+        self.started = time.time()
+
+    def warm_up(self):
+        """Start all worker processes now (e.g. before other threads are running)"""
+        list(self.pool.map(_sign_chunk, [[]] * self.workers))
+
+    def sign_batch(self, items):
+        """
+        Sign a batch of transactions.
+        Args:
+            items: List of (wallet_id, transaction) with autofilled transaction
+                models or their XRPL JSON dictionaries
+        Returns:
+            List of (tx_blob, tx_hash), in the same order as items
+        """
+        jobs = []
+        for wallet_id, tx in items:
+            if wallet_id not in self.wallet_ids:
+                raise ValueError(f"No signing key for wallet: {wallet_id}")
+            jobs.append((wallet_id, tx if isinstance(tx, dict) else tx.to_xrpl()))
+
+        start = time.perf_counter()
+        chunks = [jobs[i:i + self.chunk_size] for i in range(0, len(jobs), self.chunk_size)]
+        results = [signed for chunk in self.pool.map(_sign_chunk, chunks) for signed in chunk]
+        elapsed = time.perf_counter() - start
+
+        with self.lock:
+            self.signed += len(results)
+            self.batches += 1
+            self.busy_seconds += elapsed
+            self.last_batch_seconds = elapsed
+            self.max_batch_seconds = max(self.max_batch_seconds, elapsed)
+        return results
+
+    def get_metrics(self):
+        """Throughput and latency of the signing service"""
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "signed": self.signed,
+                "batches": self.batches,
+                "signatures_per_second": self.signed / self.busy_seconds if self.busy_seconds else 0.0,
+                "average_batch_seconds": self.busy_seconds / self.batches if self.batches else 0.0,
+                "last_batch_seconds": self.last_batch_seconds,
+                "max_batch_seconds": self.max_batch_seconds,
+                "uptime_seconds": time.time() - self.started
+            }
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+def benchmark_signing(count=2000, max_workers=None):
+    """Print signatures/second inline and with 1..N worker processes"""
+    from xrpl.models.transactions import Payment
+    from xrpl.constants import CryptoAlgorithm
+
+    wallets = {
+        "ed25519": Wallet.create(CryptoAlgorithm.ED25519),
+        "secp256k1": Wallet.create(CryptoAlgorithm.SECP256K1)
+    }
+    destination = Wallet.create().classic_address
+    for algorithm, wallet in wallets.items():
+        items = [(algorithm, Payment(
+            account=wallet.classic_address,
+            amount=str(1_000_000 + i),
+            destination=destination,
+            sequence=i + 1,
+            fee="12",
+            last_ledger_sequence=1_000_000
+        ).to_xrpl()) for i in range(count)]
+
+        start = time.perf_counter()
+        for _, tx_json in items:
+            sign_json(tx_json, wallet)
+        print(f"{algorithm:>10} inline:      {count / (time.perf_counter() - start):8.0f} signatures/s")
+
+        workers = 1
+        while workers <= (max_workers or os.cpu_count() or 1):
+            service = SigningService(wallets, workers)
+            service.warm_up()
+            start = time.perf_counter()
+            service.sign_batch(items)
+            print(f"{algorithm:>10} {workers:>2} workers:  {count / (time.perf_counter() - start):8.0f} signatures/s")
+            service.shutdown()
+            workers *= 2
+
+
+if __name__ == "__main__":
+    benchmark_signing()
@@ -0,0 +1,98 @@
+from struct import Struct
+import hashlib
+import json
+import mmap
+import os
+
+# Bump when the layout of the header or of any section changes
+SNAPSHOT_VERSION = 2
+
+MAGIC = b'TXSNAP\x00\x00'
+
+# Magic, version, SHA-256 of everything after the prefix, header length
+_PREFIX = Struct('<8sH32sI')
+
+
+def write_snapshot(path, meta, sections):
+    """
+    Write a snapshot file atomically (temporary file, fsync, rename).
+    Args:
+        path: Snapshot file path
+        meta: JSON-serializable metadata
+        sections: Dictionary of section name -> bytes-like (e.g. array('q'))
+    """
+    offsets = {}
+    position = 0
+    for name, data in sections.items():
+        length = memoryview(data).nbytes
+        offsets[name] = [position, length]
+        position += length
+    header = json.dumps({'meta': meta, 'sections': offsets}, separators=(',', ':')).encode()
+
+    digest = hashlib.sha256(header)
+    for data in sections.values():
+        digest.update(data)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, SNAPSHOT_VERSION, digest.digest(), len(header)))
+        f.write(header)
+        for data in sections.values():
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class Snapshot:
+    """
+    Read-only, memory-mapped snapshot file. Sections are zero-copy memoryviews
+    of the mapping. Raises ValueError if the file is not a snapshot, was written
+    by another version, or fails its checksum.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._view = memoryview(self._mmap)
+            if len(self._mmap) < _PREFIX.size:
+                raise ValueError("Truncated snapshot")
+            magic, version, checksum, header_length = _PREFIX.unpack_from(self._mmap)
+            if magic != MAGIC:
+                raise ValueError("Not a snapshot file")
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f"Snapshot version {version}, expected {SNAPSHOT_VERSION}")
+            if hashlib.sha256(self._view[_PREFIX.size:]).digest() != checksum:
+                raise ValueError("Snapshot checksum mismatch")
+
+            body = _PREFIX.size + header_length
+            header = json.loads(bytes(self._view[_PREFIX.size:body]))
+            self.meta = header['meta']
+            self._sections = {name: (body + offset, length)
+                              for name, (offset, length) in header['sections'].items()}
+        except Exception:
+            self.close()
+            raise
+
+    def section(self, name):
+        """Memoryview of a section (empty if the snapshot has no such section)"""
+        if name not in self._sections:
+            return memoryview(b'')
+        start, length = self._sections[name]
+        return self._view[start:start + length]
+
+    def close(self):
+        if getattr(self, '_view', None) is not None:
+            self._view.release()
+            self._view = None
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
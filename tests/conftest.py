@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+from xrpl.wallet import Wallet
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jurisdictions import load_jurisdictions, department_parents  # noqa: E402
+from local_ledger import LocalLedger, LocalLedgerClient, serve  # noqa: E402
+
+# Wallet seeds of a throwaway system, set before app is imported (it builds a
+# tax system at import time, which would otherwise create and fund wallets),
+# funded on a local ledger served as the system's XRPL node
+_node = LocalLedger()
+for env_key in ['TAX_POOL', 'EXIT_POOL', 'GOV_WALLET'] + [
+        f"WALLET_{dept_id.upper()}" for dept_id in department_parents(load_jurisdictions())]:
+    os.environ.setdefault(env_key, Wallet.create().seed)
+    _node.fund(Wallet.from_seed(os.environ[env_key]).classic_address, 1_000_000_000)
+_node.close()
+_server = serve(_node, port=0)
+os.environ['XRPL_URL'] = f"http://127.0.0.1:{_server.server_address[1]}/"
+os.environ['SNAPSHOT_PATH'] = ''
+os.environ.setdefault('PAYER_TAG_KEY', 'test-payer-tag-key')
+
+import app  # noqa: E402
+
+
+@pytest.fixture
+def ledger():
+    """Local ledger with every system wallet funded"""
+    ledger = LocalLedger(start_time=1_700_000_000)
+    for _, wallet in app.tax_system._all_wallets():
+        ledger.fund(wallet.classic_address, 1_000_000_000)
+    ledger.close()
+    return ledger
+
+
+@pytest.fixture
+def tax_system(ledger):
+    """Tax system reading from the local ledger, without a snapshot"""
+    system = app.XRPLTaxSystem()
+    system.client = LocalLedgerClient(ledger)
+    system.snapshot_path = ''
+    return system
+
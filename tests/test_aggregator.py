@@ -0,0 +1,99 @@
+import json
+from urllib.error import URLError
+
+import pytest
+
+import app
+from aggregator import ShardAggregator, parse_shard_urls
+from local_ledger import LocalLedgerClient
+
+T0 = 1_700_000_000
+
+
+class LocalAggregator(ShardAggregator):
+    """Aggregator over in-process shards (jurisdiction -> tax system, None if down)"""
+
+    def __init__(self, shards):
+        super().__init__({name: f"http://{name}.invalid" for name in shards})
+        self.shards = shards
+        self.fetches = 0
+
+    def _fetch(self, jurisdiction, path):
+        assert path == '/api/shard/summary'
+        self.fetches += 1
+        shard = self.shards[jurisdiction]
+        if shard is None:
+            raise URLError("connection refused")
+        # Through JSON like the HTTP response
+        return json.loads(json.dumps({"success": True, "data": shard.get_shard_summary()}))
+
+
+def shard(ledger, jurisdiction):
+    system = app.XRPLTaxSystem(jurisdiction=jurisdiction)
+    system.client = LocalLedgerClient(ledger)
+    system.snapshot_path = ''
+    return system
+
+
+@pytest.fixture
+def payments(ledger):
+    addresses = {wallet_id: wallet.classic_address for wallet_id, wallet in app.tax_system._all_wallets()}
+    for sender, receiver, drops in (("tax_pool", "government", 10_000_000),
+                                    ("government", "dept_transport", 5_000_000),
+                                    ("dept_transport", "penn_dept_transport", 2_000_000),
+                                    ("penn_dept_transport", "pitt_dept_transport", 1_000_000)):
+        ledger.pay(addresses[sender], addresses[receiver], drops, T0 + 10)
+    ledger.close(T0 + 10)
+    return ledger
+
+
+def test_parse_shard_urls():
+    assert parse_shard_urls(" federal=http://a:5001/, penn=http://b:5002") == \
+        {"federal": "http://a:5001", "penn": "http://b:5002"}
+    assert parse_shard_urls(None) == {}
+    with pytest.raises(ValueError, match="name=url"):
+        parse_shard_urls("federal")
+
+
+def test_views_merge_the_shards(payments):
+    aggregator = LocalAggregator({"federal": shard(payments, "federal"), "penn": shard(payments, "penn")})
+
+    balances = aggregator.get_all_balances()
+    assert "tax_pool" not in balances
+    assert balances["government"] == pytest.approx(1000 + 5 - 0.00001)
+    assert balances["penn_dept_transport"] == pytest.approx(1000 + 2 - 1 - 0.00001)
+
+    graph = aggregator.get_transaction_graph(top_k=10)
+    links = {(link["source"], link["target"]): link["value"] for link in graph["links"]}
+    # Cross-shard edges are reported once, by the sender's shard
+    assert links == {("tax_pool", "government"): 10.0, ("government", "dept_transport"): 5.0,
+                     ("dept_transport", "penn_dept_transport"): 2.0,
+                     ("penn_dept_transport", "pitt_dept_transport"): 1.0}
+    nodes = {node["id"]: node for node in graph["nodes"]}
+    assert nodes["penn_dept_transport"]["jurisdiction"] == "penn"
+    assert nodes["penn_dept_transport"]["totalReceived"] == 2.0
+    assert "pitt_dept_transport" not in nodes
+
+    # Payments with the other shard's wallets reconcile as internal
+    status = aggregator.get_status()
+    assert all(shard_status["available"] and shard_status["unreconciled"] == []
+               for shard_status in status.values())
+
+
+def test_unavailable_shard_is_reported_and_summaries_are_cached(payments):
+    aggregator = LocalAggregator({"federal": shard(payments, "federal"), "penn": None})
+
+    status = aggregator.get_status()
+    assert status["federal"]["available"] is True
+    assert status["penn"]["available"] is False
+    assert "connection refused" in status["penn"]["error"]
+    assert "penn_dept_transport" not in aggregator.get_all_balances()
+    # Both views were answered from the summaries fetched for the status
+    assert aggregator.fetches == 2
+
+
+def test_edge_drill_down_goes_to_the_owning_shard():
+    aggregator = ShardAggregator({"federal": "http://a", "penn": "http://b"})
+    assert aggregator.shard_url_for("government") == "http://a"
+    assert aggregator.shard_url_for("penn_dept_labor") == "http://b"
+    assert aggregator.shard_url_for("pitt_dept_labor") is None
@@ -0,0 +1,102 @@
+from xrpl.models.requests import Tx
+
+import app
+from local_ledger import LocalLedgerClient, BASE_FEE, RESERVE_BASE
+
+
+class ClosingClient(LocalLedgerClient):
+    """Local ledger client that closes the open ledger before every Tx lookup"""
+
+    async def _request_impl(self, request, *, timeout=None):
+        if isinstance(request, Tx):
+            self.ledger.close()
+        return await super()._request_impl(request, timeout=timeout)
+
+
+class LostConfirmationClient(LocalLedgerClient):
+    """Local ledger client whose Tx lookups fail: submissions apply, their outcome stays unknown"""
+
+    async def _request_impl(self, request, *, timeout=None):
+        if isinstance(request, Tx):
+            raise ConnectionError("Connection reset by peer")
+        return await super()._request_impl(request, timeout=timeout)
+
+
+def balance(system, ledger, wallet_id):
+    return ledger.accounts[system._get_wallet(wallet_id).classic_address][0]
+
+
+def test_allocation_funds_later_rounds_first(tax_system, ledger):
+    tax_system.client = ClosingClient(ledger)
+    # dept_transport only holds 1000 XRP: its 1500 XRP go out after the government's transfer validated
+    plan = {"sender": "GOV_WALLET", "allocations": [
+        {"receiver": "dept_transport", "amount": 600, "allocations": [
+            {"receiver": "penn_dept_transport", "amount": 1500}]}]}
+
+    result = tax_system.allocate_budget(plan)
+
+    assert result["success"], result
+    assert result["completed"] == ["GOV_WALLET/dept_transport", "GOV_WALLET/dept_transport/penn_dept_transport"]
+    assert balance(tax_system, ledger, "penn_dept_transport") == 2_500_000_000
+    assert balance(tax_system, ledger, "dept_transport") == 100_000_000 - BASE_FEE
+
+
+def test_allocation_resume_skips_completed_transfers(tax_system, ledger):
+    tax_system.client = ClosingClient(ledger)
+    plan = {"sender": "GOV_WALLET", "allocations": [
+        {"receiver": "dept_transport", "amount": 10},
+        {"receiver": "dept_labor", "amount": 20}]}
+
+    result = tax_system.allocate_budget(plan, completed=["GOV_WALLET/dept_transport"])
+
+    assert result["success"]
+    assert [t["status"] for t in result["transfers"]] == ["completed", "validated"]
+    assert balance(tax_system, ledger, "dept_transport") == 1_000_000_000
+    assert balance(tax_system, ledger, "dept_labor") == 1_020_000_000
+
+
+def test_allocation_resume_settles_unconfirmed_transfer_once(tax_system, ledger):
+    plan = {"sender": "GOV_WALLET", "allocations": [{"receiver": "dept_transport", "amount": 10}]}
+    tax_system.client = LostConfirmationClient(ledger)
+    first = tax_system.allocate_budget(plan)
+    assert not first["success"]
+    assert [entry["id"] for entry in first["unconfirmed"]] == ["GOV_WALLET/dept_transport"]
+
+    tax_system.client = ClosingClient(ledger)
+    resumed = tax_system.allocate_budget(plan, first["completed"], first["unconfirmed"])
+
+    assert resumed["success"], resumed
+    assert resumed["transfers"][0]["status"] == "completed"
+    # Paid once: the resumed run looked the first submission up instead of signing again
+    assert balance(tax_system, ledger, "dept_transport") == 1_010_000_000
+
+
+def test_allocation_keeps_reserve_and_fees(tax_system, ledger):
+    tax_system.client = ClosingClient(ledger)
+    everything = balance(tax_system, ledger, "government")
+    plan = {"sender": "GOV_WALLET", "allocations": [
+        {"receiver": "dept_transport", "amount": everything / 2_000_000},
+        {"receiver": "dept_labor", "amount": everything / 2_000_000}]}
+
+    result = tax_system.allocate_budget(plan)
+
+    assert not result["success"]
+    assert "Insufficient balance" in result["error"]
+    assert balance(tax_system, ledger, "government") == everything
+
+    spendable = (everything - RESERVE_BASE - 2 * BASE_FEE) // 2
+    plan["allocations"] = [{"receiver": receiver, "amount": spendable / 1_000_000}
+                           for receiver in ("dept_transport", "dept_labor")]
+    assert tax_system.allocate_budget(plan)["success"]
+
+
+def test_allocate_route_rejects_malformed_body(tax_system, monkeypatch):
+    monkeypatch.setattr(app, "tax_system", tax_system)
+    with app.app.test_client() as client:
+        response = client.post("/api/allocate", data="not json", content_type="application/json")
+        assert response.status_code == 400
+        assert response.get_json() == {"success": False, "error": "Request body must be a JSON object"}
+
+        response = client.post("/api/allocate", json={"plan": {"allocations": []}})
+        assert response.status_code == 200
+        assert response.get_json()["success"] is False
@@ -0,0 +1,54 @@
+from decimal import Decimal
+import random
+
+import pytest
+
+from amounts import to_drops, drops_to_xrp, MAX_DROPS
+
+
+@pytest.mark.parametrize("amount, drops", [
+    ("1", 1_000_000),
+    ("0.000001", 1),
+    (0.1, 100_000),
+    (0.3, 300_000),
+    (1.1, 1_100_000),
+    (Decimal("123.456789"), 123_456_789),
+    (25, 25_000_000),
+    ("-2.5", -2_500_000),
+    ("100000000000", MAX_DROPS),
+])
+def test_to_drops_is_exact(amount, drops):
+    assert to_drops(amount) == drops
+
+
+@pytest.mark.parametrize("amount", [
+    "0.0000001",            # below one drop
+    1.0000005,
+    "100000000000.000001",  # above the XRP supply
+    "-100000000001",
+    "nan",
+    "inf",
+    "abc",
+    None,
+])
+def test_to_drops_rejects_invalid_amounts(amount):
+    with pytest.raises(ValueError):
+        to_drops(amount)
+
+
+def test_drops_to_xrp_round_trips():
+    rng = random.Random(40)
+    values = [0, 1, 999_999, 1_000_000, 10 ** 15 - 1] + [rng.randrange(10 ** 15) for _ in range(10_000)]
+    for drops in values:
+        xrp = drops_to_xrp(drops)
+        assert isinstance(xrp, float)
+        # The shortest representation of the float is the exact decimal value
+        assert Decimal(repr(xrp)) == Decimal(drops) / 1_000_000
+        assert to_drops(xrp) == drops
+
+
+def test_drops_to_xrp_type_does_not_depend_on_value():
+    assert drops_to_xrp(None) is None
+    assert isinstance(drops_to_xrp(MAX_DROPS), float)
+    assert abs(drops_to_xrp(MAX_DROPS - 1) * 1_000_000 - (MAX_DROPS - 1)) <= 16
+
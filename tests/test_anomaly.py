@@ -0,0 +1,96 @@
+import itertools
+
+from anomaly import AnomalyDetector, MIN_SAMPLES
+from records import TxRecord
+
+T0 = 1_700_000_000
+HOUR = 3600
+DAY = 86400
+
+_hashes = itertools.count()
+
+
+def ingest(detector, sender, receiver, xrp, timestamp):
+    detector.ingest(TxRecord(f"{next(_hashes):064X}", sender, receiver, int(xrp * 1_000_000), timestamp, 1))
+
+
+def kinds(detector):
+    return [event["kind"] for event in reversed(detector.events)]
+
+
+def test_amount_far_above_the_usual_is_flagged():
+    detector = AnomalyDetector(log=None)
+    for i in range(50):
+        ingest(detector, "government", "dept", 8 if i % 2 else 12, T0 + i * DAY)
+    assert kinds(detector) == []
+
+    # Within the usual spread, then far above it
+    ingest(detector, "government", "dept", 14, T0 + 50 * DAY)
+    assert kinds(detector) == []
+    ingest(detector, "government", "dept", 1000, T0 + 51 * DAY)
+    [event] = detector.get_events()
+    assert event["kind"] == "amount"
+    assert event["amount_xrp"] == 1000
+    assert event["score"] > detector.threshold
+    assert 8 < event["usual"] < 12
+
+
+def test_threshold_sets_the_sensitivity():
+    strict = AnomalyDetector(threshold=1.0, log=None)
+    for i in range(50):
+        ingest(strict, "government", "dept", 8 if i % 2 else 12, T0 + i * DAY)
+    ingest(strict, "government", "dept", 14, T0 + 50 * DAY)
+    assert kinds(strict) == ["amount"]
+
+
+def test_edges_are_not_checked_before_min_samples():
+    detector = AnomalyDetector(log=None)
+    for i in range(MIN_SAMPLES - 1):
+        ingest(detector, "government", "dept", 10, T0 + i * DAY)
+    ingest(detector, "government", "dept", 10_000, T0 + MIN_SAMPLES * DAY)
+    assert detector.get_stats() == {"checked": MIN_SAMPLES, "flagged": 0, "edges": 1}
+
+
+def test_burst_of_payments_is_flagged_once_per_bucket():
+    detector = AnomalyDetector(log=None)
+    for hour in range(30):
+        ingest(detector, "government", "dept", 10, T0 + hour * HOUR)
+    for i in range(20):
+        ingest(detector, "government", "dept", 10, T0 + 30 * HOUR + i)
+    for i in range(20):
+        ingest(detector, "government", "dept", 10, T0 + 31 * HOUR + i)
+
+    events = detector.get_events(kind="rate")
+    assert len(events) == 2
+    # Flagged at the first payment above the limit: RATE_MIN_COUNT (5) at first,
+    # then 5 times the average, which the first burst raised to about 1.75
+    assert [event["timestamp"] for event in events] == [T0 + 31 * HOUR + 8, T0 + 30 * HOUR + 5]
+
+
+def test_fast_exit_after_receiving_funds_is_flagged():
+    detector = AnomalyDetector(log=None)
+    for i in range(20):
+        ingest(detector, "government", "dept", 10, T0 + 2 * i * DAY)
+        ingest(detector, "dept", "exit_pool", 10, T0 + 2 * i * DAY + DAY)
+    assert kinds(detector) == []
+
+    ingest(detector, "government", "dept", 10, T0 + 40 * DAY)
+    ingest(detector, "dept", "exit_pool", 10, T0 + 40 * DAY + 60)
+    [event] = detector.get_events()
+    assert (event["kind"], event["sender"], event["receiver"]) == ("fast_exit", "dept", "exit_pool")
+    assert event["score"] < -detector.threshold
+
+
+def test_state_round_trip_keeps_the_statistics():
+    detector = AnomalyDetector(log=None)
+    for i in range(30):
+        ingest(detector, "government", "dept", 10, T0 + i * DAY)
+    ingest(detector, "government", "dept", 1000, T0 + 30 * DAY)
+
+    restored = AnomalyDetector(log=None)
+    restored.load_state(detector.get_state())
+    ingest(detector, "government", "dept", 5000, T0 + 31 * DAY)
+    ingest(restored, "government", "dept", 5000, T0 + 31 * DAY)
+
+    assert restored.get_stats() == detector.get_stats()
+    assert [e["score"] for e in restored.get_events()] == [e["score"] for e in detector.get_events()]
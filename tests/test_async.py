@@ -0,0 +1,172 @@
+import asyncio
+import threading
+
+import pytest
+
+import asgi
+from async_client import EventLoopThread, PooledSyncJsonRpcClient, request_async
+from local_ledger import LocalLedgerClient, serve
+from signing_service import sign_json
+from tx_index import payer_tag
+from xrpl.models.requests import AccountInfo
+
+
+class ThreadRecordingClient(LocalLedgerClient):
+    """Local ledger client that records the threads its blocking request() ran on"""
+
+    def __init__(self, ledger):
+        super().__init__(ledger)
+        self.threads = []
+
+    def request(self, request):
+        self.threads.append(threading.current_thread())
+        return super().request(request)
+
+
+class RecordingSigner:
+    """Stand-in for the signing pool, signing inline and recording the batches"""
+
+    def __init__(self, wallets):
+        self.wallets = wallets
+        self.batches = []
+
+    def sign_batch(self, items):
+        self.batches.append([wallet_id for wallet_id, _ in items])
+        return [sign_json(tx.to_xrpl(), self.wallets[wallet_id]) for wallet_id, tx in items]
+
+
+class Recorder:
+    """ASGI app recording the paths it was called for"""
+
+    def __init__(self, url_map=None):
+        self.url_map = url_map
+        self.paths = []
+
+    async def __call__(self, scope, receive, send):
+        self.paths.append(scope.get("path", scope["type"]))
+
+
+def test_sync_wrappers_work_inside_a_running_loop(tax_system, ledger):
+    async def handler():
+        # A sync route called from async code: asyncio.run() would refuse to start here
+        return tax_system.get_wallet_balance(tax_system.gov_wallet), tax_system.get_all_balances()
+
+    balance, balances = asyncio.run(handler())
+
+    assert balance == 1000.0
+    assert balances["government"] == 1000.0
+    assert set(balances) == {wallet_id for wallet_id, _ in tax_system._all_wallets()} - {"tax_pool", "exit_pool"}
+
+
+def test_payment_is_signed_off_the_event_loop(tax_system, ledger, monkeypatch):
+    sign_threads = []
+    sign_payments = tax_system._sign_payments
+
+    def record_thread(wallet, payments):
+        sign_threads.append(threading.current_thread())
+        return sign_payments(wallet, payments)
+
+    monkeypatch.setattr(tax_system, "_sign_payments", record_thread)
+    loop_threads = []
+
+    async def pay():
+        loop_threads.append(threading.current_thread())
+        return await tax_system.process_tax_payment_async("2.5", "payer-1", LocalLedgerClient(ledger))
+
+    result = asyncio.run(pay())
+
+    assert result["success"], result
+    assert sign_threads and sign_threads[0] is not loop_threads[0]
+    ledger.close()
+    entry = ledger.by_hash[result["tx_hash"]]
+    assert entry["meta"]["TransactionResult"] == "tesSUCCESS"
+    assert entry["tx_json"]["SourceTag"] == payer_tag("payer-1")
+    assert entry["tx_json"]["DeliverMax"] == "2500000"
+
+
+def test_transfer_signs_through_the_signing_service(tax_system, ledger):
+    tax_system.signer = RecordingSigner(dict(tax_system._all_wallets()))
+
+    result = tax_system.distribute_funds("government", "dept_labor", 3)
+
+    assert result["success"], result
+    assert tax_system.signer.batches == [["government"]]
+    ledger.close()
+    assert ledger.by_hash[result["tx_hash"]]["meta"]["delivered_amount"] == "3000000"
+
+
+def test_request_async_runs_sync_clients_on_a_worker_thread(ledger):
+    client = ThreadRecordingClient(ledger)
+    address = next(iter(ledger.accounts))
+
+    async def main():
+        return threading.current_thread(), await request_async(client, AccountInfo(account=address))
+
+    loop_thread, response = asyncio.run(main())
+
+    assert response.is_successful()
+    assert client.threads and client.threads[0] is not loop_thread
+
+
+def test_pooled_client_serves_sync_wrappers_from_its_loop_thread(tax_system, ledger):
+    server = serve(ledger, port=0)
+    try:
+        tax_system.client = PooledSyncJsonRpcClient(f"http://127.0.0.1:{server.server_address[1]}/")
+
+        balances = asyncio.run(asyncio.to_thread(tax_system.get_all_balances))
+        assert balances["government"] == 1000.0
+
+        # Concurrent blocking requests from many threads share the loop thread
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(tax_system.get_wallet_balance(tax_system.gov_wallet)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == [1000.0] * 8
+        assert tax_system.client.loop_thread.loop.is_running()
+    finally:
+        server.shutdown()
+
+
+def test_event_loop_thread_refuses_to_wait_on_itself():
+    loop_thread = EventLoopThread("test-loop")
+
+    async def nested():
+        return loop_thread.run(asyncio.sleep(0, result=1))
+
+    with pytest.raises(RuntimeError, match="own loop thread"):
+        loop_thread.run(nested())
+    assert loop_thread.run(asyncio.sleep(0, result=2)) == 2
+
+
+@pytest.mark.parametrize("scope, routed", [
+    ({"type": "http", "path": "/api/balances", "method": "GET"}, "async"),
+    ({"type": "http", "path": "/api/pay-tax", "method": "POST"}, "async"),
+    ({"type": "http", "path": "/api/transactions/dept_labor", "method": "GET"}, "async"),
+    ({"type": "http", "path": "/api/pay-tax", "method": "GET"}, "wsgi"),
+    ({"type": "http", "path": "/api/transaction-graph", "method": "GET"}, "wsgi"),
+    ({"type": "http", "path": "/api/allocate", "method": "POST"}, "wsgi"),
+    ({"type": "websocket", "path": "/api/balances"}, "wsgi"),
+    ({"type": "lifespan"}, "async"),
+])
+def test_dispatcher_routes_by_async_app_routes(scope, routed):
+    async_app, wsgi_app = Recorder(asgi.async_app.url_map), Recorder()
+    dispatcher = asgi.AsyncDispatcher(async_app, wsgi_app)
+
+    asyncio.run(dispatcher(scope, None, None))
+
+    assert (async_app.paths, wsgi_app.paths) == (
+        ([scope.get("path", "lifespan")], []) if routed == "async" else ([], [scope["path"]]))
+
+
+def test_dispatcher_without_async_views_sends_requests_to_wsgi():
+    async_app, wsgi_app = Recorder(asgi.async_app.url_map), Recorder()
+    dispatcher = asgi.AsyncDispatcher(async_app, wsgi_app, async_views=False)
+
+    asyncio.run(dispatcher({"type": "http", "path": "/api/balances", "method": "GET"}, None, None))
+    asyncio.run(dispatcher({"type": "lifespan"}, None, None))
+
+    assert wsgi_app.paths == ["/api/balances"]
+    assert async_app.paths == ["lifespan"]
@@ -0,0 +1,75 @@
+from xrpl.wallet import Wallet
+
+from balance_history import BalanceHistoryIndex, CHECKPOINT_INTERVAL
+from local_ledger import LocalLedger
+
+T0 = 1_700_000_000
+
+
+def build_history(ledgers=3 * CHECKPOINT_INTERVAL):
+    """
+    Payments back and forth between two funded accounts, one ledger each, and a
+    new account created halfway. Returns the ledger, the addresses and the true
+    balances after every ledger: {ledger_index: {address: drops}}.
+    """
+    ledger = LocalLedger(start_time=T0)
+    a, b, c = (Wallet.create().classic_address for _ in range(3))
+    ledger.fund(a, 500_000_000, T0)
+    ledger.fund(b, 500_000_000, T0)
+    truth = {ledger.close(T0): {a: 500_000_000, b: 500_000_000, c: 0}}
+    for i in range(ledgers):
+        sender, receiver = (a, b) if i % 3 else (b, a)
+        ledger.pay(sender, receiver, 1_000 + i, T0 + 10 * (i + 1))
+        if i == ledgers // 2:
+            ledger.pay(a, c, 20_000_000, T0 + 10 * (i + 1))
+        index = ledger.close(T0 + 10 * (i + 1))
+        truth[index] = {address: ledger.accounts.get(address, [0])[0] for address in (a, b, c)}
+    return ledger, (a, b, c), truth
+
+
+def index_of(ledger, addresses):
+    index = BalanceHistoryIndex(addresses)
+    for entry in ledger.entries:
+        index.ingest(entry)
+    return index
+
+
+def test_balance_at_every_ledger_matches_the_ledger():
+    ledger, addresses, truth = build_history()
+    index = index_of(ledger, addresses)
+
+    for ledger_index, balances in truth.items():
+        for address in addresses:
+            # 0 before the account was created
+            assert index.balance_at(address, ledger_index=ledger_index) == balances[address], (ledger_index, address)
+    assert index.balance_at(addresses[0]) == ledger.accounts[addresses[0]][0]
+
+
+def test_balance_at_timestamp_is_inclusive():
+    ledger, (a, _, _), truth = build_history(ledgers=10)
+    index = index_of(ledger, [a])
+    indexes = sorted(truth)
+
+    # Ledger n + 1 holds the payment made at T0 + 10 * n
+    assert index.balance_at(a, timestamp=T0 + 30) == truth[indexes[3]][a]
+    assert index.balance_at(a, timestamp=T0 + 39) == truth[indexes[3]][a]
+    assert index.balance_at(a, timestamp=T0 - 1) == 0
+
+
+def test_unknown_account_has_no_history():
+    ledger, (a, _, _), _ = build_history(ledgers=2)
+    index = index_of(ledger, [a])
+    assert index.balance_at(Wallet.create().classic_address) is None
+
+
+def test_columns_round_trip():
+    ledger, addresses, truth = build_history()
+    index = index_of(ledger, addresses)
+
+    restored = BalanceHistoryIndex(addresses)
+    restored.load_columns(*index.export_columns())
+
+    for ledger_index in truth:
+        for address in addresses:
+            assert restored.balance_at(address, ledger_index=ledger_index) == \
+                index.balance_at(address, ledger_index=ledger_index)
@@ -0,0 +1,114 @@
+import csv
+import io
+
+import pytest
+from xrpl.wallet import Wallet
+
+from export import LedgerReader, iter_csv, write_parquet, EXPORT_COLUMNS
+from local_ledger import LocalLedger, LocalLedgerClient
+
+T0 = 1_704_067_200  # 2024-01-01 00:00 UTC
+DAY = 86400
+
+
+class RecordingClient(LocalLedgerClient):
+    """Local ledger client that keeps the parameters of every AccountTx request"""
+
+    def __init__(self, ledger):
+        super().__init__(ledger)
+        self.account_tx = []
+
+    async def _request_impl(self, request, *, timeout=None):
+        if request.method == "account_tx":
+            self.account_tx.append(request.to_dict())
+        return await super()._request_impl(request, timeout=timeout)
+
+
+def build_reader(days=90):
+    """Reader over daily payments a -> b and b -> c, one ledger per day"""
+    ledger = LocalLedger(start_time=T0 - DAY)
+    addresses = {name: Wallet.create().classic_address for name in "abc"}
+    for address in addresses.values():
+        ledger.fund(address, 1_000_000_000, T0 - DAY)
+    ledger.close(T0 - DAY)
+    for day in range(days):
+        ledger.pay(addresses["a"], addresses["b"], 1_000 + day, T0 + day * DAY)
+        ledger.pay(addresses["b"], addresses["c"], 500 + day, T0 + day * DAY)
+        ledger.close(T0 + day * DAY)
+    client = RecordingClient(ledger)
+    return LedgerReader(client, {address: name for name, address in addresses.items()}), client
+
+
+def test_start_bound_skips_earlier_ledgers():
+    reader, client = build_reader()
+    start, end = T0 + 60 * DAY, T0 + 70 * DAY
+
+    records = list(reader.iter_transactions(start=start, end=end))
+
+    # Oldest first for each wallet, a's history and then b's
+    assert [(r.sender, r.receiver, r.timestamp) for r in records] == \
+        [(sender, receiver, T0 + day * DAY) for sender, receiver in (("a", "b"), ("b", "c")) for day in range(60, 70)]
+    # Paging starts at the ledger of the start time, not at the start of history
+    first_ledger = reader.first_ledger_at(start)
+    assert all(params["ledger_index_min"] == first_ledger for params in client.account_tx)
+    assert first_ledger > 60
+
+
+def test_first_ledger_at_finds_first_ledger_closed_at_or_after():
+    reader, _ = build_reader(days=10)
+    ledger = reader.client.ledger
+
+    for timestamp in (T0 - 2 * DAY, T0, T0 + 1, T0 + 5 * DAY, T0 + 5 * DAY - 1):
+        index = reader.first_ledger_at(timestamp)
+        close_time = timestamp - 946684800
+        assert ledger.close_times[index] >= close_time
+        assert index == 1 or ledger.close_times[index - 1] < close_time
+
+
+def test_each_payment_is_exported_once():
+    reader, _ = build_reader(days=5)
+
+    both = list(reader.iter_transactions(["a", "b"]))
+    only_b = list(reader.iter_transactions(["b"]))
+
+    assert len(both) == 10
+    # b's history holds the payments it received from a wallet outside the export
+    assert len(only_b) == 10
+    with pytest.raises(ValueError, match="Invalid wallet ID"):
+        next(reader.iter_transactions(["x"]))
+
+
+def test_csv_is_streamed_in_chunks():
+    reader, _ = build_reader(days=30)
+    records = list(reader.iter_transactions())
+
+    chunks = list(iter_csv(iter(records), chunk_rows=7))
+
+    assert len(chunks) == len(records) // 7 + 1
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert list(rows[0]) == EXPORT_COLUMNS
+    assert [row["tx_hash"] for row in rows] == [r.tx_hash for r in records]
+    assert sum(int(row["amount_drops"]) for row in rows) == sum(r.amount_drops for r in records)
+
+
+def test_parquet_is_partitioned_by_month_and_sender(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    reader, _ = build_reader(days=70)
+
+    count = write_parquet(reader.iter_transactions(["a"]), str(tmp_path), batch_rows=25)
+
+    assert count == 70
+    parts = sorted(path.relative_to(tmp_path).as_posix() for path in tmp_path.rglob("*.parquet"))
+    # 31 + 29 + 10 days; January is written in two parts once 25 rows are buffered
+    assert parts == [
+        "month=2024-01/wallet=a/part-00000.parquet",
+        "month=2024-01/wallet=a/part-00001.parquet",
+        "month=2024-02/wallet=a/part-00000.parquet",
+        "month=2024-02/wallet=a/part-00001.parquet",
+        "month=2024-03/wallet=a/part-00000.parquet",
+    ]
+    rows = {part: pq.read_table(tmp_path / part).num_rows for part in parts}
+    assert list(rows.values()) == [25, 6, 25, 4, 10]
+    table = pq.read_table(tmp_path / parts[2])
+    assert set(table.column("receiver").to_pylist()) == {"b"}
+    assert table.column("amount_drops").to_pylist()[0] == 1_000 + 31
@@ -0,0 +1,103 @@
+import itertools
+
+import app
+from graph_layout import FlowGraph, build_lod_graph, split_edges, hierarchy_levels, layout_positions, OTHER_PREFIX
+from records import TxRecord
+
+T0 = 1_700_000_000
+
+_hashes = itertools.count()
+
+
+def flow_graph(*payments):
+    graph = FlowGraph()
+    for sender, receiver, drops, timestamp in payments:
+        graph.ingest(TxRecord(f"{next(_hashes):064X}", sender, receiver, drops, timestamp, 1))
+    return graph
+
+
+def test_edges_aggregate_payments():
+    graph = flow_graph(("a", "b", 100, T0), ("a", "b", 50, T0 + 5), ("b", "c", 30, T0 + 1))
+
+    assert graph.edges[("a", "b")] == {"value": 150, "count": 2, "last_timestamp": T0 + 5}
+    assert graph.total_sent == {"a": 150, "b": 30}
+    assert graph.total_received == {"b": 150, "c": 30}
+
+
+def test_edge_transactions_are_paged_newest_first():
+    graph = flow_graph(*(("a", "b", 100 + i, T0 + i) for i in range(5)))
+
+    page, total = graph.edge_transactions("a", "b", offset=1, limit=2)
+
+    assert total == 5
+    assert [tx.amount_drops for tx in page] == [103, 102]
+    assert graph.edge_transactions("a", "b", offset=5)[0] == []
+    assert graph.edge_transactions("a", "x") == ([], 0)
+
+
+def test_split_edges_keeps_top_k_above_min_value():
+    outgoing = [(target, {"value": value}) for target, value in
+                (("b", 5_000_000), ("c", 1_000_000), ("d", 3_000_000), ("e", 500_000))]
+
+    kept, collapsed = split_edges(outgoing, top_k=2, min_value=0.0)
+    assert [t for t, _ in kept] == ["b", "d"]
+    assert [t for t, _ in collapsed] == ["c", "e"]
+
+    # Links under min_value XRP are collapsed even if top_k has room
+    kept, collapsed = split_edges(outgoing, top_k=10, min_value=2.0)
+    assert [t for t, _ in kept] == ["b", "d"]
+    assert [t for t, _ in collapsed] == ["c", "e"]
+
+
+def test_lod_graph_collapses_small_flows_into_other_bucket():
+    graph = flow_graph(*(("a", f"t{i}", (i + 1) * 1_000_000, T0 + i) for i in range(6)))
+    nodes = [{"id": "a", "level": 0, "x": 0.0, "y": 0.5}]
+
+    lod = build_lod_graph(nodes, graph, top_k=2)
+
+    links = {link["target"]: link for link in lod["links"]}
+    assert set(links) == {"t5", "t4", f"{OTHER_PREFIX}a"}
+    assert links["t5"]["value"] == 6.0
+    bucket = links[f"{OTHER_PREFIX}a"]
+    assert bucket["collapsed"] == 4
+    assert bucket["value"] == 1.0 + 2.0 + 3.0 + 4.0
+    assert bucket["count"] == 4
+    assert [node["id"] for node in lod["nodes"]] == ["a", f"{OTHER_PREFIX}a"]
+    assert lod["nodes"][1]["bucket"] is True
+    # The caller's nodes are not modified
+    assert nodes == [{"id": "a", "level": 0, "x": 0.0, "y": 0.5}]
+
+
+def test_levels_and_positions_follow_the_hierarchy():
+    parents = {"dept": "government", "sub": "dept", "other": "government"}
+
+    levels = hierarchy_levels(parents, ["tax_pool", "government"], ["exit_pool"])
+    assert levels == {"tax_pool": 0, "government": 1, "dept": 2, "other": 2, "sub": 3, "exit_pool": 4}
+
+    positions = layout_positions(levels, parents)
+    assert positions["tax_pool"] == (0.0, 0.5)
+    assert positions["exit_pool"][0] == 1.0
+    assert positions["dept"][1] < positions["other"][1]
+
+
+def test_graph_edge_drill_down(tax_system, ledger, monkeypatch):
+    addresses = {wallet_id: wallet.classic_address for wallet_id, wallet in tax_system._all_wallets()}
+    ledger.pay(addresses["tax_pool"], addresses["government"], 9_000_000, T0 + 10)
+    for i, dept_id in enumerate(["dept_transport", "dept_labor", "dept_education"]):
+        ledger.pay(addresses["government"], addresses[dept_id], (i + 1) * 1_000_000, T0 + 20)
+    ledger.close(T0 + 20)
+    monkeypatch.setattr(app, "tax_system", tax_system)
+    client = app.app.test_client()
+
+    graph = client.get("/api/transaction-graph?top_k=1").get_json()["data"]
+    targets = {link["target"] for link in graph["links"] if link["source"] == "government"}
+    assert targets == {"dept_education", f"{OTHER_PREFIX}government"}
+
+    bucket = client.get(f"/api/transaction-graph/edge?source=government&target={OTHER_PREFIX}government&top_k=1")
+    data = bucket.get_json()["data"]
+    assert data["total"] == 2
+    assert [link["target"] for link in data["links"]] == ["dept_labor", "dept_transport"]
+
+    edge = client.get("/api/transaction-graph/edge?source=tax_pool&target=government").get_json()["data"]
+    assert edge["total"] == 1
+    assert edge["transactions"][0]["amount_drops"] == 9_000_000
@@ -0,0 +1,85 @@
+from hierarchy import HierarchyViews
+from records import TxRecord
+
+
+def record(sender, receiver, ledger_index):
+    tx_hash = f"{abs(hash((sender, receiver, ledger_index))):064X}"[-64:]
+    return TxRecord(tx_hash, sender, receiver, 1_000_000, 1_700_000_000 + ledger_index, ledger_index)
+
+
+def make_views(records):
+    """Views over a list of records, whose graph holds the links up to the requested ledger"""
+    def build_graph(ledger_index):
+        wallets = sorted({r.sender for r in records} | {r.receiver for r in records})
+        return {
+            "nodes": [{"id": wallet} for wallet in wallets],
+            "links": [{"source": r.sender, "target": r.receiver} for r in records if r.ledger_index <= ledger_index],
+            "transactions": {}
+        }
+    return HierarchyViews(build_graph)
+
+
+def ingest(views, records, new_records):
+    for tx in new_records:
+        records.append(tx)
+        views.ingest(tx)
+    views.advance(max(tx.ledger_index for tx in records))
+
+
+def levels(view):
+    return {node["id"]: node["level"] for node in view["nodes"] if node["level"] or node["id"] == "government"}
+
+
+def test_new_link_out_of_reachable_wallet_invalidates_view():
+    records = []
+    views = make_views(records)
+    ingest(views, records, [record("government", "a", 3), record("a", "b", 4), record("x", "y", 4)])
+    assert levels(views.view("government")) == {"government": 0, "a": 1, "b": 2}
+
+    # A link out of a wallet the view does not reach keeps the memoized levels
+    ingest(views, records, [record("y", "z", 5)])
+    assert levels(views.view("government")) == {"government": 0, "a": 1, "b": 2}
+    assert views.get_stats()["level_hits"] == 1
+
+    # A link out of a reached wallet recomputes them
+    ingest(views, records, [record("b", "x", 6)])
+    assert levels(views.view("government")) == {"government": 0, "a": 1, "b": 2, "x": 3, "y": 4, "z": 5}
+    assert views.get_stats()["level_misses"] == 2
+
+
+def test_levels_and_graph_use_the_same_ledger():
+    records = []
+    views = make_views(records)
+    ingest(views, records, [record("government", "a", 3)])
+    assert views.view("government")["ledger_index"] == 3
+
+    # Ingested but not yet advanced to: neither the links nor the levels include it
+    tx = record("a", "b", 4)
+    records.append(tx)
+    views.ingest(tx)
+    view = views.view("government")
+    assert view["ledger_index"] == 3
+    assert levels(view) == {"government": 0, "a": 1}
+    assert all(link["target"] != "b" for link in view["links"])
+
+    views.advance(4)
+    assert levels(views.view("government")) == {"government": 0, "a": 1, "b": 2}
+
+
+def test_graph_is_rebuilt_after_non_payment_transactions(tax_system, ledger):
+    government = tax_system.gov_wallet.classic_address
+    department = tax_system._get_wallet("dept_transport").classic_address
+    ledger.pay(government, department, 5_000_000)
+    ledger.close()
+    tax_system.sync_ledger()
+    tax_system.background_sync = True   # Sync explicitly below
+    view = tax_system.hierarchy_views.view("government")
+    balance = view["transactions"]["government"]["balance"]
+
+    # A failed payment only costs the fee: no payment record, but a new balance
+    assert ledger.pay(government, department, 10 ** 15)[0] == "tecUNFUNDED_PAYMENT"
+    ledger.close()
+    tax_system.sync_ledger()
+    view = tax_system.hierarchy_views.view("government")
+    assert view["transactions"]["government"]["balance"] != balance
+    assert round(view["transactions"]["government"]["balance"] * 1_000_000) == ledger.accounts[government][0]
@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+import app
+from profiler import SamplingProfiler, format_collapsed, top_functions
+
+
+def spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profile_samples_only_the_selected_thread():
+    profiler = SamplingProfiler(interval=0.002)
+    stop = threading.Event()
+    worker = threading.Thread(target=spin, args=(stop,), name="Thread-7 (spin)")
+    worker.start()
+    try:
+        result = profiler.profile(0.2, thread_ids={worker.ident})
+    finally:
+        stop.set()
+        worker.join()
+
+    assert result["samples"] > 10
+    assert sum(result["stacks"].values()) == result["samples"]
+    # Numbered thread names are grouped, frames go from outer to inner
+    assert all(stack.startswith("Thread (spin);") for stack in result["stacks"])
+    assert all("spin (test_profiler.py:" in stack for stack in result["stacks"])
+    assert profiler.get_result(result["id"]) is result
+
+
+def test_running_and_kept_profiles_are_bounded():
+    profiler = SamplingProfiler(interval=0.01, max_sessions=2, max_results=2)
+    sessions = [profiler.start(), profiler.start()]
+    with pytest.raises(ValueError, match="Too many profiles"):
+        profiler.start()
+
+    ids = [profiler.stop(session)["id"] for session in sessions]
+    ids.append(profiler.stop(profiler.start())["id"])
+    # The oldest result is dropped
+    assert profiler.get_result(ids[0]) is None
+    assert profiler.get_result(ids[2]) is not None
+
+
+def test_collapsed_output_and_top_functions():
+    result = {"stacks": {"main;a;b": 3, "main;a": 2, "worker;c;b": 1}}
+
+    assert format_collapsed(result) == "main;a;b 3\nmain;a 2\nworker;c;b 1\n"
+    top = {entry["function"]: entry for entry in top_functions(result)}
+    assert top["a"] == {"function": "a", "self": 2, "total": 5}
+    assert top["b"] == {"function": "b", "self": 4, "total": 4}
+    assert top["c"] == {"function": "c", "self": 0, "total": 1}
+    assert [entry["function"] for entry in top_functions(result, limit=1)] == ["a"]
+
+
+def test_request_profile_requires_admin(monkeypatch):
+    monkeypatch.setattr(app, "profiler", SamplingProfiler(interval=0.001))
+    client = app.app.test_client()
+
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert "X-Profile-Id" not in client.get("/api/anomalies", headers={"X-Profile": "1"}).headers
+    assert client.get("/api/admin/profile?seconds=0").status_code == 403
+
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    headers = {"X-Admin-Token": "secret"}
+    response = client.get("/api/anomalies", headers=dict(headers, **{"X-Profile": "1"}))
+    profile_id = response.headers["X-Profile-Id"]
+
+    profile = client.get(f"/api/admin/profile/{profile_id}?format=json", headers=headers).get_json()["data"]
+    assert profile["id"] == int(profile_id)
+    assert profile["samples"] == int(response.headers["X-Profile-Samples"])
+    assert client.get("/api/admin/profile/999", headers=headers).status_code == 404
+
+
+def test_server_profile_is_collapsed_text(monkeypatch):
+    monkeypatch.setattr(app, "profiler", SamplingProfiler(interval=0.002))
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    stop = threading.Event()
+    worker = threading.Thread(target=spin, args=(stop,), daemon=True)
+    worker.start()
+    try:
+        response = app.app.test_client().get("/api/admin/profile?seconds=0.1",
+                                             headers={"Authorization": "Bearer secret"})
+    finally:
+        stop.set()
+        worker.join()
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    lines = response.get_data(as_text=True).splitlines()
+    assert any("spin (test_profiler.py:" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
@@ -0,0 +1,90 @@
+from xrpl.wallet import Wallet
+
+from local_ledger import LocalLedger, BASE_FEE
+from reconciliation import Reconciler
+
+T0 = 1_700_000_000
+
+
+def build_ledger():
+    """Ledger with wallets a and b funded from outside the system, and an external address"""
+    ledger = LocalLedger(start_time=T0)
+    a, b, outside = (Wallet.create().classic_address for _ in range(3))
+    ledger.fund(a, 100_000_000, T0)
+    ledger.fund(b, 100_000_000, T0)
+    ledger.fund(outside, 100_000_000, T0)
+    ledger.close(T0)
+    return ledger, a, b, outside
+
+
+def reconcile(ledger, wallet_names, owned=None, skip=()):
+    reconciler = Reconciler(wallet_names, owned)
+    for position, entry in enumerate(ledger.entries):
+        if position not in skip:
+            reconciler.ingest(entry)
+    return reconciler, reconciler.check()
+
+
+def test_payments_fees_and_external_funds_reconcile():
+    ledger, a, b, outside = build_ledger()
+    ledger.pay(a, b, 30_000_000, T0 + 1)
+    ledger.pay(b, outside, 5_000_000, T0 + 2)
+    ledger.close(T0 + 2)
+
+    reconciler, unreconciled = reconcile(ledger, {a: "a", b: "b"})
+
+    assert unreconciled == []
+    report = {r["wallet_id"]: r for r in reconciler.get_report()["wallets"]}
+    assert report["a"]["derived_balance"] == -30.0
+    assert report["a"]["attribution"]["external_in"] == 100.0
+    assert report["a"]["attribution"]["fees"] == -BASE_FEE / 1_000_000
+    assert report["b"]["derived_balance"] == 30.0
+    assert report["b"]["attribution"]["external_out"] == -5.0
+    assert report["b"]["on_ledger_balance"] == (125_000_000 - BASE_FEE) / 1_000_000
+
+
+def test_missed_transaction_is_unexplained():
+    ledger, a, b, outside = build_ledger()
+    ledger.pay(a, b, 30_000_000, T0 + 1)
+    ledger.pay(outside, a, 7_000_000, T0 + 2)
+    ledger.pay(a, b, 1_000_000, T0 + 3)
+    ledger.close(T0 + 3)
+
+    # The payment from outside is never ingested
+    missed = next(i for i, entry in enumerate(ledger.entries) if entry["tx_json"]["Account"] == outside
+                  and entry["tx_json"]["Destination"] == a)
+    reconciler, unreconciled = reconcile(ledger, {a: "a", b: "b"}, skip={missed})
+
+    assert unreconciled == ["a"]
+    report = {r["wallet_id"]: r for r in reconciler.get_report()["wallets"]}
+    assert report["a"]["unexplained"] == 7.0
+    assert report["b"]["unexplained"] == 0.0
+
+
+def test_payments_with_another_shards_wallets_are_internal():
+    ledger, a, b, outside = build_ledger()
+    ledger.pay(a, b, 30_000_000, T0 + 1)
+    ledger.pay(b, a, 2_000_000, T0 + 2)
+    ledger.close(T0 + 2)
+
+    # This shard owns a; b is a system wallet of another shard
+    reconciler, unreconciled = reconcile(ledger, {a: "a", b: "b"}, owned=[a])
+
+    assert unreconciled == []
+    [result] = reconciler.get_report()["wallets"]
+    assert result["wallet_id"] == "a"
+    assert result["derived_balance"] == -28.0
+    assert result["attribution"]["external_out"] == 0.0
+    assert result["attribution"]["external_in"] == 100.0
+
+
+def test_spot_check_mismatch_is_reported_until_it_matches():
+    ledger, a, b, _ = build_ledger()
+    reconciler, _ = reconcile(ledger, {a: "a", b: "b"})
+
+    reconciler.record_spot_check(a, 99_000_000)
+    assert reconciler.get_report()["spot_check_mismatches"]["a"]["ledger_balance"] == 99.0
+
+    reconciler.record_spot_check(a, ledger.accounts[a][0])
+    assert reconciler.get_report()["spot_check_mismatches"] == {}
+    assert reconciler.spot_checks == 2
@@ -0,0 +1,38 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from records import TxRecord
+from serialization import JSON_SERIALIZERS, _json_default, msgpack_dumps
+
+RECORD = TxRecord("AB" * 32, "tax_pool", "government", 1_500_000, 1_700_000_000, 7, 42)
+
+
+@pytest.mark.parametrize("name", sorted(JSON_SERIALIZERS))
+def test_known_types_serialize_alike(name):
+    payload = {"record": RECORD, "amount": Decimal("0.000001"), "ids": ("a", "b"), "tags": {1}}
+
+    data = json.loads(JSON_SERIALIZERS[name](payload))
+
+    assert data == {"record": RECORD.to_dict(), "amount": "0.000001", "ids": ["a", "b"], "tags": [1]}
+
+
+@pytest.mark.parametrize("name", sorted(JSON_SERIALIZERS))
+def test_unknown_types_are_rejected(name):
+    with pytest.raises(TypeError):
+        JSON_SERIALIZERS[name]({"value": object()})
+
+
+def test_bytes_are_upper_case_hex():
+    assert _json_default(b"\x0a\xff") == "0AFF"
+    assert _json_default(memoryview(b"\x01")) == "01"
+    assert json.loads(JSON_SERIALIZERS["json"]({"hash": RECORD.hash_bytes}))["hash"] == RECORD.tx_hash
+
+
+def test_msgpack_serializes_records():
+    body = msgpack_dumps([RECORD])
+    if body is None:
+        pytest.skip("No MessagePack library installed")
+    msgspec = pytest.importorskip("msgspec")
+    assert msgspec.msgpack.decode(body) == [RECORD.to_dict()]
@@ -0,0 +1,62 @@
+import pytest
+from xrpl.constants import CryptoAlgorithm
+from xrpl.models.transactions import Payment
+from xrpl.transaction import sign
+from xrpl.wallet import Wallet
+
+from signing_service import SigningService, sign_json
+
+
+def payment(wallet, sequence=1, **fields):
+    return Payment(
+        account=wallet.classic_address,
+        amount=str(1_000_000 + sequence),
+        destination=Wallet.create().classic_address,
+        sequence=sequence,
+        fee="12",
+        last_ledger_sequence=1_000_000,
+        **fields
+    )
+
+
+@pytest.mark.parametrize("algorithm", [CryptoAlgorithm.ED25519, CryptoAlgorithm.SECP256K1])
+def test_sign_json_matches_xrpl_sign(algorithm):
+    wallet = Wallet.create(algorithm)
+    tx = payment(wallet, source_tag=42)
+
+    tx_blob, tx_hash = sign_json(tx.to_xrpl(), wallet)
+
+    signed = sign(tx, wallet)
+    assert tx_blob == signed.blob()
+    assert tx_hash == signed.get_hash()
+
+
+def test_sign_json_does_not_modify_the_transaction():
+    wallet = Wallet.create()
+    tx_json = payment(wallet).to_xrpl()
+    original = dict(tx_json)
+
+    sign_json(tx_json, wallet)
+
+    assert tx_json == original
+
+
+def test_signing_service_batch_matches_inline_signing():
+    wallets = {"a": Wallet.create(), "b": Wallet.create(CryptoAlgorithm.SECP256K1)}
+    items = [(wallet_id, payment(wallets[wallet_id], sequence=i + 1))
+             for i, wallet_id in enumerate(["a", "b"] * 5)]
+    service = SigningService(wallets, workers=2, chunk_size=3)
+    try:
+        # Models and their JSON form are both accepted, results keep the order of the items
+        results = service.sign_batch([(wallet_id, tx if i % 2 else tx.to_xrpl())
+                                      for i, (wallet_id, tx) in enumerate(items)])
+
+        assert results == [sign_json(tx.to_xrpl(), wallets[wallet_id]) for wallet_id, tx in items]
+        metrics = service.get_metrics()
+        assert metrics["signed"] == 10
+        assert metrics["batches"] == 1
+
+        with pytest.raises(ValueError, match="No signing key"):
+            service.sign_batch([("c", items[0][1])])
+    finally:
+        service.shutdown()
@@ -0,0 +1,89 @@
+import pytest
+
+import app
+from local_ledger import LocalLedgerClient
+
+
+def pay_chain(system, ledger, rounds, amount=1_000_000, start=1_700_000_000):
+    """Payments from the tax pool down to the exit pool, one ledger (an hour apart) per round"""
+    address = {wallet_id: wallet.classic_address for wallet_id, wallet in system._all_wallets()}
+    for i in range(rounds):
+        timestamp = start + i * 3600
+        for sender, receiver in [("tax_pool", "government"), ("government", "dept_transport"),
+                                 ("dept_transport", "penn_dept_transport"), ("penn_dept_transport", "exit_pool")]:
+            ledger.pay(address[sender], address[receiver], amount + i, timestamp)
+        ledger.close(timestamp)
+
+
+def restarted(ledger, snapshot_path):
+    """A fresh tax system on the same ledger, warm-started from the snapshot"""
+    system = app.XRPLTaxSystem()
+    system.client = LocalLedgerClient(ledger)
+    system.snapshot_path = snapshot_path
+    return system
+
+
+def state(system):
+    return {
+        "hashes": [record.tx_hash for record in system.ledger_log],
+        "last_ledger_index": system._last_ledger_index,
+        "provenance": system.provenance.get_state(),
+        "anomalies": system.anomaly_detector.get_state(),
+        "reconciler": system.reconciler.get_state(),
+        "balances": system.balance_history.export_columns(),
+        "graph": dict(system.flow_graph.edges),
+    }
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    return str(tmp_path / "all.snap")
+
+
+def test_snapshot_round_trip_then_delta_sync(tax_system, ledger, snapshot_path):
+    tax_system.snapshot_path = snapshot_path
+    pay_chain(tax_system, ledger, rounds=20)
+    # An unusually large payment, flagged as an anomaly before the snapshot
+    pay_chain(tax_system, ledger, rounds=1, amount=500_000_000, start=1_700_000_000 + 20 * 3600)
+    tax_system.sync_ledger()
+    assert tax_system.anomaly_detector.events
+    tax_system.save_snapshot()
+
+    warm = restarted(ledger, snapshot_path)
+    assert warm.load_snapshot() == len(tax_system.ledger_log)
+    assert state(warm) == state(tax_system)
+    assert warm.anomaly_detector.get_events() == tax_system.anomaly_detector.get_events()
+
+    # Only the ledgers validated since the snapshot are ingested
+    pay_chain(tax_system, ledger, rounds=3, start=1_700_000_000 + 30 * 3600)
+    assert warm.sync_ledger() == tax_system.sync_ledger()
+    assert state(warm) == state(tax_system)
+
+
+def test_restore_does_not_record_old_anomalies_again(tax_system, ledger, snapshot_path):
+    tax_system.snapshot_path = snapshot_path
+    pay_chain(tax_system, ledger, rounds=20)
+    pay_chain(tax_system, ledger, rounds=1, amount=500_000_000, start=1_700_000_000 + 20 * 3600)
+    tax_system.sync_ledger()
+    tax_system.save_snapshot()
+    events = tax_system.anomaly_detector.get_events()
+
+    for _ in range(2):
+        warm = restarted(ledger, snapshot_path)
+        warm.load_snapshot()
+        assert warm.anomaly_detector.get_events() == events
+        assert warm.anomaly_detector.get_stats() == tax_system.anomaly_detector.get_stats()
+
+
+def test_foreign_or_corrupt_snapshot_is_ignored(tax_system, ledger, snapshot_path):
+    tax_system.snapshot_path = snapshot_path
+    pay_chain(tax_system, ledger, rounds=2)
+    tax_system.sync_ledger()
+    tax_system.save_snapshot()
+
+    with open(snapshot_path, "r+b") as f:
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 1]))
+    assert restarted(ledger, snapshot_path).load_snapshot() == 0
@@ -0,0 +1,73 @@
+from xrpl.models.requests import AccountTx
+
+from local_ledger import LocalLedgerClient
+
+
+class FailingClient(LocalLedgerClient):
+    """Local ledger client whose AccountTx requests for one address fail `failures` times"""
+
+    def __init__(self, ledger, address, failures=1):
+        super().__init__(ledger)
+        self.address = address
+        self.failures = failures
+
+    async def _request_impl(self, request, *, timeout=None):
+        if isinstance(request, AccountTx) and request.account == self.address and self.failures:
+            self.failures -= 1
+            raise ConnectionError("Connection reset by peer")
+        return await super()._request_impl(request, timeout=timeout)
+
+
+def make_payments(system, ledger, rounds=5):
+    """Payments through the whole wallet chain, one ledger per round. Returns their hashes."""
+    address = {wallet_id: wallet.classic_address for wallet_id, wallet in system._all_wallets()}
+    hashes = []
+    for i in range(rounds):
+        for sender, receiver in [("tax_pool", "government"), ("government", "dept_transport"),
+                                 ("dept_transport", "penn_dept_transport"), ("penn_dept_transport", "exit_pool")]:
+            result, tx_hash = ledger.pay(address[sender], address[receiver], 1_000_000 + i)
+            assert result == "tesSUCCESS"
+            hashes.append(tx_hash)
+        ledger.close()
+    return hashes
+
+
+def test_sync_ingests_new_transactions_once(tax_system, ledger):
+    hashes = make_payments(tax_system, ledger)
+    assert tax_system.sync_ledger() > 0
+    assert [record.tx_hash for record in tax_system.ledger_log] == hashes
+    assert tax_system.sync_ledger() == 0
+
+    hashes += make_payments(tax_system, ledger, rounds=2)
+    tax_system.sync_ledger()
+    assert [record.tx_hash for record in tax_system.ledger_log] == hashes
+
+
+def test_sync_resumes_after_failed_wallet(tax_system, ledger):
+    hashes = make_payments(tax_system, ledger)
+    tax_system.sync_ledger()
+    hashes += make_payments(tax_system, ledger)
+
+    exit_pool = tax_system.exit_pool.classic_address
+    tax_system.client = FailingClient(ledger, exit_pool)
+    tax_system.sync_ledger()
+    # Nothing past the failed wallet's last ledger is ingested, so order is kept
+    ingested = len(tax_system.ledger_log)
+    assert ingested <= len(hashes)
+
+    tax_system.sync_ledger()
+    assert [record.tx_hash for record in tax_system.ledger_log] == hashes
+    for _, wallet in tax_system._all_wallets():
+        assert tax_system.balance_history.balance_at(wallet.classic_address) == \
+            ledger.accounts[wallet.classic_address][0]
+
+
+def test_sync_failure_on_first_sync(tax_system, ledger):
+    hashes = make_payments(tax_system, ledger)
+    tax_system.client = FailingClient(ledger, tax_system.gov_wallet.classic_address, failures=2)
+    tax_system.sync_ledger()
+    tax_system.sync_ledger()
+    assert tax_system.ledger_log == []
+
+    tax_system.sync_ledger()
+    assert [record.tx_hash for record in tax_system.ledger_log] == hashes
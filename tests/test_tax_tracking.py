@@ -0,0 +1,35 @@
+import importlib
+
+import pytest
+
+tax_tracking = importlib.import_module("xrpl-tax-tracking")
+
+
+def test_dashboard_matches_recorded_history():
+    system = tax_tracking.TaxTrackingSystem(recent_limit=3)
+    for i in range(5):
+        system.process_tax_payment(100 + i, f"payer-{i}")
+    system.distribute_to_departments({"dept_a": 50, "dept_b": 20})
+    system.distribute_to_departments({"dept_a": 5})
+
+    data = system.generate_dashboard_data()
+
+    assert data["total_tax_collected"] == sum(tx["amount"] for tx in system.transactions if "amount" in tx)
+    assert data["department_balances"] == {"dept_a": 55, "dept_b": 20, "dept_c": 0}
+    assert system.get_department_balance("dept_a") == 55
+    # Only the most recent entries are kept for the feeds
+    assert [tx["amount"] for tx in data["recent_transactions"]] == [102, 103, 104]
+    assert [d["distributions"] for d in data["distribution_history"]] == [{"dept_a": 50, "dept_b": 20}, {"dept_a": 5}]
+
+
+def test_invalid_distribution_leaves_totals_unchanged():
+    system = tax_tracking.TaxTrackingSystem()
+    system.distribute_to_departments({"dept_a": 10})
+
+    with pytest.raises(Exception, match="Invalid department"):
+        system.distribute_to_departments({"dept_b": 30, "dept_x": 1})
+
+    assert system.generate_dashboard_data()["department_balances"] == {"dept_a": 10, "dept_b": 0, "dept_c": 0}
+    assert len(system.distribution_history) == 1
+    with pytest.raises(ValueError):
+        system.get_department_balance("dept_x")
@@ -0,0 +1,87 @@
+import pytest
+
+import app
+from records import TxRecord
+from tx_index import TransactionIndex, payer_tag
+
+T0 = 1_700_000_000
+
+
+def record(n, sender, receiver, ledger_index, source_tag=None):
+    return TxRecord(f"{n:064X}", sender, receiver, 1_000_000 + n, T0 + n, ledger_index, source_tag)
+
+
+def test_payer_tag_is_keyed(monkeypatch):
+    tag = payer_tag("payer-1")
+    assert tag == payer_tag("payer-1") != payer_tag("payer-2")
+    assert 0 <= tag < 2 ** 32
+
+    monkeypatch.setenv("PAYER_TAG_KEY", "another key")
+    assert payer_tag("payer-1") != tag
+
+    monkeypatch.delenv("PAYER_TAG_KEY")
+    with pytest.raises(RuntimeError, match="PAYER_TAG_KEY"):
+        payer_tag("payer-1")
+
+
+def test_tax_system_requires_payer_tag_key(monkeypatch):
+    monkeypatch.delenv("PAYER_TAG_KEY")
+    # A key in .env still counts, so the check runs after it is loaded
+    monkeypatch.setattr(app, "load_dotenv", lambda: None)
+    with pytest.raises(RuntimeError, match="PAYER_TAG_KEY"):
+        app.XRPLTaxSystem()
+
+
+def test_lookups_by_hash_payer_and_ledger_range():
+    index = TransactionIndex()
+    tag = payer_tag("payer-1")
+    records = [record(n, "tax_pool" if n % 2 else "government", "dept", 10 + n // 2, tag if n % 3 == 0 else None)
+               for n in range(10)]
+    for tx in records:
+        index.ingest(tx)
+    index.ingest(records[0])  # Ingested twice, indexed once
+
+    assert index.get(records[4].tx_hash) is records[4]
+    assert index.get(records[4].tx_hash.lower()) is records[4]
+    assert index.get("not hex") is None
+    assert index.by_payer(tag) == [records[n] for n in (0, 3, 6, 9)]
+
+    page, total = index.ledger_range(11, 13)
+    assert total == 6
+    assert page == records[2:8]
+    page, total = index.ledger_range(11, 13, offset=4, limit=10)
+    assert page == records[6:8]
+    page, total = index.ledger_range(wallet_id="tax_pool", limit=2)
+    assert (page, total) == ([records[1], records[3]], 5)
+    assert index.ledger_range(wallet_id="unknown") == ([], 0)
+
+
+def test_late_records_keep_ledger_order():
+    index = TransactionIndex()
+    late = record(1, "a", "b", 5)
+    for tx in (record(2, "a", "b", 4), record(3, "a", "b", 6), late):
+        index.ingest(tx)
+
+    page, _ = index.ledger_range()
+    assert [tx.ledger_index for tx in page] == [4, 5, 6]
+    assert page[1] is late
+
+
+def test_payer_route_requires_admin(tax_system, ledger, monkeypatch):
+    addresses = {wallet_id: wallet.classic_address for wallet_id, wallet in tax_system._all_wallets()}
+    ledger.pay(addresses["tax_pool"], addresses["government"], 2_000_000, T0 + 10, source_tag=payer_tag("payer-1"))
+    ledger.pay(addresses["tax_pool"], addresses["government"], 3_000_000, T0 + 20, source_tag=payer_tag("payer-2"))
+    ledger.close(T0 + 20)
+    monkeypatch.setattr(app, "tax_system", tax_system)
+    client = app.app.test_client()
+
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.get("/api/tx/payer/payer-1").status_code == 403
+
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    assert client.get("/api/tx/payer/payer-1", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    response = client.get("/api/tx/payer/payer-1", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    [transaction] = response.get_json()["transactions"]
+    assert transaction["amount_drops"] == 2_000_000
+    assert transaction["source_tag"] == payer_tag("payer-1")
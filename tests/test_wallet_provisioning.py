@@ -0,0 +1,63 @@
+import pytest
+from xrpl.wallet import Wallet
+
+import app
+from wallet_provisioning import unfunded_wallets, append_env_atomic
+from local_ledger import LocalLedger, LocalLedgerClient
+
+
+def test_unfunded_wallets_finds_accounts_missing_from_ledger():
+    ledger = LocalLedger()
+    funded, unfunded = Wallet.create(), Wallet.create()
+    ledger.fund(funded.classic_address, 10_000_000)
+    ledger.close()
+
+    missing = unfunded_wallets(LocalLedgerClient(ledger), {"a": funded, "b": unfunded})
+
+    assert missing == {"b": unfunded}
+
+
+@pytest.fixture
+def faucet(monkeypatch, tmp_path):
+    """Record the wallets the tax system asks the faucet to fund (in a scratch directory for .env)"""
+    monkeypatch.chdir(tmp_path)
+    calls = []
+    errors = {}
+
+    def fund_with_faucet(client, wallets):
+        calls.append(dict(wallets))
+        return {name: errors[name] for name in wallets if name in errors}
+
+    monkeypatch.setattr(app, "fund_with_faucet", fund_with_faucet)
+    return calls, errors
+
+
+def test_saved_but_unfunded_wallet_is_funded_on_start(faucet, monkeypatch):
+    calls, _ = faucet
+    seed = Wallet.create().seed
+    monkeypatch.setenv("WALLET_DEPT_LABOR", seed)
+
+    system = app.XRPLTaxSystem()
+
+    assert [list(wallets) for wallets in calls] == [["WALLET_DEPT_LABOR"]]
+    assert system.department_wallets["dept_labor"].seed == seed
+
+
+def test_new_wallet_is_saved_before_funding_and_failure_is_raised(faucet, monkeypatch, tmp_path):
+    calls, errors = faucet
+    monkeypatch.delenv("WALLET_DEPT_LABOR")
+    errors["WALLET_DEPT_LABOR"] = "faucet unavailable"
+
+    with pytest.raises(RuntimeError, match="WALLET_DEPT_LABOR"):
+        app.XRPLTaxSystem()
+
+    # The seed is kept, so the next start funds the same wallet instead of a new one
+    saved = dict(line.split("=", 1) for line in (tmp_path / ".env").read_text().splitlines())
+    assert saved["WALLET_DEPT_LABOR"] == calls[0]["WALLET_DEPT_LABOR"].seed
+
+
+def test_append_env_atomic_keeps_existing_lines(tmp_path):
+    path = tmp_path / ".env"
+    path.write_text("A=1")
+    append_env_atomic(str(path), {"B": "2"})
+    assert path.read_text() == "A=1\nB=2\n"
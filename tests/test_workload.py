@@ -0,0 +1,140 @@
+from xrpl.clients import JsonRpcClient
+from xrpl.models.requests import AccountInfo, AccountTx
+from xrpl.models.transactions import Payment
+from xrpl.transaction import autofill, sign, submit
+from xrpl.wallet import Wallet
+
+from jurisdictions import department_parents
+from local_ledger import LocalLedger, LocalLedgerClient, serve, BASE_FEE, RESERVE_BASE
+from tx_index import payer_tag
+from workload import generate_jurisdictions, generate_workload, replay, DAY, OPENING_BALANCE_DROPS
+
+T0 = 1_704_067_200  # 2024-01-01 00:00 UTC
+
+
+def small_workload(days=120, seed=3):
+    jurisdictions = generate_jurisdictions(3, 4, seed=seed)
+    parents = department_parents(jurisdictions)
+    return jurisdictions, parents, generate_workload(parents, taxpayers=200, days=days, start=T0, seed=seed)
+
+
+def test_jurisdictions_form_one_tree():
+    jurisdictions = generate_jurisdictions(5, 6, seed=1)
+
+    names = list(jurisdictions)
+    assert jurisdictions[names[0]]["parent"] is None
+    for i, name in enumerate(names[1:], 1):
+        assert jurisdictions[name]["parent"] in names[:i]
+    parents = department_parents(jurisdictions)
+    assert len(parents) == 30
+    # Every department is funded by the government or another department
+    assert all(parent == "government" or parent in parents for parent in parents.values())
+    assert generate_jurisdictions(5, 6, seed=1) == jurisdictions
+
+
+def test_workload_never_spends_more_than_received():
+    _, parents, workload = small_workload()
+    events = workload["events"]
+
+    assert [event[0] for event in events] == sorted(event[0] for event in events)
+    assert all(event[0] < workload["end"] for event in events)
+    held = {}
+    for _, sender, receiver, drops, _ in events:
+        if sender is not None:
+            held[sender] -= drops
+            assert held[sender] >= OPENING_BALANCE_DROPS, sender
+        held[receiver] = held.get(receiver, 0) + drops
+    assert set(held) == set(workload["wallet_ids"]) == {"tax_pool", "government", "exit_pool"} | set(parents)
+
+
+def test_tax_payments_rise_before_deadlines():
+    _, _, workload = small_workload(days=365)
+    taxes = [event for event in workload["events"] if event[1] == "tax_pool"]
+
+    assert {event[4] for event in taxes} <= {payer_tag(f"taxpayer_{i:06d}") for i in range(200)}
+    # The week before the April deadline (day 105) against the week after it
+    before = sum(1 for event in taxes if T0 + 98 * DAY <= event[0] < T0 + 105 * DAY)
+    after = sum(1 for event in taxes if T0 + 106 * DAY <= event[0] < T0 + 113 * DAY)
+    assert before > 3 * after
+
+
+def test_replay_matches_the_workload():
+    _, _, workload = small_workload(days=60)
+    addresses = {wallet_id: Wallet.create().classic_address for wallet_id in workload["wallet_ids"]}
+    ledger = LocalLedger(start_time=workload["start"] - 120)
+
+    stats = replay(ledger, workload, addresses, ledger_seconds=3600)
+
+    assert stats["failed"] == 0
+    assert stats["payments"] == len(ledger.entries) == len(workload["events"])
+    for wallet_id, address in addresses.items():
+        received = sum(e[3] for e in workload["events"] if e[2] == wallet_id)
+        sent = [e[3] for e in workload["events"] if e[1] == wallet_id]
+        assert ledger.accounts[address][0] == received - sum(sent) - BASE_FEE * len(sent), wallet_id
+    # Ledgers close in workload time
+    assert ledger.close_times == sorted(ledger.close_times)
+    assert stats["ledgers"] == ledger.validated_index - 1
+
+
+def test_account_tx_pages_in_both_directions():
+    ledger = LocalLedger(start_time=T0)
+    a, b = Wallet.create().classic_address, Wallet.create().classic_address
+    ledger.fund(a, 100_000_000, T0)
+    ledger.close(T0)
+    for i in range(25):
+        ledger.pay(a, b, RESERVE_BASE + i, T0 + i)
+        if i % 4 == 3:
+            ledger.close(T0 + i)
+    ledger.close(T0 + 25)
+    client = LocalLedgerClient(ledger)
+
+    def pages(forward):
+        hashes, marker = [], None
+        while True:
+            result = client.request(AccountTx(account=b, forward=forward, limit=7, marker=marker)).result
+            hashes += [entry["hash"] for entry in result["transactions"]]
+            marker = result.get("marker")
+            if not marker:
+                return hashes
+
+    forward = pages(True)
+    assert len(forward) == 25
+    assert pages(False) == forward[::-1]
+    assert [ledger.by_hash[h]["tx_json"]["DeliverMax"] for h in forward] == [str(RESERVE_BASE + i) for i in range(25)]
+
+
+def test_signed_payments_are_applied_with_their_hash():
+    ledger = LocalLedger(start_time=T0)
+    wallet = Wallet.create()
+    ledger.fund(wallet.classic_address, 100_000_000, T0)
+    ledger.close(T0)
+    client = LocalLedgerClient(ledger)
+    destination = Wallet.create().classic_address
+
+    payment = autofill(Payment(account=wallet.classic_address, destination=destination, amount="2000000"), client)
+    signed = sign(payment, wallet)
+    result = submit(signed, client).result
+
+    assert result["engine_result"] == "tesSUCCESS"
+    assert result["tx_json"]["hash"] == signed.get_hash()
+    # The same sequence again is rejected, a payment below the reserve cannot create an account
+    assert submit(signed, client).result["engine_result"] == "tefPAST_SEQ"
+    assert ledger.pay(wallet.classic_address, Wallet.create().classic_address, 1)[0] == "tecNO_DST_INSUF_XRP"
+    ledger.close()
+    assert ledger.accounts[destination][0] == 2_000_000
+
+
+def test_served_ledger_answers_json_rpc():
+    ledger = LocalLedger(start_time=T0)
+    address = Wallet.create().classic_address
+    ledger.fund(address, 5_000_000, T0)
+    ledger.close(T0)
+    server = serve(ledger, port=0)
+    try:
+        client = JsonRpcClient(f"http://127.0.0.1:{server.server_address[1]}/")
+        response = client.request(AccountInfo(account=address, ledger_index="validated"))
+        assert response.result["account_data"]["Balance"] == "5000000"
+        missing = client.request(AccountInfo(account=Wallet.create().classic_address))
+        assert missing.result["error"] == "actNotFound"
+    finally:
+        server.shutdown()
@@ -0,0 +1,123 @@
+from bisect import bisect_left, bisect_right
+from hashlib import sha256
+import hmac
+import os
+import threading
+
+# Maximum number of transactions returned by one range query
+MAX_PAGE_SIZE = 1000
+
+
+def payer_tag_key():
+    """
+    Secret key of the payer tags (PAYER_TAG_KEY), so the tags of small ID spaces
+    cannot be reversed by hashing every candidate ID. Must stay the same across
+    restarts. Raises RuntimeError if it is not set.
+    """
+    key = os.getenv('PAYER_TAG_KEY')
+    if not key:
+        raise RuntimeError("PAYER_TAG_KEY is not set: payer tags need a secret key, "
+                           "kept the same across restarts")
+    return key.encode()
+
+
+def payer_tag(tax_payer_id):
+    """
+    Stable 32-bit SourceTag for a tax payer ID (the first 4 bytes of its
+    HMAC-SHA-256 under PAYER_TAG_KEY). Unlike hash(), the tag is the same in every
+    process, so payments can be found again by payer after a restart.
+    Different payers may share a tag (1 in 2**32), so lookups should be confirmed
+    with the amount or transaction hash.
+    """
+    digest = hmac.new(payer_tag_key(), str(tax_payer_id).encode(), sha256).digest()
+    return int.from_bytes(digest[:4], 'big')
+
+
+class _SortedRecords:
+    """Records kept in ledger order, with a parallel list of keys for bisection"""
+
+    __slots__ = ('keys', 'records')
+
+    def __init__(self):
+        self.keys = []
+        self.records = []
+
+    def add(self, key, record):
+        if not self.keys or key >= self.keys[-1]:
+            self.keys.append(key)
+            self.records.append(record)
+        else:
+            # Late arrival (e.g. a wallet that was behind): insert in order
+            position = bisect_right(self.keys, key)
+            self.keys.insert(position, key)
+            self.records.insert(position, record)
+
+    def range(self, start=None, end=None):
+        """Slice bounds of the records with start <= key <= end"""
+        low = bisect_left(self.keys, start) if start is not None else 0
+        high = bisect_right(self.keys, end) if end is not None else len(self.keys)
+        return low, high
+
+
+class TransactionIndex:
+    """
+    Secondary indexes over ingested transaction records: by hash, by payer tag
+    (SourceTag), by ledger index and by wallet. Lookups by hash and tag are O(1),
+    ledger range queries O(log n) plus the size of the returned page.
+    """
+
+    def __init__(self):
+        self.by_hash = {}
+        self.by_tag = {}
+        self.by_ledger = _SortedRecords()
+        self.by_wallet = {}
+        self.lock = threading.Lock()
+
+    def ingest(self, tx):
+        """Index one transaction record"""
+        hash_bytes = tx.hash_bytes
+        with self.lock:
+            if hash_bytes in self.by_hash:
+                return
+            self.by_hash[hash_bytes] = tx
+            if tx.source_tag is not None:
+                self.by_tag.setdefault(tx.source_tag, []).append(tx)
+            key = tx.ledger_index
+            self.by_ledger.add(key, tx)
+            for wallet_id in {tx.sender, tx.receiver}:
+                self.by_wallet.setdefault(wallet_id, _SortedRecords()).add(key, tx)
+
+    def get(self, tx_hash):
+        """Transaction record by hash, or None"""
+        try:
+            hash_bytes = bytes.fromhex(tx_hash)
+        except ValueError:
+            return None
+        with self.lock:
+            return self.by_hash.get(hash_bytes)
+
+    def by_payer(self, tag):
+        """Transaction records with a SourceTag, oldest first"""
+        with self.lock:
+            return list(self.by_tag.get(tag, []))
+
+    def ledger_range(self, ledger_min=None, ledger_max=None, wallet_id=None, offset=0, limit=100):
+        """
+        One page of the transactions in a ledger range, oldest first.
+        Args:
+            ledger_min: First ledger index (inclusive)
+            ledger_max: Last ledger index (inclusive)
+            wallet_id: Only transactions sent or received by this wallet
+            offset: Number of matching transactions to skip
+            limit: Maximum number of transactions returned (at most MAX_PAGE_SIZE)
+        Returns:
+            (list of records, total number of matching transactions)
+        """
+        limit = max(0, min(limit, MAX_PAGE_SIZE))
+        with self.lock:
+            records = self.by_wallet.get(wallet_id) if wallet_id is not None else self.by_ledger
+            if records is None:
+                return [], 0
+            low, high = records.range(ledger_min, ledger_max)
+            start = low + max(offset, 0)
+            return records.records[start:min(start + limit, high)], high - low
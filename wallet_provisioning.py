@@ -0,0 +1,186 @@
+from xrpl.wallet import generate_faucet_wallet, Wallet
+from xrpl.account import does_account_exist
+from xrpl.models.transactions import Payment
+from xrpl.transaction import autofill, sign, submit
+from concurrent.futures import ThreadPoolExecutor
+from amounts import to_drops
+import tempfile
+import json
+import os
+
+# Maximum number of faucet requests running at the same time
+MAX_FAUCET_WORKERS = 8
+
+# Amount sent to each new wallet when funding from a master wallet
+DEFAULT_FUNDING_XRP = 25
+
+
+def create_wallets(names):
+    """
+    Derive new wallets offline (no network round-trip).
+    Args:
+        names: IDs of the wallets to create
+    Returns:
+        Dictionary of wallet ID -> Wallet
+    """
+    return {name: Wallet.create() for name in names}
+
+
+def fund_with_faucet(client, wallets, max_workers=MAX_FAUCET_WORKERS):
+    """
+    Fund already derived wallets from the test network faucet, with a bounded
+    number of faucet calls in flight.
+    Args:
+        client: XRPL client of the network whose faucet is used
+        wallets: Dictionary of wallet ID -> Wallet
+        max_workers: Maximum number of concurrent faucet calls
+    Returns:
+        Dictionary of wallet ID -> error message for wallets that were not funded
+    """
+    def fund(item):
+        name, wallet = item
+        try:
+            generate_faucet_wallet(client, wallet=wallet, debug=False)
+            print(f"Funded {name}: {wallet.classic_address}")
+            return name, None
+        except Exception as e:
+            print(f"Error funding {name}: {e}")
+            return name, str(e)
+
+    if not wallets:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(len(wallets), max_workers)) as pool:
+        results = pool.map(fund, wallets.items())
+    return {name: error for name, error in results if error}
+
+
+def unfunded_wallets(client, wallets, max_workers=MAX_FAUCET_WORKERS):
+    """
+    Find the wallets that are not on the ledger yet (account_info reports
+    actNotFound), e.g. saved by an earlier run whose funding failed.
+    Args:
+        client: XRPL client
+        wallets: Dictionary of wallet ID -> Wallet
+        max_workers: Maximum number of concurrent requests
+    Returns:
+        Dictionary of wallet ID -> Wallet of the wallets without an account
+    Raises:
+        XRPLRequestFailureException if the node returns any other error
+    """
+    def exists(wallet):
+        return does_account_exist(wallet.classic_address, client, ledger_index="validated")
+
+    if not wallets:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(len(wallets), max_workers)) as pool:
+        found = list(pool.map(exists, wallets.values()))
+    return {name: wallet for (name, wallet), funded in zip(wallets.items(), found) if not funded}
+
+
+def fund_from_master(client, master_wallet, wallets, amount_xrp=DEFAULT_FUNDING_XRP):
+    """
+    Fund already derived wallets with one batch of payments from a master wallet.
+    Only the first payment is autofilled, the others reuse its fee and ledger
+    window with consecutive sequence numbers so the whole batch is submitted
+    without waiting for a ledger close in between.
+    Args:
+        client: XRPL client
+        master_wallet: Funded wallet paying for the new accounts
+        wallets: Dictionary of wallet ID -> Wallet
+        amount_xrp: Amount sent to every wallet (must cover the account reserve)
+    Returns:
+        Dictionary of wallet ID -> error message for wallets that were not funded
+    """
+    amount_drops = str(to_drops(amount_xrp))
+    errors = {}
+    base_tx = None
+    for i, (name, wallet) in enumerate(wallets.items()):
+        try:
+            if base_tx is None:
+                base_tx = autofill(Payment(
+                    account=master_wallet.classic_address,
+                    amount=amount_drops,
+                    destination=wallet.classic_address
+                ), client)
+                payment_tx = base_tx
+            else:
+                payment_tx = Payment(
+                    account=master_wallet.classic_address,
+                    amount=amount_drops,
+                    destination=wallet.classic_address,
+                    sequence=base_tx.sequence + i,
+                    fee=base_tx.fee,
+                    last_ledger_sequence=base_tx.last_ledger_sequence,
+                    network_id=base_tx.network_id
+                )
+
+            response = submit(sign(payment_tx, master_wallet), client)
+            engine_result = response.result.get("engine_result", "")
+            if engine_result not in ("tesSUCCESS", "terQUEUED"):
+                raise ValueError(response.result.get("engine_result_message", engine_result))
+            print(f"Funding {name}: {wallet.classic_address}")
+
+        except Exception as e:
+            # The remaining payments would have a sequence gap, so stop here
+            print(f"Error funding {name}: {e}")
+            for rest_name in list(wallets)[i:]:
+                errors[rest_name] = str(e)
+            break
+
+    return errors
+
+
+def write_file_atomic(path, content):
+    """Write a file so readers only ever see the old or the complete new content."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def append_env_atomic(path, values):
+    """
+    Add KEY=value lines to a .env file, replacing the whole file atomically.
+    Args:
+        path: Path of the .env file
+        values: Dictionary of env key -> value
+    """
+    content = ""
+    if os.path.exists(path):
+        with open(path) as f:
+            content = f.read()
+    if content and not content.endswith("\n"):
+        content += "\n"
+    content += "".join(f"{key}={value}\n" for key, value in values.items())
+    write_file_atomic(path, content)
+
+
+def save_wallet_credentials(wallets, json_path, env_path, env_keys):
+    """
+    Save wallet credentials to a JSON file and a .env file, both atomically.
+    Args:
+        wallets: Dictionary of wallet ID -> Wallet
+        json_path: Path of the credentials JSON file
+        env_path: Path of the .env file (overwritten)
+        env_keys: Dictionary of wallet ID -> env key for the seed
+    Returns:
+        Dictionary of wallet ID -> {"seed", "classic_address"}
+    """
+    wallet_info = {
+        name: {
+            "seed": wallet.seed,
+            "classic_address": wallet.classic_address
+        }
+        for name, wallet in wallets.items()
+    }
+    write_file_atomic(json_path, json.dumps(wallet_info, indent=4))
+    write_file_atomic(env_path, "".join(
+        f"{env_keys[name]}={info['seed']}\n" for name, info in wallet_info.items()))
+    return wallet_info
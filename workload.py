@@ -0,0 +1,206 @@
+import math
+import random
+import time
+
+from tx_index import payer_tag
+
+DAY = 86400
+
+# Quarterly estimated tax deadlines (day of the year)
+DEFAULT_DEADLINES = (14, 105, 166, 258)
+
+# Balance every wallet starts with, to pay its fees (drops)
+OPENING_BALANCE_DROPS = 100_000_000
+
+
+def generate_jurisdictions(count=4, departments=10, sub_department_share=0.3, seed=None):
+    """
+    Random jurisdiction tree in the JURISDICTIONS_FILE format. The first
+    jurisdiction is the root; every other one hangs under a random earlier one.
+    Departments are funded by a department of the parent jurisdiction (or the
+    government for the root), except a share of sub-departments funded by a
+    department of their own jurisdiction, for multi-level budget flows.
+    Args:
+        count: Number of jurisdictions
+        departments: Departments per jurisdiction
+        sub_department_share: Share of the departments that are sub-departments
+        seed: Random seed
+    Returns:
+        Dictionary of jurisdiction ID -> {"parent", "departments"}
+    """
+    rng = random.Random(seed)
+    jurisdictions = {}
+    names = [f"jur_{i:02d}" for i in range(count)]
+    for i, name in enumerate(names):
+        parent = names[rng.randrange(i)] if i else None
+        parent_departments = list(jurisdictions[parent]["departments"]) if parent else ["government"]
+        top_level = max(1, departments - int(departments * sub_department_share))
+        own = {}
+        for k in range(departments):
+            dept_id = f"{name}_dept_{k:03d}"
+            if k < top_level:
+                own[dept_id] = rng.choice(parent_departments)
+            else:
+                own[dept_id] = rng.choice(list(own))
+        jurisdictions[name] = {"parent": parent, "departments": own}
+    return jurisdictions
+
+
+def _split(total, weights):
+    """Helper to split integer drops by weights exactly (the remainder goes to the largest share)"""
+    weight_sum = sum(weights)
+    shares = [int(total * weight // weight_sum) for weight in weights]
+    shares[max(range(len(weights)), key=weights.__getitem__)] += total - sum(shares)
+    return shares
+
+
+def _deadline_multiplier(day_of_year, deadlines, spike, ramp_days):
+    """Helper: payment intensity multiplier, rising exponentially towards the next deadline"""
+    upcoming = [d - day_of_year for d in deadlines if d >= day_of_year]
+    days_left = min(upcoming) if upcoming else deadlines[0] + 365 - day_of_year
+    return 1 + spike * math.exp(-days_left / ramp_days)
+
+
+def generate_workload(department_parents, taxpayers=1000, payments_per_taxpayer=4, days=365, start=None,
+                      deadlines=DEFAULT_DEADLINES, spike=8.0, ramp_days=5.0, budget_period_days=30,
+                      pass_through=0.6, vendor_payments=5, seed=None):
+    """
+    Synthetic payments of a tax year.
+      - Tax payments (tax_pool -> government, SourceTag = payer tag) arrive as a
+        Poisson process whose rate rises exponentially before each deadline.
+      - At the end of every budget period the government allocates what it
+        received down the department tree: each department with sub-departments
+        passes `pass_through` of its funds on (split by fixed random weights) and
+        spends the rest in `vendor_payments` payments to exit_pool spread over
+        the next period.
+    Args:
+        department_parents: Department ID -> parent wallet ID (see jurisdictions.department_parents)
+        taxpayers: Number of tax payers
+        payments_per_taxpayer: Average tax payments per tax payer over the period
+        days: Length of the workload (days)
+        start: Unix time of the first day (default: 365 days ago)
+        deadlines: Days of the year with a deadline spike
+        spike: Rate multiplier at a deadline (1 + spike times the base rate)
+        ramp_days: Time constant of the rise before a deadline (days)
+        seed: Random seed
+    Returns:
+        Dictionary with "start", "end", "wallet_ids" and "events", a time-ordered
+        list of (timestamp, sender, receiver, drops, source_tag); a sender of None
+        is an external deposit (the faucet)
+    """
+    rng = random.Random(seed)
+    start = int(start if start is not None else time.time() - 365 * DAY)
+    end = start + days * DAY
+    children = {}
+    for dept_id, parent in department_parents.items():
+        children.setdefault(parent, []).append(dept_id)
+    weights = {dept_id: rng.lognormvariate(0, 0.5) for dept_id in department_parents}
+    wallet_ids = ["tax_pool", "government", "exit_pool"] + list(department_parents)
+
+    # Tax payments: non-homogeneous Poisson process by thinning
+    multipliers = [_deadline_multiplier(day % 365, deadlines, spike, ramp_days) for day in range(days)]
+    base_rate = taxpayers * payments_per_taxpayer / (sum(multipliers) * DAY)
+    max_rate = base_rate * (1 + spike)
+    payer_means = [rng.lognormvariate(math.log(300), 0.8) for _ in range(taxpayers)]
+    tax_events = []
+    t = float(start)
+    while True:
+        t += rng.expovariate(max_rate)
+        if t >= end:
+            break
+        day = int((t - start) // DAY)
+        if rng.random() * (1 + spike) > multipliers[day]:
+            continue
+        payer = rng.randrange(taxpayers)
+        drops = max(1, int(rng.lognormvariate(math.log(payer_means[payer]), 0.3) * 1_000_000))
+        tax_events.append((int(t), "tax_pool", "government", drops, payer_tag(f"taxpayer_{payer:06d}")))
+
+    events = [(start - 60, None, wallet_id, OPENING_BALANCE_DROPS, None) for wallet_id in wallet_ids]
+    events.append((start - 30, None, "tax_pool", sum(e[3] for e in tax_events), None))
+    events.extend(tax_events)
+
+    # Budget flows, one round per period, parents before children
+    levels = {"government": 0}
+    def level_of(wallet_id):
+        if wallet_id not in levels:
+            levels[wallet_id] = level_of(department_parents[wallet_id]) + 1
+        return levels[wallet_id]
+    order = sorted(department_parents, key=level_of)
+
+    period = budget_period_days * DAY
+    received = {}
+    tax_index = 0
+    for period_end in range(start + period, end + 1, period):
+        while tax_index < len(tax_events) and tax_events[tax_index][0] < period_end:
+            received["government"] = received.get("government", 0) + tax_events[tax_index][3]
+            tax_index += 1
+
+        for wallet_id in ["government"] + order:
+            funds = received.pop(wallet_id, 0)
+            if not funds:
+                continue
+            timestamp = period_end + level_of(wallet_id) * 60
+            kids = children.get(wallet_id, [])
+            passed = funds if wallet_id == "government" else (int(funds * pass_through) if kids else 0)
+            if passed:
+                for kid, share in zip(kids, _split(passed, [weights[kid] for kid in kids])):
+                    if share:
+                        events.append((timestamp, wallet_id, kid, share, None))
+                        received[kid] = received.get(kid, 0) + share
+            spent = funds - passed
+            if spent:
+                for share in _split(spent, [rng.random() + 0.1 for _ in range(vendor_payments)]):
+                    if share:
+                        events.append((timestamp + rng.randrange(1, period), wallet_id, "exit_pool", share, None))
+
+    events = [event for event in events if event[0] < end]
+    events.sort(key=lambda event: event[0])
+    return {"start": start, "end": end, "wallet_ids": wallet_ids, "events": events}
+
+
+def replay(ledger, workload, addresses, rate=None, ledger_seconds=4, max_ledger_size=1000, progress=None):
+    """
+    Apply a workload's payments to a LocalLedger, closing a ledger every
+    `ledger_seconds` of workload time (or after `max_ledger_size` payments).
+    Args:
+        ledger: LocalLedger
+        workload: Output of generate_workload()
+        addresses: Wallet ID -> classic address
+        rate: Payments per second (wall clock), None for as fast as possible
+        progress: Optional callable(payments applied, ledgers closed)
+    Returns:
+        Dictionary with the payments applied, payments that failed, ledgers closed and seconds taken
+    """
+    started = time.perf_counter()
+    ledger_start = None
+    in_ledger = 0
+    closed = 0
+    failed = 0
+    for i, (timestamp, sender, receiver, drops, source_tag) in enumerate(workload["events"]):
+        if ledger_start is None:
+            ledger_start = timestamp
+        elif timestamp - ledger_start >= ledger_seconds or in_ledger >= max_ledger_size:
+            ledger.close(timestamp)
+            closed += 1
+            ledger_start, in_ledger = timestamp, 0
+            if progress:
+                progress(i, closed)
+
+        if rate:
+            delay = started + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        if sender is None:
+            result, _ = ledger.fund(addresses[receiver], drops, timestamp)
+        else:
+            result, _ = ledger.pay(addresses[sender], addresses[receiver], drops, timestamp, source_tag)
+        failed += result != "tesSUCCESS"
+        in_ledger += 1
+
+    ledger.close(workload["end"])
+    return {
+        "payments": len(workload["events"]),
+        "failed": failed,
+        "ledgers": closed + 1,
+        "seconds": time.perf_counter() - started
+    }
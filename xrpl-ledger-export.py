@@ -0,0 +1,60 @@
+from dotenv import load_dotenv
+from xrpl.clients import JsonRpcClient
+from xrpl.wallet import Wallet
+from export import LedgerReader, write_csv, write_parquet
+from jurisdictions import load_jurisdictions, department_parents, owned_wallet_ids
+from datetime import datetime, timezone
+import argparse
+import os
+
+def parse_time(value):
+    """Parse a Unix timestamp or an ISO date (UTC) into a Unix timestamp"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+def build_reader():
+    """
+    Ledger reader for the wallets saved in .env, on XRPL_URL. Only reads the
+    seeds: unlike the web app it never creates or funds wallets, loads a
+    snapshot or syncs the ledger. With JURISDICTION set, exports default to the
+    wallets of that jurisdiction.
+    """
+    load_dotenv()
+    jurisdictions = load_jurisdictions()
+    env_keys = {'tax_pool': 'TAX_POOL', 'exit_pool': 'EXIT_POOL', 'government': 'GOV_WALLET'}
+    env_keys.update((dept_id, f"WALLET_{dept_id.upper()}") for dept_id in department_parents(jurisdictions))
+
+    missing = [env_key for env_key in env_keys.values() if not os.getenv(env_key)]
+    if missing:
+        raise SystemExit(f"Wallet seeds missing from .env: {', '.join(missing)} (start app.py once to create them)")
+    wallet_names = {Wallet.from_seed(os.getenv(env_key)).classic_address: wallet_id
+                    for wallet_id, env_key in env_keys.items()}
+
+    exported = None
+    if os.getenv('JURISDICTION'):
+        exported = owned_wallet_ids(jurisdictions, os.getenv('JURISDICTION'))
+    client = JsonRpcClient(os.getenv('XRPL_URL', "https://s.devnet.rippletest.net:51234"))
+    return LedgerReader(client, wallet_names, exported)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the public spending ledger")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--output", required=True,
+                        help="CSV file, or output directory for Parquet")
+    parser.add_argument("--wallet", action="append",
+                        help="wallet ID to export (repeatable, default: all wallets)")
+    parser.add_argument("--start", help="Unix timestamp or ISO date (inclusive)")
+    parser.add_argument("--end", help="Unix timestamp or ISO date (exclusive)")
+    args = parser.parse_args()
+
+    records = build_reader().iter_transactions(args.wallet, parse_time(args.start), parse_time(args.end))
+    if args.format == "csv":
+        write_csv(records, args.output)
+        print(f"Transactions exported to '{args.output}'")
+    else:
+        count = write_parquet(records, args.output)
+        print(f"{count} transactions exported to '{args.output}'")
@@ -0,0 +1,82 @@
+from dotenv import load_dotenv
+from xrpl.clients import JsonRpcClient
+from xrpl.wallet import Wallet
+from wallet_provisioning import create_wallets, fund_with_faucet, unfunded_wallets, append_env_atomic
+from jurisdictions import load_jurisdictions, department_parents
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+def provision_missing_wallets(network):
+    """
+    Create and fund every wallet missing from .env once, before the shards start,
+    so shard processes never race on creating the same wallets. Saved wallets
+    that are not on the ledger yet (their funding failed earlier) are funded too.
+    Raises:
+        RuntimeError if a wallet could not be funded
+    """
+    load_dotenv()
+    env_keys = ['TAX_POOL', 'EXIT_POOL', 'GOV_WALLET']
+    env_keys += [f"WALLET_{dept_id.upper()}" for dept_id in department_parents(load_jurisdictions())]
+    client = JsonRpcClient(network)
+    saved = {env_key: Wallet.from_seed(os.getenv(env_key)) for env_key in env_keys if os.getenv(env_key)}
+    unfunded = unfunded_wallets(client, saved)
+
+    missing = [env_key for env_key in env_keys if env_key not in saved]
+    if missing:
+        print(f"Generating new wallets for {', '.join(missing)}...")
+        wallets = create_wallets(missing)
+        append_env_atomic('.env', {env_key: wallet.seed for env_key, wallet in wallets.items()})
+        unfunded.update(wallets)
+
+    errors = fund_with_faucet(client, unfunded)
+    if errors:
+        raise RuntimeError(f"Could not fund wallets {', '.join(sorted(errors))} (seeds saved in .env, "
+                           f"run again to retry): {errors}")
+
+def launch(jurisdictions, base_port, aggregator_port):
+    """
+    Start one app.py process per jurisdiction (ports base_port, base_port + 1, ...)
+    and the aggregator in front of them. Returns the processes.
+    """
+    processes = []
+    shard_urls = []
+    for i, jurisdiction in enumerate(jurisdictions):
+        port = base_port + i
+        env = dict(os.environ, JURISDICTION=jurisdiction, PORT=str(port))
+        processes.append(subprocess.Popen([sys.executable, "app.py"], env=env))
+        shard_urls.append(f"{jurisdiction}=http://127.0.0.1:{port}")
+        print(f"Shard {jurisdiction}: http://127.0.0.1:{port}")
+
+    env = dict(os.environ, SHARD_URLS=",".join(shard_urls), PORT=str(aggregator_port))
+    processes.append(subprocess.Popen([sys.executable, "aggregator.py"], env=env))
+    print(f"Aggregator: http://127.0.0.1:{aggregator_port}")
+    return processes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run every jurisdiction as a separate shard process")
+    parser.add_argument("--jurisdiction", action="append",
+                        help="jurisdiction to run (repeatable, default: all)")
+    parser.add_argument("--base-port", type=int, default=5001,
+                        help="port of the first shard, the others follow")
+    parser.add_argument("--aggregator-port", type=int, default=5000)
+    parser.add_argument("--network", default="https://s.devnet.rippletest.net:51234",
+                        help="network used to fund missing wallets")
+    args = parser.parse_args()
+
+    jurisdictions = args.jurisdiction or list(load_jurisdictions())
+    provision_missing_wallets(args.network)
+    processes = launch(jurisdictions, args.base_port, args.aggregator_port)
+    try:
+        while all(process.poll() is None for process in processes):
+            time.sleep(1)
+        print("A process exited, stopping all shards")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
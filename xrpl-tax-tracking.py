@@ -4,10 +4,15 @@ from xrpl.models.transactions import Payment
 from xrpl.utils import xrp_to_drops
 from xrpl.transaction import submit_and_wait
 from datetime import datetime
+from collections import deque
 import json
+import time
+
+# Number of entries kept for the dashboard's recent/distribution feeds
+RECENT_TRANSACTIONS_LIMIT = 100
 
 class TaxTrackingSystem:
-    def __init__(self, network="testnet"):
+    def __init__(self, network="testnet", recent_limit=RECENT_TRANSACTIONS_LIMIT):
         # Initialize client based on network
         if network == "testnet":
             self.client = JsonRpcClient("https://s.altnet.rippletest.net:51234")
@@ -27,6 +32,13 @@ class TaxTrackingSystem:
         # Transaction records
         self.transactions = []
 
+        # Running aggregates, updated as records are added so the dashboard
+        # never has to scan the full transaction history
+        self.total_tax_collected = 0
+        self.department_totals = {dept: 0 for dept in self.department_wallets}
+        self.recent_transactions = deque(maxlen=recent_limit)
+        self.distribution_history = deque(maxlen=recent_limit)
+
     def process_tax_payment(self, amount, tax_payer_id):
         """
         Process a tax payment from a user
@@ -47,6 +59,12 @@ class TaxTrackingSystem:
             # In production, this would trigger the actual XRPL payment
             # For demo, we're just recording it
             self.transactions.append(payment_record)
+            self.total_tax_collected += amount
+            self.recent_transactions.append({
+                "type": "tax_payment",
+                "amount": amount,
+                "timestamp": payment_record["timestamp"]
+            })
             
             return tx_id
             
@@ -81,6 +99,14 @@ class TaxTrackingSystem:
                 distribution_record[f"{dept}_tx"] = tx
             
             self.transactions.append(distribution_record)
+
+            # Only update the running totals once the whole distribution is valid
+            for dept, amount in distributions.items():
+                self.department_totals[dept] += amount
+            self.distribution_history.append({
+                "distributions": distributions,
+                "timestamp": distribution_record["timestamp"]
+            })
             return distribution_record["tx_id"]
             
         except Exception as e:
@@ -93,48 +119,45 @@ class TaxTrackingSystem:
         if department not in self.department_wallets:
             raise ValueError(f"Invalid department: {department}")
             
-        try:
-            # In production, this would query actual XRPL balances
-            # For demo, we calculate from recorded transactions
-            total = 0
-            for tx in self.transactions:
-                if "distributions" in tx:
-                    if department in tx["distributions"]:
-                        total += tx["distributions"][department]
-            
-            return total
-            
-        except Exception as e:
-            raise Exception(f"Failed to get department balance: {str(e)}")
+        # In production, this would query actual XRPL balances
+        # For demo, we keep a running total of recorded distributions
+        return self.department_totals[department]
 
     def generate_dashboard_data(self):
         """
         Generate dashboard data for visualization
         """
-        dashboard_data = {
-            "total_tax_collected": 0,
-            "department_balances": {},
-            "recent_transactions": [],
-            "distribution_history": []
+        return {
+            "total_tax_collected": self.total_tax_collected,
+            "department_balances": dict(self.department_totals),
+            "recent_transactions": list(self.recent_transactions),
+            "distribution_history": list(self.distribution_history)
         }
-        
-        # Calculate totals and prepare dashboard data
-        for tx in self.transactions:
-            if "tax_payer_id" in tx:  # Tax payment
-                dashboard_data["total_tax_collected"] += tx["amount"]
-                dashboard_data["recent_transactions"].append({
-                    "type": "tax_payment",
-                    "amount": tx["amount"],
-                    "timestamp": tx["timestamp"]
-                })
-            elif "distributions" in tx:  # Distribution
-                dashboard_data["distribution_history"].append({
-                    "distributions": tx["distributions"],
-                    "timestamp": tx["timestamp"]
-                })
-        
-        # Get department balances
-        for dept in self.department_wallets.keys():
-            dashboard_data["department_balances"][dept] = self.get_department_balance(dept)
-        
-        return dashboard_data
+
+
+def benchmark_dashboard(max_records=1_000_000, runs=100):
+    """
+    Time generate_dashboard_data() as the transaction history grows.
+    Latency should stay flat since the dashboard only reads running totals.
+    """
+    system = TaxTrackingSystem()
+    departments = list(system.department_wallets.keys())
+    size = 1_000
+    while size <= max_records:
+        while len(system.transactions) < size:
+            n = len(system.transactions)
+            if n % 2:
+                system.distribute_to_departments({departments[n % len(departments)]: 10})
+            else:
+                system.process_tax_payment(25, f"payer-{n}")
+
+        start = time.perf_counter()
+        for _ in range(runs):
+            system.generate_dashboard_data()
+        elapsed = (time.perf_counter() - start) / runs
+        print(f"{size:>10} records: {elapsed * 1_000_000:8.1f} us per dashboard")
+        size *= 10
+
+
+if __name__ == "__main__":
+    benchmark_dashboard()
@@ -1,48 +1,63 @@
-from xrpl.wallet import generate_faucet_wallet, Wallet
+from xrpl.wallet import Wallet
 from xrpl.clients import JsonRpcClient
-import json
+from wallet_provisioning import (
+    create_wallets, fund_with_faucet, fund_from_master, save_wallet_credentials,
+    MAX_FAUCET_WORKERS, DEFAULT_FUNDING_XRP
+)
+import argparse
+import time
 
-def generate_test_wallets():
+def generate_test_wallets(extra_departments=0, master_seed=None, amount_xrp=DEFAULT_FUNDING_XRP,
+                          max_workers=MAX_FAUCET_WORKERS, network="https://s.altnet.rippletest.net:51234"):
+    """
+    Derive all wallets offline, then fund them concurrently, either through a
+    bounded pool of faucet calls or with one batch of payments from a master wallet.
+    Args:
+        extra_departments: Number of additional department wallets (e.g. for staging)
+        master_seed: Seed of a funded wallet to fund from instead of the faucet
+        amount_xrp: Amount sent to every wallet when funding from the master wallet
+        max_workers: Maximum number of concurrent faucet calls
+        network: JSON-RPC endpoint of the network
+    """
     # Connect to testnet
-    client = JsonRpcClient("https://s.altnet.rippletest.net:51234")
-    
-    # Generate wallets
-    wallets = {
-        "government": generate_faucet_wallet(client, debug=True),
-        "dept_a": generate_faucet_wallet(client, debug=True),
-        "dept_b": generate_faucet_wallet(client, debug=True),
-        "dept_c": generate_faucet_wallet(client, debug=True)
-    }
-    
-    # Create wallet info dictionary
-    wallet_info = {}
-    for name, wallet in wallets.items():
-        wallet_info[name] = {
-            "seed": wallet.seed,
-            "classic_address": wallet.classic_address
-        }
-    
-    # Save to file
-    with open("wallet_credentials.json", "w") as f:
-        json.dump(wallet_info, f, indent=4)
-        
-    # Create .env file
-    env_content = f"""GOVERNMENT_WALLET_SEED={wallet_info['government']['seed']}
-DEPT_A_WALLET_SEED={wallet_info['dept_a']['seed']}
-DEPT_B_WALLET_SEED={wallet_info['dept_b']['seed']}
-DEPT_C_WALLET_SEED={wallet_info['dept_c']['seed']}
-"""
-    
-    with open(".env", "w") as f:
-        f.write(env_content)
-    
-    return wallet_info
+    client = JsonRpcClient(network)
+
+    # Generate wallets (offline)
+    names = ["government", "dept_a", "dept_b", "dept_c"]
+    names += [f"dept_{i:03d}" for i in range(1, extra_departments + 1)]
+    wallets = create_wallets(names)
+
+    # Fund them
+    if master_seed:
+        errors = fund_from_master(client, Wallet.from_seed(master_seed), wallets, amount_xrp)
+    else:
+        errors = fund_with_faucet(client, wallets, max_workers)
+    for name, error in errors.items():
+        print(f"Warning: {name} was not funded ({error})")
+
+    # Save to wallet_credentials.json and .env
+    env_keys = {name: f"{name.upper()}_WALLET_SEED" for name in names}
+    return save_wallet_credentials(wallets, "wallet_credentials.json", ".env", env_keys)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and fund test wallets")
+    parser.add_argument("--departments", type=int, default=0,
+                        help="number of additional department wallets")
+    parser.add_argument("--master-seed", help="fund from this wallet instead of the faucet")
+    parser.add_argument("--amount", type=float, default=DEFAULT_FUNDING_XRP,
+                        help="XRP sent to each wallet when funding from the master wallet")
+    parser.add_argument("--workers", type=int, default=MAX_FAUCET_WORKERS,
+                        help="maximum number of concurrent faucet calls")
+    parser.add_argument("--network", default="https://s.altnet.rippletest.net:51234")
+    args = parser.parse_args()
+
     print("Generating test wallets...")
-    wallet_info = generate_test_wallets()
+    start = time.perf_counter()
+    wallet_info = generate_test_wallets(args.departments, args.master_seed, args.amount,
+                                        args.workers, args.network)
+    print(f"\nProvisioned {len(wallet_info)} wallets in {time.perf_counter() - start:.1f}s")
     print("\nWallet credentials have been saved to 'wallet_credentials.json' and '.env'")
     print("\nGovernment wallet address:", wallet_info['government']['classic_address'])
     print("Department A wallet address:", wallet_info['dept_a']['classic_address'])
     print("Department B wallet address:", wallet_info['dept_b']['classic_address'])
-    print("Department C wallet address:", wallet_info['dept_c']['classic_address'])
\ No newline at end of file
+    print("Department C wallet address:", wallet_info['dept_c']['classic_address'])
@@ -0,0 +1,276 @@
+from local_ledger import LocalLedger, LocalLedgerClient, serve, RESERVE_BASE
+from wallet_provisioning import create_wallets
+from workload import generate_jurisdictions, generate_workload, replay
+from jurisdictions import department_parents
+from async_client import CONNECTIONS_PER_POOL
+import argparse
+import asyncio
+import contextlib
+import httpx
+import importlib
+import io
+import json
+import os
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+def write_config(output_dir, jurisdictions, wallets, xrpl_url=None):
+    """
+    Write the jurisdictions file and an env file with the wallet seeds and the
+    payer tag key the workload was generated with, to run app.py (or
+    xrpl-shards.py) against the workload:  env $(cat workload.env) python app.py
+    Returns:
+        Dictionary of the environment variables written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jurisdictions_file = os.path.abspath(os.path.join(output_dir, "jurisdictions.json"))
+    with open(jurisdictions_file, "w") as f:
+        json.dump(jurisdictions, f, indent=2)
+
+    env_keys = {"tax_pool": "TAX_POOL", "exit_pool": "EXIT_POOL", "government": "GOV_WALLET"}
+    env = {env_keys.get(wallet_id, f"WALLET_{wallet_id.upper()}"): wallet.seed for wallet_id, wallet in wallets.items()}
+    env["JURISDICTIONS_FILE"] = jurisdictions_file
+    env["PAYER_TAG_KEY"] = os.environ["PAYER_TAG_KEY"]
+    if xrpl_url:
+        env["XRPL_URL"] = xrpl_url
+    with open(os.path.join(output_dir, "workload.env"), "w") as f:
+        f.writelines(f"{key}={value}\n" for key, value in env.items())
+    return env
+
+def timed(function, repeat=1):
+    """Run a function `repeat` times, returning its last result and the durations (seconds)"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return result, durations
+
+def fund_idle_wallets(ledger, addresses):
+    """
+    Create the accounts of wallets the workload never paid, with the base
+    reserve: the tracker funds wallets missing from the ledger when it starts,
+    which the stand-in has no faucet for.
+    """
+    idle = [address for address in addresses.values() if address not in ledger.accounts]
+    for address in idle:
+        ledger.fund(address, RESERVE_BASE)
+    if idle:
+        ledger.close()
+    return len(idle)
+
+def benchmark(env, ledger, latency, departments):
+    """Ingest the replayed ledger with the tracker in-process and time its main endpoints"""
+    os.environ.update(env, SNAPSHOT_PATH="")
+    app = importlib.import_module("app")
+    tax_system = app.tax_system
+    tax_system.client = LocalLedgerClient(ledger, latency)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        count, (sync_seconds,) = timed(tax_system.sync_ledger)
+    print(f"\nIngest: {count} transactions in {sync_seconds:.2f}s ({count / sync_seconds:.0f}/s)")
+
+    endpoints = [("/api/transaction-graph", 3), ("/api/balances", 1), ("/api/transaction-tree", 1)]
+    endpoints += [(f"/api/department-hierarchy/{dept_id}", 1) for dept_id in departments]
+    print(f"{'endpoint':60} {'median':>9} {'max':>9}")
+    with app.app.test_client() as client:
+        for path, repeat in endpoints:
+            # The endpoints log every transaction, keep the table readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                response, durations = timed(lambda: client.get(path), repeat)
+            status = "" if response.status_code == 200 else f" (HTTP {response.status_code})"
+            print(f"{path:60} {statistics.median(durations) * 1000:7.0f}ms {max(durations) * 1000:7.0f}ms{status}")
+
+def _free_port():
+    """Helper to pick an unused local TCP port"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def _closed_loop(url, concurrency, seconds):
+    """
+    Helper: `concurrency` clients each sending GET `url` again as soon as the
+    previous response arrives, for `seconds`.
+    Returns:
+        (latencies of the successful requests, errors, seconds until the last response)
+    """
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    # Small pools, one per CONNECTIONS_PER_POOL clients, so the client side does not saturate first
+    limits = httpx.Limits(max_connections=CONNECTIONS_PER_POOL, max_keepalive_connections=CONNECTIONS_PER_POOL)
+    pools = [httpx.AsyncClient(limits=limits, timeout=60)
+             for _ in range(-(-concurrency // CONNECTIONS_PER_POOL))]
+
+    async def worker(client):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    try:
+        await asyncio.gather(*(worker(pools[i % len(pools)]) for i in range(concurrency)))
+    finally:
+        for client in pools:
+            await client.aclose()
+    return latencies, errors, time.perf_counter() - started
+
+def load_test(env, path, concurrency_levels, threads, connections, seconds, output_dir):
+    """
+    Serve asgi.py against the stand-in twice, with the async views and with
+    every route on its WSGI threads (ASYNC_VIEWS=0), and measure the throughput
+    of GET `path` under closed-loop load at each concurrency level. Both modes
+    keep `connections` pooled connections to the stand-in, so only the request
+    path differs: the synchronous one saturates at about `threads` requests in
+    flight (threads / latency requests per second), the async one goes on
+    until the CPU or the connections run out. Prints the capacity of each mode,
+    its highest throughput and the concurrency it was reached at. The stand-in
+    latency should be high enough that `threads` requests in flight do not
+    already use all the CPU, or both modes measure the same CPU limit.
+    """
+    print(f"\nLoad test of {path}, {threads} WSGI threads, {connections} XRPL connections, "
+          f"{seconds:.0f}s per level")
+    print(f"{'mode':6} {'concurrency':>11} {'req/s':>8} {'median':>9} {'p99':>9} {'errors':>7}")
+    server_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "asgi.py")
+    throughput = {}                     # mode -> [(requests per second, concurrency)]
+    for mode, async_views in (("sync", "0"), ("async", "1")):
+        port = _free_port()
+        url = f"http://127.0.0.1:{port}{path}"
+        server_env = dict(os.environ, **env, PORT=str(port), ASYNC_VIEWS=async_views,
+                          WSGI_THREADS=str(threads), XRPL_MAX_CONNECTIONS=str(connections), SNAPSHOT_PATH="")
+        log_path = os.path.join(output_dir, f"asgi-{mode}.log")
+        with open(log_path, "w") as log:
+            server = subprocess.Popen([sys.executable, server_script], env=server_env, cwd=output_dir,
+                                      stdout=log, stderr=subprocess.STDOUT)
+        try:
+            deadline = time.time() + 120
+            while True:
+                try:
+                    if httpx.get(url, timeout=10).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if server.poll() is not None or time.time() > deadline:
+                    raise RuntimeError(f"asgi.py ({mode}) did not start serving {path}, see {log_path}")
+                time.sleep(0.5)
+
+            for concurrency in concurrency_levels:
+                latencies, errors, elapsed = asyncio.run(_closed_loop(url, concurrency, seconds))
+                throughput.setdefault(mode, []).append((len(latencies) / elapsed, concurrency))
+                if latencies:
+                    p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) > 1 else latencies[0]
+                    print(f"{mode:6} {concurrency:11d} {len(latencies) / elapsed:8.1f} "
+                          f"{statistics.median(latencies) * 1000:7.0f}ms {p99 * 1000:7.0f}ms {errors:7d}")
+                else:
+                    print(f"{mode:6} {concurrency:11d} {0:8.1f} {'-':>9} {'-':>9} {errors:7d}")
+        finally:
+            server.terminate()
+            server.wait()
+
+    print("\nCapacity")
+    for mode, results in throughput.items():
+        rate, concurrency = max(results)
+        print(f"{mode:6} {rate:8.1f} req/s at {concurrency} concurrent clients")
+    if len(throughput) == 2 and throughput["sync"][-1][0] > 0:
+        print(f"async / sync at {concurrency_levels[-1]} concurrent clients: "
+              f"{throughput['async'][-1][0] / throughput['sync'][-1][0]:.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic tax year and replay it into a local XRPL stand-in")
+    parser.add_argument("--jurisdictions", type=int, default=4)
+    parser.add_argument("--departments", type=int, default=10, help="departments per jurisdiction")
+    parser.add_argument("--taxpayers", type=int, default=1000)
+    parser.add_argument("--payments-per-taxpayer", type=float, default=4)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rate", type=float, help="payments replayed per second (default: as fast as possible)")
+    parser.add_argument("--ledger-seconds", type=float, default=4, help="workload seconds per ledger")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every XRPL request")
+    parser.add_argument("--output-dir", default="workload", help="where the jurisdictions and env files are written")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="serve the stand-in as JSON-RPC on this port instead of benchmarking in-process")
+    parser.add_argument("--load-test", metavar="PATH", nargs="?", const="/api/balances",
+                        help="load test the sync and async request paths of asgi.py on this endpoint "
+                             "(default: /api/balances) against the stand-in served over HTTP")
+    parser.add_argument("--concurrency",
+                        help="load test: comma-separated numbers of concurrent clients "
+                             "(default: 1, 8 and 32 times --threads)")
+    parser.add_argument("--threads", type=int, default=8, help="load test: WSGI threads of the server")
+    parser.add_argument("--connections", type=int, default=1000,
+                        help="load test: pooled connections of the server to the stand-in")
+    parser.add_argument("--duration", type=float, default=10, help="load test: seconds per concurrency level")
+    args = parser.parse_args()
+
+    # Tax payments are tagged with a keyed hash of the payer (a throwaway key
+    # unless one is set), written to the env file with the seeds
+    os.environ.setdefault("PAYER_TAG_KEY", secrets.token_hex(32))
+    jurisdictions = generate_jurisdictions(args.jurisdictions, args.departments, seed=args.seed)
+    parents = department_parents(jurisdictions)
+    workload, (seconds,) = timed(lambda: generate_workload(
+        parents, args.taxpayers, args.payments_per_taxpayer, args.days, seed=args.seed))
+    print(f"Generated {len(workload['events'])} payments between {len(workload['wallet_ids'])} wallets in {seconds:.2f}s")
+
+    wallets = create_wallets(workload["wallet_ids"])
+    addresses = {wallet_id: wallet.classic_address for wallet_id, wallet in wallets.items()}
+    ledger = LocalLedger(start_time=workload["start"])
+    # The stand-in is always served over HTTP: the tracker checks its wallets on
+    # the node when it starts, even when it is benchmarked in-process
+    serve_only = bool(args.serve) and not args.load_test
+    if not args.serve:
+        args.serve = _free_port()
+    xrpl_url = f"http://127.0.0.1:{args.serve}/"
+    env = write_config(args.output_dir, jurisdictions, wallets, xrpl_url)
+    print(f"Wrote {args.output_dir}/jurisdictions.json and {args.output_dir}/workload.env")
+
+    def progress(payments, ledgers):
+        if ledgers % 1000 == 0:
+            print(f"  {payments} payments, {ledgers} ledgers")
+
+    if args.load_test:
+        server = serve(ledger, port=args.serve, latency=args.latency)
+        stats = replay(ledger, workload, addresses, args.rate, args.ledger_seconds, progress=progress)
+        fund_idle_wallets(ledger, addresses)
+        print(f"Replayed {stats['payments']} payments ({stats['failed']} failed) "
+              f"into {stats['ledgers']} ledgers in {stats['seconds']:.1f}s; "
+              f"stand-in latency {args.latency * 1000:.0f}ms")
+        if args.concurrency:
+            concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+        else:
+            concurrency_levels = [args.threads * factor for factor in (1, 8, 32)]
+        load_test(env, args.load_test, concurrency_levels, args.threads, args.connections,
+                  args.duration, args.output_dir)
+        server.shutdown()
+    elif serve_only:
+        server = serve(ledger, port=args.serve, latency=args.latency)
+        print(f"XRPL stand-in listening on {xrpl_url} (latency {args.latency * 1000:.0f}ms), replaying...")
+        stats = replay(ledger, workload, addresses, args.rate, args.ledger_seconds, progress=progress)
+        fund_idle_wallets(ledger, addresses)
+        print(f"Replayed {stats['payments']} payments ({stats['failed']} failed) "
+              f"into {stats['ledgers']} ledgers in {stats['seconds']:.1f}s; serving until interrupted")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        server = serve(ledger, port=args.serve)
+        stats = replay(ledger, workload, addresses, args.rate, args.ledger_seconds, progress=progress)
+        fund_idle_wallets(ledger, addresses)
+        print(f"Replayed {stats['payments']} payments ({stats['failed']} failed) "
+              f"into {stats['ledgers']} ledgers in {stats['seconds']:.1f}s")
+        benchmark(env, ledger, args.latency, sorted(parents)[:3])
+        server.shutdown()